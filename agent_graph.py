@@ -2,27 +2,45 @@
 
 from __future__ import annotations
 from typing import TypedDict, Optional, Dict, Any, List
-from langgraph.graph import StateGraph, END
-from langchain_core.messages import HumanMessage, AIMessage
 
-from agents.intake_agent import run as intake_node
-from agents.lookup_agent import run as lookup_node
-from agents.schedule_agent import run as schedule_node
-from agents.confirm_agent import run as confirm_node
-from agents.reminder_agent import schedule_reminder_job
+from tools import llm, recorder
+from tools.aio import run_blocking
+from tools.tracing import span
+
+# langgraph, langchain_core and the agent modules (pandas, Twilio, APScheduler behind them)
+# are imported on first use so that importing this module stays cheap for the UI/API cold start.
 
 class AgentState(TypedDict, total=False):
     messages: List[Any]
     patient: Dict[str, Any]
     is_new_patient: bool
     appointment: Dict[str, Any]
+    clinic: str
+
+def _node(agent):
+    from langchain_core.runnables import RunnableLambda
+    name = agent.__name__.rsplit(".", 1)[-1]
+
+    def run(state):
+        with span(f"node.{name}"), recorder.node(name):
+            return agent.run(state)
+
+    async def arun(state):
+        with span(f"node.{name}"), recorder.node(name):
+            return await agent.arun(state)
+
+    # Each node carries both variants: app.invoke uses run, app.ainvoke uses arun
+    return RunnableLambda(run, afunc=arun, name=name)
 
 def build_graph():
+    from langgraph.graph import StateGraph, END
+    from agents import intake_agent, lookup_agent, schedule_agent, confirm_agent
+
     graph = StateGraph(AgentState)
-    graph.add_node("intake", intake_node)
-    graph.add_node("lookup", lookup_node)
-    graph.add_node("schedule", schedule_node)
-    graph.add_node("confirm", confirm_node)
+    graph.add_node("intake", _node(intake_agent))
+    graph.add_node("lookup", _node(lookup_agent))
+    graph.add_node("schedule", _node(schedule_agent))
+    graph.add_node("confirm", _node(confirm_agent))
     # Removed form distribution; flow ends at confirm
 
     graph.set_entry_point("intake")
@@ -34,17 +52,9 @@ def build_graph():
     # Compile without interrupts; schedule will propose times and confirm will run on the next turn
     return graph.compile()
 
-# Helper to run one turn.
-def run_turn(app, user_text: str, state: AgentState):
-    if user_text:
-        state['messages'].append(HumanMessage(content=user_text))
-
-    # Keep track of existing messages
-    current_messages = len(state.get("messages", []))
-    
-    # Invoke the graph
-    result_state = app.invoke(state)
-
+def _finalize_turn(result_state: AgentState, current_messages: int):
+    """Pick the reply for the turn and schedule reminders once an appointment is confirmed."""
+    from langchain_core.messages import AIMessage
     # Find the newest AI message to display as the reply
     new_messages = result_state.get('messages', [])[current_messages:]
     last_ai_reply = ""
@@ -55,7 +65,93 @@ def run_turn(app, user_text: str, state: AgentState):
     appt = result_state.get('appointment')
     if appt and appt.get('status') == 'confirmed' and not appt.get('reminder_scheduled'):
         appt['patient'] = result_state.get('patient', {})
-        schedule_reminder_job(appt)
+        # APScheduler (and its thread) is only loaded once the first booking is confirmed
+        from agents.reminder_agent import schedule_reminder_job
+        # A weekly series gets reminders before every visit
+        for visit in appt.get('series') or [appt['date_slot']]:
+            schedule_reminder_job({**appt, 'date_slot': visit})
         result_state['appointment']['reminder_scheduled'] = True
 
-    return result_state, last_ai_reply
\ No newline at end of file
+    return result_state, last_ai_reply
+
+# Helper to run one turn.
+def run_turn(app, user_text: str, state: AgentState):
+    from langchain_core.messages import HumanMessage
+    # Opt-in capture for replay_traces.py (TURN_RECORD_DIR); takes the state before this turn's message.
+    # LLM calls made by the nodes share one latency budget (LLM_TURN_BUDGET_MS)
+    with recorder.turn(user_text, state) as rec, llm.turn_budget():
+        if user_text:
+            state['messages'].append(HumanMessage(content=user_text))
+
+        # Keep track of existing messages
+        current_messages = len(state.get("messages", []))
+
+        with span("turn"):
+            # Invoke the graph
+            result_state = app.invoke(state)
+            result = _finalize_turn(result_state, current_messages)
+        rec.finish(result[0])
+        return result
+
+async def arun_turn(app, user_text: str, state: AgentState):
+    """Async run_turn: awaits app.ainvoke so one event loop can serve many sessions."""
+    from langchain_core.messages import HumanMessage
+    with recorder.turn(user_text, state) as rec, llm.turn_budget():
+        if user_text:
+            state['messages'].append(HumanMessage(content=user_text))
+
+        current_messages = len(state.get("messages", []))
+        with span("turn"):
+            result_state = await app.ainvoke(state)
+            # Reminder scheduling may send an immediate SMS; keep it off the event loop
+            result = await run_blocking(_finalize_turn, result_state, current_messages)
+        rec.finish(result[0])
+        return result
+
+def stream_turn(app, user_text: str, state: AgentState):
+    """
+    Streaming variant of run_turn. Yields (kind, payload) events while the graph runs:
+      - ("node", name): a node finished
+      - ("token", text): partial reply text (LLM token chunks, or a whole rule-based reply
+        as soon as the node that produced it finishes)
+      - ("done", (result_state, last_ai_reply)): same result run_turn would return
+    """
+    from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
+    with recorder.turn(user_text, state) as rec, llm.turn_budget():
+        if user_text:
+            state['messages'].append(HumanMessage(content=user_text))
+
+        current_messages = len(state.get("messages", []))
+        seen = current_messages
+        streamed_ids = set()
+        emitted = False
+        result_state = state
+
+        for mode, chunk in app.stream(state, stream_mode=["messages", "updates", "values"]):
+            if mode == "messages":
+                # Token chunks of reply-producing LLM calls; guarded extraction calls are tagged nostream
+                msg_chunk, meta = chunk
+                if llm.NOSTREAM_TAG in ((meta or {}).get("tags") or ()):
+                    continue
+                if isinstance(msg_chunk, AIMessageChunk) and msg_chunk.content:
+                    if msg_chunk.id:
+                        streamed_ids.add(msg_chunk.id)
+                    emitted = True
+                    yield "token", msg_chunk.content
+            elif mode == "updates":
+                for node_name, update in chunk.items():
+                    yield "node", node_name
+                    msgs = (update or {}).get("messages", [])
+                    # Rule-based replies arrive whole; emit them as soon as their node is done
+                    for msg in msgs[seen:]:
+                        if isinstance(msg, AIMessage) and msg.id not in streamed_ids and msg.content:
+                            prefix = "\n\n" if emitted else ""
+                            emitted = True
+                            yield "token", prefix + msg.content
+                    seen = max(seen, len(msgs))
+            elif mode == "values":
+                result_state = chunk
+
+        result = _finalize_turn(result_state, current_messages)
+        rec.finish(result[0])
+        yield "done", result
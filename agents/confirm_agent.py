@@ -2,10 +2,16 @@
 
 from datetime import datetime
 from langchain_core.messages import AIMessage, HumanMessage
-from tools.data_io import reserve_slot, append_appointment_export
-from tools.messaging import send_sms
-from tools.email import send_email
-from tools.utils import sanitize_phone_in, sanitize_email
+from tools import reservations
+from tools.data_io import (
+    reserve_series, PATIENT_CONFLICT,
+    append_appointment_exports, aappend_appointment_exports,
+)
+from tools.messaging import send_sms, asend_sms
+from tools.email import send_email, asend_email
+from tools.utils import patient_contacts
+from tools.aio import run_blocking
+import asyncio
 import re
 import traceback
 
@@ -99,22 +105,22 @@ def _extract_option_index(text: str, max_len: int):
             pass
     return None
 
-def run(state):
+def _select_option(state):
     """
-    Confirm agent:
-    - Expects state["appointment"]["options"] to be a list of candidate slots (each has 'date_slot' datetime).
-    - Expects user to reply with a time (flexible formats).
-    - Reserves the slot via tools.data_io.reserve_slot(doctor_name, datetime, patient_id).
-    - Sends SMS and Email confirmations; logs any send errors.
+    Match the user's latest reply to one of the proposed options.
+    Returns the chosen option, or None when there is nothing to do or the user was re-prompted.
     """
     messages = state.get("messages", [])
     appt = state.get("appointment", {})
-    patient = state.get("patient", {})
 
     # Guard: must have options
     if not appt or "options" not in appt:
         # nothing to do
-        return state
+        return None
+
+    # Options were proposed in this same turn; wait for the user's pick
+    if appt.get("offered_at") is not None and len(messages) <= appt["offered_at"]:
+        return None
 
     # Find last human message
     last_user = None
@@ -124,7 +130,7 @@ def run(state):
             break
 
     if not last_user:
-        return state
+        return None
 
     # Try option index selection first
     idx = _extract_option_index(last_user, len(appt["options"]))
@@ -136,7 +142,7 @@ def run(state):
         if not normalized_time:
             messages.append(AIMessage(content="Please reply with one of the available times (examples: '09:30', '9:30am', or '9') or the option number (e.g., '1')."))
             state["messages"] = messages
-            return state
+            return None
 
     # Match normalized_time to one of the proposed options
     chosen = None
@@ -198,71 +204,182 @@ def run(state):
     if not chosen:
         messages.append(AIMessage(content="That selection wasn't one of the proposed options. Please reply with a listed time (e.g., '09:30') or the option number (e.g., '1')."))
         state["messages"] = messages
-        return state
+        return None
 
-    # Reserve the slot
-    patient_id = patient.get("patient_id")
-    try:
-        # reserve_slot expected signature: (doctor_name, date_time, patient_id)
-        ok, reserved_row = reserve_slot(appt["doctor_name"], chosen["date_slot"], patient_id)
-    except TypeError:
-        # If reserve_slot supports an optional duration param (backwards compatible),
-        # try calling without duration too
+    return chosen
+
+def _outcome(result):
+    """(ok, overlapping visit or None) from a reservation result."""
+    ok, detail = result
+    if not ok and isinstance(detail, dict) and detail.get("reason") == PATIENT_CONFLICT:
+        return False, detail["conflict"]
+    return ok, None
+
+def _reserve(appt, chosen, patient_id):
+    """
+    Reserve the chosen slot (or every visit of a chosen weekly series). Returns (ok, clash): clash
+    is the patient's existing visit (any doctor) that the booking would overlap, checked under the
+    data lock together with the slot itself.
+    """
+    duration = appt.get("duration_min", 30)
+    if chosen.get("series"):
         try:
-            ok, reserved_row = reserve_slot(appt["doctor_name"], chosen["date_slot"], patient_id, appt.get("duration_min", 30))
+            return _outcome(reserve_series(appt["doctor_name"], chosen["series"], patient_id, duration))
         except Exception as e:
-            ok = False
-            reserved_row = None
-            print("reserve_slot call failed:", e)
+            print("reserve_series exception:", e)
+            traceback.print_exc()
+            return False, None
+    try:
+        # Queued with other sessions' reservations and committed in one schedule write
+        return _outcome(reservations.reserve(appt["doctor_name"], chosen["date_slot"], patient_id, duration))
     except Exception as e:
-        ok = False
-        reserved_row = None
         print("reserve_slot exception:", e)
         traceback.print_exc()
+        return False, None
 
-    if not ok:
-        messages.append(AIMessage(content="Sorry — that slot was just taken by someone else. Please choose another available time."))
-        state["messages"] = messages
-        # clear options to allow re-selection
-        state["appointment"].pop("options", None)
-        return state
+async def _areserve(appt, chosen, patient_id):
+    """Async _reserve: waits on the reservation writer without holding a blocking-I/O thread."""
+    if chosen.get("series"):
+        return await run_blocking(_reserve, appt, chosen, patient_id)
+    try:
+        return _outcome(await reservations.areserve(appt["doctor_name"], chosen["date_slot"], patient_id,
+                                                    appt.get("duration_min", 30)))
+    except Exception as e:
+        print("reserve_slot exception:", e)
+        traceback.print_exc()
+        return False, None
+
+def _overlapping(state, clash):
+    messages = state.get("messages", [])
+    messages.append(AIMessage(content=f"You already have an appointment with {clash['doctor_name']} on {clash['date_slot']:%Y-%m-%d at %H:%M}, which overlaps that time. Please choose another option."))
+    state["messages"] = messages
+    return state
+
+def _slot_taken(state):
+    messages = state.get("messages", [])
+    messages.append(AIMessage(content="Sorry — that slot was just taken by someone else. Please choose another available time."))
+    state["messages"] = messages
+    # clear options to allow re-selection
+    state["appointment"].pop("options", None)
+    return state
+
+def _prepare_notifications(state, chosen):
+    """
+    Finalize appointment details in the state and build the confirmation messages.
+    Returns (normalized_phone, sms_text, sanitized_email, subject, body); absent channels are None.
+    """
+    appt = state.get("appointment", {})
+    patient = state.get("patient", {})
 
     # Finalize appointment details
     appt["date_slot"] = chosen["date_slot"]
+    if chosen.get("series"):
+        appt["series"] = list(chosen["series"])
+    else:
+        appt.pop("series", None)
     appt["status"] = "confirmed"
+    appt.pop("waitlist_offer", None)
     # Ensure patient info is attached for reminders
     appt["patient"] = patient
     state["appointment"] = appt
 
-    # --- Notifications ---
+    sms_text = subject = body = None
+    series = appt.get("series")
     # SMS
-    normalized_phone = sanitize_phone_in(patient.get("cell_phone"))
+    normalized_phone, sanitized_email = patient_contacts(patient)
     if normalized_phone:
         # persist normalized phone back into patient record in state
         patient["cell_phone"] = normalized_phone
-        sms_text = (
-            f"Hello {patient.get('first_name')}, your appointment with {appt['doctor_name']} "
-            f"on {appt['date_slot']:%Y-%m-%d at %H:%M} is confirmed. See you then!"
-        )
-        try:
-            sid = send_sms(normalized_phone, sms_text)
-            print(f"Confirmation SMS sent. SID: {sid} to {normalized_phone}")
-        except Exception as e:
-            print(f"Confirmation SMS failed for {normalized_phone}: {e}")
+        if series:
+            sms_text = (
+                f"Hello {patient.get('first_name')}, your {len(series)} weekly appointments with {appt['doctor_name']} "
+                f"from {series[0]:%Y-%m-%d} to {series[-1]:%Y-%m-%d} are confirmed. First visit: {series[0]:%A %H:%M}."
+            )
+        else:
+            sms_text = (
+                f"Hello {patient.get('first_name')}, your appointment with {appt['doctor_name']} "
+                f"on {appt['date_slot']:%Y-%m-%d at %H:%M} is confirmed. See you then!"
+            )
 
     # Email
-    sanitized_email = sanitize_email(patient.get("email"))
     if sanitized_email:
         patient["email"] = sanitized_email
         subject = "Appointment Confirmation"
+        if series:
+            visits = "\n".join(f"  {t:%Y-%m-%d %H:%M}" for t in series)
+            when = f"Visits ({len(series)}, weekly):\n{visits}\n\n"
+        else:
+            when = f"Date & Time: {appt['date_slot']:%Y-%m-%d %H:%M}\n\n"
         body = (
             f"Dear {patient.get('first_name')} {patient.get('last_name')},\n\n"
-            f"Your appointment is confirmed.\n\n"
+            f"Your appointment{'s are' if series else ' is'} confirmed.\n\n"
             f"Doctor: {appt['doctor_name']}\n"
-            f"Date & Time: {appt['date_slot']:%Y-%m-%d %H:%M}\n\n"
+            f"{when}"
             "If you have any questions, reply to this email.\n\n"
             "Thank you,\nClinic Team"
         )
+    return normalized_phone, sms_text, sanitized_email, subject, body
+
+def _export_rows(appt):
+    """One admin export row per visit: the booked slot, or each visit of a weekly series."""
+    if appt.get("series"):
+        return [{**appt, "date_slot": t} for t in appt["series"]]
+    return [appt]
+
+def _complete(state, normalized_phone, sanitized_email):
+    """Inform the user in chat and persist the corrected patient back into state."""
+    messages = state.get("messages", [])
+    appt = state["appointment"]
+    notify_bits = []
+    if normalized_phone:
+        notify_bits.append(f"SMS to {normalized_phone}")
+    if sanitized_email:
+        notify_bits.append(f"email to {sanitized_email}")
+    notify_text = ", ".join(notify_bits) if notify_bits else "no contact available"
+
+    series = appt.get("series")
+    if series:
+        messages.append(AIMessage(content=f"✅ Booked {len(series)} weekly visits with {appt['doctor_name']}, {series[0]:%Y-%m-%d} to {series[-1]:%Y-%m-%d} (first at {series[0]:%H:%M}). Confirmation sent via {notify_text}."))
+    else:
+        messages.append(AIMessage(content=f"✅ Booked! {appt['doctor_name']} on {appt['date_slot']:%Y-%m-%d %H:%M}. Confirmation sent via {notify_text}."))
+    state["messages"] = messages
+    state["patient"] = appt["patient"]
+
+    return state
+
+def run(state):
+    """
+    Confirm agent:
+    - Expects state["appointment"]["options"] to be a list of candidate slots (each has 'date_slot' datetime).
+    - Expects user to reply with a time (flexible formats).
+    - Reserves the slot via tools.reservations.reserve (batched with concurrent confirmations).
+    - Sends SMS and Email confirmations; logs any send errors.
+    """
+    chosen = _select_option(state)
+    if chosen is None:
+        return state
+
+    # Reserve the slot, unless the patient is already booked (with any doctor) at that time
+    patient_id = state.get("patient", {}).get("patient_id")
+    ok, clash = _reserve(state["appointment"], chosen, patient_id)
+    if clash:
+        return _overlapping(state, clash)
+    if not ok:
+        return _slot_taken(state)
+
+    normalized_phone, sms_text, sanitized_email, subject, body = _prepare_notifications(state, chosen)
+    patient = state["patient"]
+    appt = state["appointment"]
+
+    # --- Notifications ---
+    if normalized_phone:
+        try:
+            sid = send_sms(normalized_phone, sms_text)
+            print(f"Confirmation SMS sent. SID: {sid} to {normalized_phone}")
+        except Exception as e:
+            print(f"Confirmation SMS failed for {normalized_phone}: {e}")
+
+    if sanitized_email:
         try:
             send_email(sanitized_email, subject, body)
             print(f"Confirmation email sent to {sanitized_email}")
@@ -271,21 +388,57 @@ def run(state):
 
     # Append to admin export
     try:
-        append_appointment_export(patient, appt)
+        append_appointment_exports(patient, _export_rows(appt))
     except Exception as e:
         print(f"Failed to append appointment export: {e}")
 
-    # Inform user in chat and set state
-    notify_bits = []
+    return _complete(state, normalized_phone, sanitized_email)
+
+async def arun(state):
+    """
+    Async variant of run(): the reservation and export run on the blocking-I/O pool,
+    and the SMS and email confirmations are sent concurrently.
+    """
+    chosen = _select_option(state)
+    if chosen is None:
+        return state
+
+    patient_id = state.get("patient", {}).get("patient_id")
+    ok, clash = await _areserve(state["appointment"], chosen, patient_id)
+    if clash:
+        return _overlapping(state, clash)
+    if not ok:
+        return _slot_taken(state)
+
+    normalized_phone, sms_text, sanitized_email, subject, body = _prepare_notifications(state, chosen)
+    patient = state["patient"]
+    appt = state["appointment"]
+
+    async def _sms():
+        try:
+            sid = await asend_sms(normalized_phone, sms_text)
+            print(f"Confirmation SMS sent. SID: {sid} to {normalized_phone}")
+        except Exception as e:
+            print(f"Confirmation SMS failed for {normalized_phone}: {e}")
+
+    async def _email():
+        try:
+            await asend_email(sanitized_email, subject, body)
+            print(f"Confirmation email sent to {sanitized_email}")
+        except Exception as e:
+            print(f"Confirmation email failed for {sanitized_email}: {e}")
+
+    async def _export():
+        try:
+            await aappend_appointment_exports(patient, _export_rows(appt))
+        except Exception as e:
+            print(f"Failed to append appointment export: {e}")
+
+    tasks = [_export()]
     if normalized_phone:
-        notify_bits.append(f"SMS to {normalized_phone}")
+        tasks.append(_sms())
     if sanitized_email:
-        notify_bits.append(f"email to {sanitized_email}")
-    notify_text = ", ".join(notify_bits) if notify_bits else "no contact available"
+        tasks.append(_email())
+    await asyncio.gather(*tasks)
 
-    messages.append(AIMessage(content=f"✅ Booked! {appt['doctor_name']} on {appt['date_slot']:%Y-%m-%d %H:%M}. Confirmation sent via {notify_text}."))
-    state["messages"] = messages
-    # persist corrected patient back into state
-    state["patient"] = patient
-
-    return state
+    return _complete(state, normalized_phone, sanitized_email)
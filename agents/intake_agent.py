@@ -20,4 +20,8 @@ def run(state):
         messages.append(AIMessage(content=f"Thank you for providing your details, {patient.get('first_name', '')}."))
     
     state["messages"] = messages
-    return state
\ No newline at end of file
+    return state
+
+async def arun(state):
+    # No I/O here; the async graph can call it directly
+    return run(state)
@@ -1,29 +1,26 @@
 # In ai-scheduling-agent/agents/lookup_agent.py
 
 from langchain_core.messages import AIMessage
-from tools.data_io import find_patient_by_name_dob, ensure_patient_record
+from tools.data_io import (
+    find_patient_by_name_dob, ensure_patient_record,
+    afind_patient_by_name_dob, aensure_patient_record,
+)
 import math
 
-def run(state):
-    # --- IDEMPOTENCY CHECK ---
-    # If we have already determined the patient's status, do not run this agent again.
-    if state.get("is_new_patient") is not None:
-        return state
-
-    messages = state.get("messages", [])
+def _missing_details(state) -> bool:
+    """Append a prompt and return True if the intake details needed for lookup are absent."""
     patient = state.get("patient", {})
-    
     if not patient.get("first_name") or not patient.get("last_name") or not patient.get("dob"):
+        messages = state.get("messages", [])
         messages.append(AIMessage(content="I'm sorry, I seem to be missing some of your details. Let's start over."))
         state["messages"] = messages
         # In a real scenario, you might want to route back to the start
-        return state
+        return True
+    return False
 
-    record = find_patient_by_name_dob(patient.get("first_name"), patient.get("last_name"), patient.get("dob"))
-    
-    if record is None:
-        # Create a new patient record
-        record = ensure_patient_record(patient)
+def _apply_record(state, record, created: bool):
+    messages = state.get("messages", [])
+    if created:
         state["is_new_patient"] = True
         messages.append(AIMessage(content=f"I didn't find you in our records, so I've created a new patient profile (ID: {record['patient_id']})."))
     else:
@@ -53,5 +50,35 @@ def run(state):
 
     messages.append(AIMessage(content="Which doctor and date would you like to schedule an appointment for? (e.g., Dr. Alice Wong on 2025-09-15)"))
     state["messages"] = messages
-    
-    return state
\ No newline at end of file
+
+    return state
+
+def run(state):
+    # --- IDEMPOTENCY CHECK ---
+    # If we have already determined the patient's status, do not run this agent again.
+    if state.get("is_new_patient") is not None:
+        return state
+    if _missing_details(state):
+        return state
+
+    patient = state.get("patient", {})
+    record = find_patient_by_name_dob(patient.get("first_name"), patient.get("last_name"), patient.get("dob"))
+    created = record is None
+    if created:
+        # Create a new patient record
+        record = ensure_patient_record(patient)
+    return _apply_record(state, record, created)
+
+async def arun(state):
+    """Async variant of run(); file access is offloaded to the blocking-I/O pool."""
+    if state.get("is_new_patient") is not None:
+        return state
+    if _missing_details(state):
+        return state
+
+    patient = state.get("patient", {})
+    record = await afind_patient_by_name_dob(patient.get("first_name"), patient.get("last_name"), patient.get("dob"))
+    created = record is None
+    if created:
+        record = await aensure_patient_record(patient)
+    return _apply_record(state, record, created)
@@ -2,26 +2,36 @@
 
 from datetime import datetime, timedelta
 import os
-from apscheduler.schedulers.background import BackgroundScheduler
-from pytz import timezone, UTC
 from tools.messaging import send_sms
-from tools.utils import sanitize_phone_in
+from tools.recorder import recorded
+from tools.tenancy import DEFAULT_TENANT, current_tenant
+from tools.utils import patient_contacts, sanitize_phone_in
 import traceback
 
 _scheduler = None
 
+def _local_tz():
+    from pytz import timezone, UTC
+    tz_name = os.environ.get("LOCAL_TZ", "UTC")
+    try:
+        return timezone(tz_name)
+    except Exception:
+        return UTC
+
 def _get_scheduler():
+    # APScheduler is imported and its thread started only when the first reminder is scheduled
     global _scheduler
     if _scheduler is None:
-        tz_name = os.environ.get("LOCAL_TZ", "UTC")
-        try:
-            tz = timezone(tz_name)
-        except Exception:
-            tz = UTC
-        _scheduler = BackgroundScheduler(timezone=tz)
+        from apscheduler.schedulers.background import BackgroundScheduler
+        _scheduler = BackgroundScheduler(timezone=_local_tz())
         _scheduler.start()
     return _scheduler
 
+def _job_owner(patient_id) -> str:
+    # Patient ids are per clinic, so other clinics' job ids carry the clinic as well
+    tenant = current_tenant()
+    return str(patient_id) if tenant == DEFAULT_TENANT else f"{tenant}_{patient_id}"
+
 def _ensure_appt_datetime_tz(appt_dt):
     """
     Ensure appointment datetime is timezone-aware in LOCAL_TZ (or UTC fallback).
@@ -41,11 +51,7 @@ def _ensure_appt_datetime_tz(appt_dt):
         return appt_dt
 
     # Localize naive datetime to local TZ
-    tz_name = os.environ.get("LOCAL_TZ", "UTC")
-    try:
-        tz = timezone(tz_name)
-    except Exception:
-        tz = UTC
+    tz = _local_tz()
     try:
         return tz.localize(appt_dt)
     except Exception:
@@ -55,6 +61,7 @@ def _ensure_appt_datetime_tz(appt_dt):
         except Exception:
             return appt_dt
 
+@recorded("reminders.schedule")
 def schedule_reminder_job(appt: dict):
     """
     Schedule reminders:
@@ -69,7 +76,7 @@ def schedule_reminder_job(appt: dict):
 
     patient = appt.get("patient") or {}
     raw_phone = patient.get("cell_phone") or appt.get("patient_phone")
-    phone = sanitize_phone_in(raw_phone)
+    phone = patient_contacts(patient)[0] or sanitize_phone_in(appt.get("patient_phone"))
     if not phone:
         print(f"Reminder Error: invalid phone number: {raw_phone}")
         return
@@ -85,7 +92,7 @@ def schedule_reminder_job(appt: dict):
     now = datetime.now(appt_time.tzinfo)
 
     # Unique base id for jobs (use patient_id + timestamp)
-    pid = str(patient.get("patient_id") or "unknown")
+    pid = _job_owner(patient.get("patient_id") or "unknown")
     ts = appt_time.strftime("%Y%m%dT%H%M")
 
     # 24-hours reminder
@@ -127,3 +134,21 @@ def schedule_reminder_job(appt: dict):
         except Exception as e:
             print(f"Immediate reminder SMS failed for {phone}: {e}")
             traceback.print_exc()
+
+def cancel_reminder_jobs(appt: dict):
+    """Remove the reminder jobs scheduled for this appointment (after a cancel or reschedule)."""
+    if _scheduler is None:
+        return  # nothing was scheduled in this process
+    appt_time = _ensure_appt_datetime_tz(appt.get("date_slot"))
+    if not appt_time:
+        return
+    patient = appt.get("patient") or {}
+    pid = _job_owner(patient.get("patient_id") or appt.get("patient_id") or "unknown")
+    ts = appt_time.strftime("%Y%m%dT%H%M")
+    for job_id in (f"reminder_24h_{pid}_{ts}", f"reminder_3h_{pid}_{ts}"):
+        try:
+            if _scheduler.get_job(job_id):
+                _scheduler.remove_job(job_id)
+                print(f"Removed reminder {job_id}")
+        except Exception as e:
+            print(f"Failed to remove reminder {job_id}: {e}")
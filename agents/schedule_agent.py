@@ -1,29 +1,172 @@
 # In ai-scheduling-agent/agents/schedule_agent.py
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from langchain_core.messages import AIMessage, HumanMessage
-from tools.data_io import find_available_slots, find_next_available_slots
+from tools.data_io import (
+    find_available_slots, find_next_available_slots, find_series_slots,
+    afind_available_slots, afind_next_available_slots, afind_series_slots,
+)
+from tools.doctor_catalog import get_catalog
+from tools.aio import run_blocking
+from tools import llm, waitlist
+import json
+import os
 import re
 
-def run(state):
-    messages = state.get("messages", [])
-    
-    if state.get("appointment", {}).get("options"):
-        return state
+_WAITLIST_REPLY = re.compile(r"^\s*(join\s+)?(the\s+)?wait\s*-?\s*list\b(?P<any>.*\bany\b)?", re.IGNORECASE)
+_WEEKLY = re.compile(r"\b(weekly|every\s+week|each\s+week)\b", re.IGNORECASE)
+_WEEK_COUNT = re.compile(r"\b(\d{1,2})\s*weeks?\b", re.IGNORECASE)
+# Weekly series without an explicit count ("weekly from 2025-09-15") run this long
+SERIES_DEFAULT_WEEKS = 8
+SERIES_MAX_WEEKS = 26
+# Opt-in: ask the model for the doctor/date when the message has no ISO date ("next Tuesday
+# with Dr. Wong"). Any LLM failure, timeout or open breaker falls back to the rules below.
+LLM_PARSING = os.environ.get("LLM_PARSING", "").lower() in ("1", "true", "yes")
+_ISO_DATE = re.compile(r"(20\d{2}-\d{2}-\d{2})")
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+_DR_NAME = re.compile(r"(Dr\.?\s+[A-Z][a-zA-Z]+\s+[A-Z][a-zA-Z]+)")
+# Every pair of capitalized words, overlapping ("Book Alice Wong" -> "Book Alice", "Alice Wong")
+_NAME_PAIRS = re.compile(r"(?=\b([A-Z][a-zA-Z]+\s+[A-Z][a-zA-Z]+)\b)")
 
-    last_user = None
+def _last_user_text(messages):
     for m in reversed(messages):
         if isinstance(m, HumanMessage):
-            last_user = m.content
-            break
+            return m.content
+    return None
+
+def _wants_waitlist(state):
+    """True when the user answers a waitlist offer with 'waitlist' (or 'waitlist any')."""
+    if not state.get("appointment", {}).get("waitlist_offer"):
+        return False
+    text = _last_user_text(state.get("messages", []))
+    return bool(text and _WAITLIST_REPLY.match(text))
+
+def _join_waitlist(state):
+    messages = state.get("messages", [])
+    appt = state["appointment"]
+    offer = appt.pop("waitlist_offer")
+    appt.pop("options", None)
+    any_doctor = bool(_WAITLIST_REPLY.match(_last_user_text(messages)).group("any"))
+    specialty = waitlist.specialty_of(offer["doctor_name"]) if any_doctor else None
+    start_day = datetime.fromisoformat(offer["date"]).date()
+    end_day = datetime.fromisoformat(offer["until"]).date()
+    entry = waitlist.add(
+        state.get("patient", {}),
+        doctor_name=None if specialty else offer["doctor_name"],
+        specialty=specialty,
+        start_day=start_day, end_day=end_day,
+        duration_min=offer["duration_min"],
+    )
+    appt["waitlist_id"] = entry["id"]
+    target = f"any {specialty} doctor" if specialty else offer["doctor_name"]
+    window = offer["date"] if start_day == end_day else f"{offer['date']} to {offer['until']}"
+    messages.append(AIMessage(content=f"You're on the waitlist for {target} ({window}). If a slot opens up we'll book it for you and confirm by SMS/email."))
+    state["messages"] = messages
+    return state
+
+def _llm_wanted(state):
+    if not LLM_PARSING or state.get("appointment", {}).get("options"):
+        return None
+    text = _last_user_text(state.get("messages", []))
+    if not text or _ISO_DATE.search(text):
+        return None
+    return text
+
+def _hint_prompt(text):
+    from langchain_core.messages import SystemMessage
+    return [SystemMessage(content=(
+                f"Today is {datetime.now():%A %Y-%m-%d}. Extract the appointment request from the patient's "
+                'message. Reply with JSON only: {"doctor": name or null, "date": "YYYY-MM-DD" or null}.')),
+            HumanMessage(content=text)]
+
+def _read_hint(reply):
+    """{"doctor", "date"} from the model reply, keeping only a valid date; the doctor name is checked by _parse_request."""
+    match = _JSON_OBJECT.search(reply or "")
+    try:
+        raw = json.loads(match.group(0)) if match else {}
+    except ValueError:
+        return None
+    hint = {}
+    try:
+        hint["date"] = datetime.fromisoformat(str(raw.get("date"))).date().isoformat()
+    except ValueError:
+        pass
+    if raw.get("doctor"):
+        hint["doctor"] = str(raw["doctor"]).strip()
+    return {k: v for k, v in hint.items() if v} or None
+
+def _llm_hint(state):
+    """Model-extracted doctor/date for a message the rules cannot read, or None (rules only)."""
+    text = _llm_wanted(state)
+    if text is None:
+        return None
+    try:
+        return _read_hint(llm.complete(_hint_prompt(text)))
+    except llm.LLMUnavailable:
+        return None
+
+async def _allm_hint(state):
+    text = _llm_wanted(state)
+    if text is None:
+        return None
+    try:
+        return await run_blocking(_read_hint, await llm.acomplete(_hint_prompt(text)))
+    except llm.LLMUnavailable:
+        return None
+
+def _full_name(text, catalog):
+    """A full doctor name written in `text` ("Dr. First Last", or two capitalized name words), or None."""
+    match = _DR_NAME.search(text)
+    if match:
+        return match.group(1)
+    return next((m.group(1) for m in _NAME_PAIRS.finditer(text) if catalog.full_name(m.group(1))), None)
+
+def _parse_request(state, hint=None):
+    """
+    Return (doctor, date_str, duration) from the latest user message, or None when this
+    agent has nothing to do (a prompt is appended if the request could not be parsed).
+    `hint` ({"doctor", "date"} from _llm_hint) fills in what the rules could not find.
+    """
+    messages = state.get("messages", [])
+
+    if state.get("appointment", {}).get("options"):
+        return None
+
+    last_user = _last_user_text(messages)
 
     if not last_user:
-        return state
+        return None
 
-    date_match = re.search(r"(20\d{2}-\d{2}-\d{2})", last_user)
-    date_str = date_match.group(1) if date_match else None
-    doc_match = re.search(r"(Dr\.?\s+[A-Z][a-zA-Z]+\s+[A-Z][a-zA-Z]+)", last_user)
-    doctor = doc_match.group(1) if doc_match else None
+    hint = hint or {}
+    date_match = _ISO_DATE.search(last_user)
+    date_str = date_match.group(1) if date_match else hint.get("date")
+    catalog = get_catalog()
+    name_text = last_user.replace(date_str, " ") if date_str else last_user
+    hint_doctor = hint.get("doctor")
+    doctor = _full_name(name_text, catalog) or (hint_doctor if hint_doctor and catalog.full_name(hint_doctor) else None)
+    if doctor:
+        # A full name (typed, or from the model hint) must name a catalog doctor; a similar name is only suggested
+        exact = catalog.exact(doctor)
+        if not exact:
+            ranked = catalog.match(doctor, limit=3)
+            if ranked:
+                ask = f"Did you mean {' or '.join(e['name'] for _, e in ranked)}?"
+            else:
+                ask = "Please check the name."
+            messages.append(AIMessage(content=f"I couldn't find {doctor} among our doctors. {ask} Please reply with the doctor and date, like 'Dr. Alice Wong on 2025-09-15'."))
+            state["messages"] = messages
+            return None
+        doctor = exact
+    else:
+        # Resolve partial or misspelled names ("wong", "Dr Alice") to the canonical catalog name
+        doctor = catalog.resolve(name_text) or (catalog.resolve(hint_doctor) if hint_doctor else None)
+    if not doctor:
+        ranked = catalog.match(name_text, limit=3)
+        if ranked:
+            names = " or ".join(e["name"] for _, e in ranked)
+            messages.append(AIMessage(content=f"Which doctor did you mean: {names}? Please reply with the doctor and date, like 'Dr. Alice Wong on 2025-09-15'."))
+            state["messages"] = messages
+            return None
 
     # CRITICAL FIX: Handle parsing failure explicitly
     if not doctor or not date_str:
@@ -32,30 +175,74 @@ def run(state):
         # Instead of failing silently, we prompt the user again.
         messages.append(AIMessage(content="I'm sorry, I couldn't understand that. Please provide the doctor and date again, like 'Dr. Alice Wong on 2025-09-15'."))
         state["messages"] = messages
-        return state
+        return None
 
     is_new = state.get("is_new_patient", False)
     duration = 60 if is_new else 30
-    
-    date_obj = datetime.fromisoformat(date_str)
-    slots = find_available_slots(doctor, date_obj.date(), duration)
+    return doctor, date_str, duration
+
+def _series_weeks(state):
+    """Number of weekly visits asked for ('weekly for 12 weeks'), or None for a single visit."""
+    text = _last_user_text(state.get("messages", []))
+    if not text or not _WEEKLY.search(text):
+        return None
+    count = _WEEK_COUNT.search(text)
+    weeks = int(count.group(1)) if count else SERIES_DEFAULT_WEEKS
+    return max(2, min(weeks, SERIES_MAX_WEEKS))
+
+def _offer_series(state, doctor, date_str, duration, weeks, series):
+    """Post weekly series options; each option carries all of its visit times under 'series'."""
+    messages = state.get("messages", [])
+    if not series:
+        messages.append(AIMessage(content=f"Sorry, {doctor} has no weekday and time free every week for {weeks} weeks from {date_str}. Try fewer weeks, a later start date or another doctor."))
+        state["messages"] = messages
+        return state
+
+    pretty_list = []
+    for i, s in enumerate(series):
+        first = s["date_slot"]
+        shifted = weeks - s["exact_weeks"]
+        note = f" ({shifted} week{'s' if shifted > 1 else ''} at a nearby time)" if shifted else ""
+        pretty_list.append(f"{i+1}) {first:%A}s at {first:%H:%M}{note}")
+    pretty = ", ".join(pretty_list)
+    messages.append(AIMessage(content=f"Weekly options with {doctor} for {weeks} weeks from {date_str}: {pretty}. Reply with the option number (e.g., 1) to book the whole series."))
+
+    state.setdefault("appointment", {})
+    state["appointment"]["doctor_name"] = doctor
+    state["appointment"]["date"] = date_str
+    state["appointment"]["duration_min"] = duration
+    state["appointment"]["options"] = series
+    state["appointment"].pop("waitlist_offer", None)
+    state["appointment"]["offered_at"] = len(messages)
+    state["messages"] = messages
+    return state
+
+def _offer(state, doctor, date_str, duration, slots, next_slots=None):
+    """Post the proposed options (or the no-availability message) into the state."""
+    messages = state.get("messages", [])
 
     if not slots:
         # Fallback: show next available options on or after requested date
-        next_slots = find_next_available_slots(doctor, date_obj.date(), duration, limit=5)
         if not next_slots:
-            messages.append(AIMessage(content=f"Sorry, no available slots for {doctor} on {date_str} or later. Please try another date or doctor."))
+            # Keep the demand: offer the waitlist for the next couple of weeks
+            until = (datetime.fromisoformat(date_str) + timedelta(days=waitlist.DEFAULT_WINDOW_DAYS)).strftime("%Y-%m-%d")
+            messages.append(AIMessage(content=f"Sorry, no available slots for {doctor} on {date_str} or later. Reply 'waitlist' to be booked automatically if a slot opens before {until} (or 'waitlist any' for any doctor in the same specialty), or try another date or doctor."))
+            state.setdefault("appointment", {})["waitlist_offer"] = {
+                "doctor_name": doctor, "date": date_str, "until": until, "duration_min": duration}
             state["messages"] = messages
             return state
         shown = next_slots
         pretty_list = [f"{i+1}) {s['date_slot'].strftime('%Y-%m-%d %H:%M')}" for i, s in enumerate(shown)]
         pretty = ", ".join(pretty_list)
-        messages.append(AIMessage(content=f"No availability on {date_str}. Next available for {doctor}: {pretty}. Reply with the time or the option number."))
+        messages.append(AIMessage(content=f"No availability on {date_str}. Next available for {doctor}: {pretty}. Reply with the time or the option number, or 'waitlist' to be booked automatically if something opens on {date_str}."))
         state.setdefault("appointment", {})
         state["appointment"]["doctor_name"] = doctor
         state["appointment"]["date"] = date_str
         state["appointment"]["duration_min"] = duration
         state["appointment"]["options"] = shown
+        state["appointment"]["offered_at"] = len(messages)
+        state["appointment"]["waitlist_offer"] = {
+            "doctor_name": doctor, "date": date_str, "until": date_str, "duration_min": duration}
         state["messages"] = messages
         return state
 
@@ -63,12 +250,56 @@ def run(state):
     pretty_list = [f"{i+1}) {s['date_slot'].strftime('%H:%M')}" for i, s in enumerate(shown)]
     pretty = ", ".join(pretty_list)
     messages.append(AIMessage(content=f"Available times for {doctor} on {date_str}: {pretty}. Reply with the time (e.g., 09:30) or the option number (e.g., 1)."))
-    
+
     state.setdefault("appointment", {})
     state["appointment"]["doctor_name"] = doctor
     state["appointment"]["date"] = date_str
     state["appointment"]["duration_min"] = duration
     state["appointment"]["options"] = shown
+    state["appointment"].pop("waitlist_offer", None)
+    # Lets the confirm agent ignore the request message that produced these options
+    state["appointment"]["offered_at"] = len(messages)
     state["messages"] = messages
-    
-    return state
\ No newline at end of file
+
+    return state
+
+def run(state):
+    if _wants_waitlist(state):
+        return _join_waitlist(state)
+    parsed = _parse_request(state, _llm_hint(state))
+    if parsed is None:
+        return state
+    doctor, date_str, duration = parsed
+
+    date_obj = datetime.fromisoformat(date_str)
+    weeks = _series_weeks(state)
+    if weeks:
+        series = find_series_slots(doctor, date_obj.date(), weeks, duration)
+        return _offer_series(state, doctor, date_str, duration, weeks, series)
+    slots = find_available_slots(doctor, date_obj.date(), duration)
+    next_slots = None
+    if not slots:
+        next_slots = find_next_available_slots(doctor, date_obj.date(), duration, limit=5)
+    return _offer(state, doctor, date_str, duration, slots, next_slots)
+
+async def arun(state):
+    """Async variant of run(); schedule reads are offloaded to the blocking-I/O pool."""
+    # Warm the doctor catalog off the event loop; _parse_request then hits the cache
+    if _wants_waitlist(state):
+        return await run_blocking(_join_waitlist, state)
+    await run_blocking(get_catalog)
+    parsed = _parse_request(state, await _allm_hint(state))
+    if parsed is None:
+        return state
+    doctor, date_str, duration = parsed
+
+    date_obj = datetime.fromisoformat(date_str)
+    weeks = _series_weeks(state)
+    if weeks:
+        series = await afind_series_slots(doctor, date_obj.date(), weeks, duration)
+        return _offer_series(state, doctor, date_str, duration, weeks, series)
+    slots = await afind_available_slots(doctor, date_obj.date(), duration)
+    next_slots = None
+    if not slots:
+        next_slots = await afind_next_available_slots(doctor, date_obj.date(), duration, limit=5)
+    return _offer(state, doctor, date_str, duration, slots, next_slots)
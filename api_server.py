@@ -0,0 +1,233 @@
+# In ai-scheduling-agent/api_server.py
+"""
+Headless JSON API around the scheduling graph, for kiosks and call-center integrations.
+
+Run with several worker processes, e.g.:
+    uvicorn api_server:app --host 0.0.0.0 --port 8000 --workers 4
+Session state is stored under data/sessions/, so requests need no sticky routing.
+
+Requests pick a clinic with the X-Clinic-Id header (tools.tenancy; omitted = the default
+clinic). A session belongs to the clinic it was created for.
+
+The session id is the patient's credential: appointment endpoints act only for the patient
+looked up in the session named by X-Session-Id. Staff integrations send X-Api-Key with the
+API_STAFF_KEY value instead and may act for any patient.
+"""
+
+import hmac
+import math
+import os
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from langchain_core.messages import AIMessage
+from pydantic import BaseModel
+
+from agent_graph import build_graph, AgentState, arun_turn
+from tools import sessions, tenancy, tracing
+from tools.aio import run_blocking
+from tools.doctor_catalog import get_catalog
+
+load_dotenv()
+STAFF_API_KEY = os.environ.get("API_STAFF_KEY")
+
+async def _select_clinic(x_clinic_id: Optional[str] = Header(default=None)):
+    # Async so the context variable is set in the task that runs the endpoint
+    clinic = x_clinic_id or tenancy.current_tenant()
+    if not tenancy.tenant_exists(clinic):
+        raise HTTPException(status_code=404, detail="Unknown clinic")
+    tenancy.set_tenant(clinic)
+
+app = FastAPI(title="Clinic Scheduler API", dependencies=[Depends(_select_clinic)])
+
+_graph = None
+
+def _get_graph():
+    # One compiled graph per worker process, shared by all sessions it serves
+    global _graph
+    if _graph is None:
+        _graph = build_graph()
+    return _graph
+
+class SessionCreate(BaseModel):
+    patient: Dict[str, Any] = {}
+
+class MessageIn(BaseModel):
+    text: str = ""
+    patient: Optional[Dict[str, Any]] = None
+
+class AppointmentRef(BaseModel):
+    doctor_name: str
+    date_slot: datetime
+    patient_id: Optional[int] = None
+
+class RescheduleIn(AppointmentRef):
+    new_date_slot: datetime
+    new_doctor_name: Optional[str] = None
+
+def _jsonable(val):
+    if isinstance(val, (datetime, date)):
+        return val.isoformat()
+    if hasattr(val, "to_pydatetime"):
+        return val.to_pydatetime().isoformat()
+    if isinstance(val, float) and math.isnan(val):
+        return None
+    if hasattr(val, "item"):
+        # numpy scalars from pandas rows
+        return val.item()
+    return val
+
+def _booking_view(state: AgentState) -> dict:
+    appt = state.get("appointment") or {}
+    patient = state.get("patient") or {}
+    return {
+        "patient_id": _jsonable(patient.get("patient_id")),
+        "is_new_patient": state.get("is_new_patient"),
+        "booking": {
+            "status": appt.get("status", "pending" if appt else "none"),
+            "doctor_name": appt.get("doctor_name"),
+            "date_slot": _jsonable(appt.get("date_slot")),
+            "duration_min": appt.get("duration_min"),
+            "options": [_jsonable(o.get("date_slot")) for o in appt.get("options", [])],
+        },
+    }
+
+def _new_replies(state: AgentState, since: int) -> list:
+    return [m.content for m in state.get("messages", [])[since:] if isinstance(m, AIMessage)]
+
+def _own_session(state) -> bool:
+    # Sessions from before tenancy belong to the default clinic
+    return state is not None and state.get("clinic", tenancy.DEFAULT_TENANT) == tenancy.current_tenant()
+
+def _client_patient(fields: dict) -> dict:
+    # patient_id is only ever assigned by the lookup
+    return {k: v for k, v in (fields or {}).items() if k != "patient_id"}
+
+async def _patient_scope(x_session_id: Optional[str] = Header(default=None),
+                         x_api_key: Optional[str] = Header(default=None)) -> Optional[int]:
+    """The patient the caller may act for: its session's looked-up patient, or None (any) for staff."""
+    if STAFF_API_KEY and x_api_key and hmac.compare_digest(x_api_key, STAFF_API_KEY):
+        return None
+    if x_session_id and sessions.is_valid_session_id(x_session_id):
+        state = await sessions.aload_session(x_session_id)
+        if _own_session(state) and (state.get("patient") or {}).get("patient_id") is not None:
+            return int(state["patient"]["patient_id"])
+    raise HTTPException(status_code=401, detail="X-Session-Id of a session with a looked-up patient is required")
+
+def _acting_for(scope: Optional[int], patient_id: Optional[int]) -> Optional[int]:
+    """patient_id to pass to data_io: the session's patient; a different requested one is refused."""
+    if scope is None:
+        return patient_id
+    if patient_id is not None and int(patient_id) != scope:
+        raise HTTPException(status_code=404, detail="No such booking")
+    return scope
+
+def _ready_for_lookup(patient: dict) -> bool:
+    return all(patient.get(k) for k in ("first_name", "last_name", "dob"))
+
+@app.post("/sessions")
+async def create_session(body: SessionCreate):
+    """Start a conversation. If name and DOB are supplied the patient lookup runs immediately."""
+    state = AgentState(messages=[], patient=_client_patient(body.patient), clinic=tenancy.current_tenant())
+    if _ready_for_lookup(state["patient"]):
+        state, _ = await arun_turn(_get_graph(), "", state)
+    session_id = sessions.new_session_id()
+    await sessions.asave_session(session_id, state)
+    return {"session_id": session_id, "messages": _new_replies(state, 0), **_booking_view(state)}
+
+@app.post("/sessions/{session_id}/messages")
+async def send_message(session_id: str, body: MessageIn):
+    if not sessions.is_valid_session_id(session_id):
+        raise HTTPException(status_code=404, detail="Unknown session")
+    async with sessions.asession_lock(session_id):
+        state = await sessions.aload_session(session_id)
+        if not _own_session(state):
+            raise HTTPException(status_code=404, detail="Unknown session")
+        if body.patient:
+            # Details are taken only until the lookup has identified the patient
+            if state.get("is_new_patient") is not None:
+                raise HTTPException(status_code=409, detail="Patient details cannot change after the lookup")
+            state.setdefault("patient", {}).update(_client_patient(body.patient))
+        if not body.text and state.get("is_new_patient") is not None:
+            raise HTTPException(status_code=400, detail="Message text is required")
+        before = len(state.get("messages", [])) + (1 if body.text else 0)
+        state, reply = await arun_turn(_get_graph(), body.text, state)
+        await sessions.asave_session(session_id, state)
+    return {"reply": reply, "messages": _new_replies(state, before), **_booking_view(state)}
+
+@app.get("/sessions/{session_id}/booking")
+async def booking_status(session_id: str):
+    state = await sessions.aload_session(session_id)
+    if not _own_session(state):
+        raise HTTPException(status_code=404, detail="Unknown session")
+    return _booking_view(state)
+
+@app.get("/doctors")
+async def list_doctors(prefix: str = ""):
+    """Doctor catalog; `prefix` gives typeahead matches on any part of the name."""
+    catalog = await run_blocking(get_catalog)
+    entries = catalog.complete(prefix, limit=20) if prefix else catalog.entries
+    return {"doctors": [
+        {"name": e["name"], "specialty": e["specialty"], "next_available": _jsonable(catalog.next_available(e))}
+        for e in entries
+    ]}
+
+@app.get("/doctors/resolve")
+async def resolve_doctor(q: str):
+    """Resolve a partial or misspelled name ("wong", "Dr Alice") to one doctor, or list candidates."""
+    catalog = await run_blocking(get_catalog)
+    return {"doctor": catalog.resolve(q), "candidates": [e["name"] for _, e in catalog.match(q, limit=5)]}
+
+@app.post("/appointments/cancel")
+async def cancel_appointment(body: AppointmentRef, scope: Optional[int] = Depends(_patient_scope)):
+    """Release a booking: frees its slots, marks the record cancelled, drops reminders, backfills the waitlist."""
+    from tools.data_io import arelease_slot
+    released = await arelease_slot(body.doctor_name, body.date_slot, _acting_for(scope, body.patient_id))
+    if released is None:
+        raise HTTPException(status_code=404, detail="No such booking")
+    return {"cancelled": {k: _jsonable(released[k]) for k in ("doctor_name", "date_slot", "patient_id")}}
+
+@app.post("/appointments/reschedule")
+async def reschedule_appointment(body: RescheduleIn, scope: Optional[int] = Depends(_patient_scope)):
+    """Move a booking in one atomic step; 409 if the booking is missing or the new slot is not free."""
+    from tools.data_io import areschedule
+    ok, new = await areschedule(body.doctor_name, body.date_slot, body.new_date_slot,
+                                body.new_doctor_name, _acting_for(scope, body.patient_id))
+    if not ok:
+        raise HTTPException(status_code=409, detail="Booking not found or the new slot is not available")
+    return {"appointment": {k: _jsonable(new[k]) for k in ("doctor_name", "date_slot", "patient_id", "duration_min")}}
+
+@app.get("/patients/{patient_id}/appointments")
+async def patient_appointments(patient_id: int, limit: Optional[int] = None,
+                               scope: Optional[int] = Depends(_patient_scope)):
+    """The patient's upcoming visits with every doctor, from the per-patient index (no schedule scan)."""
+    from tools.data_io import aupcoming_appointments
+    if scope is not None and scope != patient_id:
+        raise HTTPException(status_code=404, detail="Unknown patient")
+    visits = await aupcoming_appointments(patient_id, None, limit)
+    return {"patient_id": patient_id,
+            "appointments": [{k: _jsonable(v) for k, v in visit.items()} for visit in visits]}
+
+@app.get("/analytics/utilization")
+async def utilization(day: date, specialty: Optional[str] = None):
+    """Per-doctor and per-specialty booked/free ratios for one day, from the materialized aggregates."""
+    from tools import analytics
+    doctors = await run_blocking(analytics.utilization, day, specialty)
+    return {"day": day.isoformat(), "doctors": doctors, "specialties": await run_blocking(analytics.by_specialty, day)}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Span latency histograms for this worker (Prometheus text format); empty unless TRACE_SPANS is set."""
+    return tracing.metrics_text()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "api_server:app",
+        host=os.environ.get("API_HOST", "127.0.0.1"),
+        port=int(os.environ.get("API_PORT", "8000")),
+        workers=int(os.environ.get("API_WORKERS", "2")),
+    )
@@ -0,0 +1,227 @@
+# benchmark.py
+"""
+Benchmarks for tools/data_io on synthetic clinics of increasing size.
+
+Each size is generated once (tools/synthetic.py) into a cache directory and copied fresh
+for every run, so runs start from identical data. Every size is served as its own clinic
+(tools.tenancy) in one process. For each operation the first call after dropping the read
+caches is reported as `cold` (file parse plus index build) and the median of the following
+calls as `warm`.
+
+Usage:
+    python benchmark.py                              # small + medium, compared with benchmark_baseline.json
+    python benchmark.py --sizes small medium large --repeat 7
+    python benchmark.py --update-baseline            # store this run's numbers as the baseline
+    python benchmark.py --threshold 0.3 --json bench.json
+Exits 1 when a timing is slower than its baseline by more than the threshold. Baselines are
+machine-specific: record them on the machine that runs the comparison.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+SIZES = {
+    "small": {"doctors": 20, "days": 30, "patients": 5_000, "appointments": 1_000, "layout": "grid"},
+    "medium": {"doctors": 100, "days": 90, "patients": 100_000, "appointments": 20_000, "layout": "grid"},
+    # 500 x 180 days of 30-minute slots is past Excel's row limit as a grid, so this size uses weekly rules
+    "large": {"doctors": 500, "days": 180, "patients": 1_000_000, "appointments": 100_000, "layout": "rules"},
+}
+OPERATIONS = ("find_patient_by_name_dob", "ensure_patient_record", "find_available_slots",
+              "find_next_available_slots", "reserve_slot", "reserve_slots_batch", "append_appointment_export",
+              "list_doctor_names")
+# Reservations committed together by reserve_slots_batch (tools/reservations.py group commit)
+BATCH_SIZE = 16
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DATASET_META = "dataset.json"
+
+def _tenant(size: str) -> str:
+    return f"bench-{size}"
+
+def _generate(path: str, params: dict, start_day: date, seed: int):
+    from tools import synthetic
+    patients = synthetic.make_patients(params["patients"], seed=seed)
+    availability = None
+    if params["layout"] == "rules":
+        availability = synthetic.make_availability(params["doctors"], start_day)
+        slots = synthetic.rule_slots(availability, params["days"], start_day)
+    else:
+        slots = synthetic.make_schedule(params["doctors"], params["days"], start_day, seed=seed)
+    booked, appts = synthetic.make_appointments(slots, patients, params["appointments"], seed=seed)
+    if availability is None:
+        # Grid layout: every slot has a row; the booked ones carry the patient
+        key = ["doctor_name", "date_slot"]
+        doctors = slots.drop(columns=["patient_id"]).merge(booked[key + ["patient_id"]], on=key, how="left")
+        doctors["is_available"] = doctors["patient_id"].isna()
+    else:
+        doctors = booked
+    synthetic.write_dataset(path, doctors, patients, appts, availability)
+    with open(os.path.join(path, DATASET_META), "w", encoding="utf-8") as fh:
+        json.dump({**params, "start_day": start_day.isoformat(), "seed": seed}, fh)
+
+def prepare(size: str, data_dir: str, seed: int) -> dict:
+    """Generate the size's pristine dataset if missing or stale, copy it to the clinic directory; returns its metadata."""
+    from tools import tenancy
+    params = SIZES[size]
+    pristine = os.path.join(data_dir, "pristine", size)
+    meta_path = os.path.join(pristine, DATASET_META)
+    meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as fh:
+            meta = json.load(fh)
+    fresh = (meta is not None and all(meta.get(k) == v for k, v in params.items()) and meta.get("seed") == seed
+             and date.fromisoformat(meta["start_day"]) > date.today())
+    if not fresh:
+        shutil.rmtree(pristine, ignore_errors=True)
+        t0 = time.perf_counter()
+        print(f"[{size}] generating dataset ...", file=sys.stderr)
+        _generate(pristine, params, date.today() + timedelta(days=1), seed)
+        print(f"[{size}] generated in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    target = tenancy.tenant_dir(_tenant(size))
+    shutil.rmtree(target, ignore_errors=True)
+    shutil.copytree(pristine, target)
+    with open(meta_path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+def _timed(func, *args):
+    t0 = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - t0) * 1000.0
+
+def _measure(calls: list) -> dict:
+    """calls: [(func, args)]; the first runs on cold caches, the rest give the warm median."""
+    from tools import data_io
+    data_io.invalidate_caches()
+    func, args = calls[0]
+    cold = _timed(func, *args)
+    warm = [_timed(func, *args) for func, args in calls[1:]]
+    return {"cold_ms": round(cold, 3), "warm_ms": round(statistics.median(warm), 3) if warm else None}
+
+def run_size(size: str, meta: dict, repeat: int, seed: int) -> dict:
+    from tools import data_io
+    rng = random.Random(seed)
+    start_day = date.fromisoformat(meta["start_day"])
+    doctors = data_io.list_doctor_names()
+    patients = data_io._read_patients()
+    known = patients.sample(n=repeat + 1, random_state=seed)[["first_name", "last_name", "dob"]].values.tolist()
+    n = repeat + 1
+    days = [start_day + timedelta(days=rng.randrange(meta["days"])) for _ in range(n)]
+    picks = [rng.choice(doctors) for _ in range(n)]
+
+    results = {}
+    results["find_patient_by_name_dob"] = _measure([(data_io.find_patient_by_name_dob, tuple(k)) for k in known])
+    new_patients = [{"first_name": "Bench", "last_name": f"Runner{chr(97 + i % 26)}{i}", "dob": "1990-01-01",
+                     "cell_phone": "9876543210", "email": f"bench{i}@example.com"} for i in range(n)]
+    results["ensure_patient_record"] = _measure([(data_io.ensure_patient_record, (p,)) for p in new_patients])
+    results["find_available_slots"] = _measure([(data_io.find_available_slots, (d, day)) for d, day in zip(picks, days)])
+    results["find_next_available_slots"] = _measure(
+        [(data_io.find_next_available_slots, (d, day, 30, 5)) for d, day in zip(picks, days)])
+
+    # Open slots to book, found outside the timed calls
+    targets = []
+    for d in doctors:
+        for day in days:
+            free = data_io.find_available_slots(d, day)
+            if free:
+                targets.append((d, free[rng.randrange(len(free))]["date_slot"]))
+                break
+        if len(targets) == n:
+            break
+    if targets:
+        results["reserve_slot"] = _measure([(data_io.reserve_slot, (d, t, 1)) for d, t in targets])
+    batches = []
+    for d, day in zip(picks, days):
+        free = data_io.find_available_slots(d, day)
+        if free:
+            batches.append([(d, s["date_slot"], 1, 30) for s in free[:BATCH_SIZE]])
+    if batches:
+        results["reserve_slots_batch"] = _measure([(data_io.reserve_slots, (b,)) for b in batches])
+    patient = {"patient_id": 1, "first_name": "Bench", "last_name": "Runner"}
+    appts = [{"doctor_name": d, "date_slot": datetime.combine(day, datetime.min.time()) + timedelta(hours=9)}
+             for d, day in zip(picks, days)]
+    results["append_appointment_export"] = _measure([(data_io.append_appointment_export, (patient, a)) for a in appts])
+    results["list_doctor_names"] = _measure([(data_io.list_doctor_names, ())] * n)
+    return results
+
+def compare(current: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list:
+    """[(size, operation, metric, baseline ms, current ms)] for timings past the threshold."""
+    regressions = []
+    for size, ops in current.items():
+        for op, timings in ops.items():
+            base = baseline.get(size, {}).get(op, {})
+            for metric, value in timings.items():
+                ref = base.get(metric)
+                if value is None or ref is None:
+                    continue
+                if value > ref * (1 + threshold) and value - ref > min_delta_ms:
+                    regressions.append((size, op, metric, ref, value))
+    return regressions
+
+def _report(results: dict, baseline: dict):
+    print(f"{'size':8s} {'operation':28s} {'cold ms':>10s} {'warm ms':>10s} {'base warm':>10s} {'change':>8s}")
+    for size, ops in results.items():
+        for op in OPERATIONS:
+            if op not in ops:
+                continue
+            t = ops[op]
+            ref = baseline.get(size, {}).get(op, {}).get("warm_ms")
+            change = f"{(t['warm_ms'] / ref - 1):+.0%}" if ref and t["warm_ms"] is not None else ""
+            warm = f"{t['warm_ms']:.2f}" if t["warm_ms"] is not None else "-"
+            print(f"{size:8s} {op:28s} {t['cold_ms']:10.2f} {warm:>10s} {ref if ref is not None else '-':>10} {change:>8s}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="tools/data_io benchmarks on synthetic data")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--repeat", type=int, default=5, help="warm calls per operation")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "clinic-bench"),
+                        help="where generated datasets are cached between runs")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="write this run's numbers as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    # Must be set before tools.* is imported: every size is a clinic under this directory
+    os.environ["CLINIC_TENANTS_DIR"] = args.data_dir
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    from tools import tenancy
+
+    results = {}
+    for size in args.sizes:
+        meta = prepare(size, args.data_dir, args.seed)
+        with tenancy.use_tenant(_tenant(size)):
+            results[size] = run_size(size, meta, args.repeat, args.seed)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh).get("results", {})
+    _report(results, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"results": results}, fh, indent=2)
+    if args.update_baseline:
+        merged = {**baseline, **results}
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump({"recorded_at": datetime.now().isoformat(timespec="seconds"), "results": merged}, fh, indent=2)
+        print(f"baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    for size, op, metric, ref, value in regressions:
+        print(f"REGRESSION {size} {op} {metric}: {ref:.2f} ms -> {value:.2f} ms", file=sys.stderr)
+    if not baseline:
+        print(f"no baseline at {args.baseline}; run with --update-baseline to record one", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# check_booking.py
+"""
+Self-check of the reservation path in tools/data_io.py (run in CI or after changing it).
+
+Writes a synthetic clinic with no bookings to a temporary data directory and checks that:
+  - the first booking into the empty schedule succeeds and shows up in the patient's visits
+  - a second patient cannot take the same slot
+  - the same patient cannot hold an overlapping visit with another doctor (patient_conflict)
+  - a 60-minute visit takes two consecutive slots
+
+Usage:
+    python check_booking.py
+    python check_booking.py --keep-data      # keep the temporary data directory
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+def run_checks() -> list:
+    from tools import data_io
+    from tools.synthetic import doctor_names
+
+    failures = []
+
+    def check(name, ok, detail=""):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not ok:
+            failures.append(name)
+
+    first, second = doctor_names(2)
+    day = date.today() + timedelta(days=1)
+    nine = datetime.combine(day, datetime.min.time()) + timedelta(hours=9)
+
+    try:
+        result = data_io.reserve_slot(first, nine, 1)
+    except Exception as e:
+        result = (False, e)
+    check("first booking into an empty schedule", result[0], str(result[1]))
+    visits = data_io.upcoming_appointments(1)
+    check("booking indexed for the patient", [v["date_slot"] for v in visits] == [nine], str(visits))
+
+    ok, detail = data_io.reserve_slot(first, nine, 2)
+    check("taken slot refused", not ok and detail is None, str(detail))
+
+    ok, detail = data_io.reserve_slot(second, nine, 1)
+    check("overlapping visit with another doctor refused",
+          not ok and (detail or {}).get("reason") == data_io.PATIENT_CONFLICT, str(detail))
+
+    ten = nine + timedelta(hours=1)
+    ok, _ = data_io.reserve_slot(second, ten, 2, duration_min=60)
+    open_times = {s["date_slot"] for s in data_io.find_available_slots(second, day)}
+    check("60-minute visit takes two slots", ok and ten not in open_times and ten + timedelta(minutes=30) not in open_times)
+    return failures
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check booking into a fresh schedule with tools/data_io.py")
+    parser.add_argument("--keep-data", action="store_true", help="keep the temporary data directory")
+    args = parser.parse_args(argv)
+
+    data_dir = tempfile.mkdtemp(prefix="clinic-check-")
+    # Must be set before tools.data_io is imported
+    os.environ["CLINIC_DATA_DIR"] = data_dir
+    from tools.synthetic import make_schedule, make_patients, write_dataset
+    write_dataset(data_dir, make_schedule(2, 2), make_patients(5))
+    try:
+        failures = run_checks()
+    finally:
+        if args.keep_data:
+            print(f"data kept in {data_dir}")
+        else:
+            shutil.rmtree(data_dir, ignore_errors=True)
+    if failures:
+        print("\nBooking check failed:\n  " + "\n  ".join(failures))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
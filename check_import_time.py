@@ -0,0 +1,105 @@
+# check_import_time.py
+"""
+Import-time budget check for the app entry points (run in CI or before a release).
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for each target,
+prints the slowest imports, and exits non-zero if a target exceeds its budget or
+pulls in a dependency that is meant to load lazily. For streamlit_app the Streamlit
+framework's own import is left out of the budget and the lazy check: only the app's
+import chain (agent_graph, tools.*) is ours to keep cheap.
+
+Usage:
+    python check_import_time.py                    # default targets and budget
+    python check_import_time.py agent_graph --budget-ms 300 --top 15
+Budget can also be set with IMPORT_BUDGET_MS.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+DEFAULT_TARGETS = ["agent_graph", "tools.data_io", "streamlit_app"]
+
+# Modules that must not be imported until first real use, per target. tools.data_io needs
+# pandas at import time, which may load pytz, so pytz is only required to be lazy elsewhere.
+_DEFERRED = ["twilio", "apscheduler", "langchain_google_genai", "langgraph"]
+LAZY_MODULES = {
+    "agent_graph": _DEFERRED + ["pytz", "pandas"],
+    "tools.data_io": _DEFERRED,
+    "streamlit_app": _DEFERRED + ["pytz", "pandas"],
+}
+# Third-party frameworks a target runs inside; their import subtree is not counted
+FRAMEWORKS = {"streamlit_app": ["streamlit"]}
+
+def _without(rows: list, frameworks) -> list:
+    """Drop `frameworks` and everything imported on their behalf from (name, depth, ...) rows."""
+    kept, skip_depth = [], None
+    # -X importtime lists children before their parent; walk parent-first
+    for row in reversed(rows):
+        name, depth = row[0], row[1]
+        if skip_depth is not None and depth > skip_depth:
+            continue
+        skip_depth = depth if name.split(".")[0] in frameworks else None
+        if skip_depth is None:
+            kept.append(row)
+    return kept[::-1]
+
+def profile_import(module: str):
+    """Return a list of (module_name, depth, self_us, cumulative_us) in import order."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or [""]
+        raise RuntimeError(f"import {module} failed: {tail[0]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cum_us)))
+    return rows
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check import-time budget of entry modules")
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", "500")))
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to show")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for target in args.targets:
+        try:
+            rows = profile_import(target)
+        except RuntimeError as e:
+            failures.append(str(e))
+            print(f"✗ {e}")
+            continue
+        frameworks = FRAMEWORKS.get(target, [])
+        skipped_us = sum(cum for name, depth, _, cum in rows if name in frameworks)
+        rows = _without(rows, frameworks)
+        total_ms = (next((cum for name, _, _, cum in rows if name == target), 0) - skipped_us) / 1000.0
+        status = "ok" if total_ms <= args.budget_ms else "OVER BUDGET"
+        excluded = f", excluding {', '.join(frameworks)} {skipped_us / 1000.0:.1f} ms" if frameworks else ""
+        print(f"{target}: {total_ms:.1f} ms cumulative{excluded} (budget {args.budget_ms:.0f} ms) — {status}")
+        for name, _, self_us, cum_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+            print(f"    {self_us / 1000.0:8.1f} ms self {cum_us / 1000.0:8.1f} ms cum  {name}")
+        if total_ms > args.budget_ms:
+            failures.append(f"{target} import took {total_ms:.1f} ms")
+
+        loaded = {name.split(".")[0] for name, _, _, _ in rows}
+        eager = [m for m in LAZY_MODULES.get(target, _DEFERRED) if m in loaded]
+        if eager:
+            failures.append(f"{target} eagerly imports {', '.join(eager)}")
+            print(f"    eagerly imported: {', '.join(eager)}")
+
+    if failures:
+        print("\nImport-time check failed:\n  " + "\n  ".join(failures))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
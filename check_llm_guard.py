@@ -0,0 +1,158 @@
+# check_llm_guard.py
+"""
+Self-check of the guarded LLM calls in tools/llm.py (run in CI or after changing them).
+
+Drives complete() / acomplete() against a local fake model with injected latency and
+errors, no provider or API key needed, and checks that:
+  - a reply within the deadline is returned, a slow one is cut off at the deadline
+  - a slow first attempt is hedged and the faster second attempt wins
+  - every attempt is tagged nostream, so no reply text streams into the chat
+  - the turn budget caps every call made inside it
+  - the breaker opens after consecutive failures, fails fast, and a probe closes it again
+  - a cancelled half-open probe does not leave the breaker stuck open
+  - a model client that cannot be built raises LLMUnavailable
+
+Usage:
+    python check_llm_guard.py
+    python check_llm_guard.py --slack-ms 150     # allowed lateness on a loaded machine
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import time
+
+class _Reply:
+    def __init__(self, content):
+        self.content = content
+
+class FakeModel:
+    """invoke/ainvoke stand-in: each call takes the next (latency ms, error?) from `script`, then repeats the last."""
+
+    def __init__(self, *script):
+        self._script = itertools.chain(script, itertools.repeat(script[-1]))
+        self.calls = 0
+        self.configs = []
+
+    def _next(self, config):
+        self.calls += 1
+        self.configs.append(config)
+        return next(self._script)
+
+    def invoke(self, messages, config=None):
+        latency_ms, error = self._next(config)
+        time.sleep(latency_ms / 1000.0)
+        if error:
+            raise RuntimeError("injected model error")
+        return _Reply("ok")
+
+    async def ainvoke(self, messages, config=None):
+        latency_ms, error = self._next(config)
+        await asyncio.sleep(latency_ms / 1000.0)
+        if error:
+            raise RuntimeError("injected model error")
+        return _Reply("ok")
+
+FAST, SLOW, FAIL = (10, False), (2000, False), (0, True)
+
+def _timed(func, *args, **kwargs):
+    t0 = time.perf_counter()
+    try:
+        return func(*args, **kwargs), (time.perf_counter() - t0) * 1000.0
+    except Exception as e:
+        return e, (time.perf_counter() - t0) * 1000.0
+
+def run_checks(slack_ms: float) -> list:
+    from tools import llm
+
+    failures = []
+
+    def check(name, ok, detail=""):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not ok:
+            failures.append(name)
+
+    llm.CALL_TIMEOUT_MS, llm.HEDGE_MS, llm.MAX_ATTEMPTS = 300.0, 100.0, 2
+    llm.breaker = llm.CircuitBreaker(failures=3, cooldown_s=0.3)
+
+    result, ms = _timed(llm.complete, [], FakeModel(FAST))
+    check("fast reply returned", result == "ok", f"{ms:.0f} ms")
+
+    result, ms = _timed(llm.complete, [], FakeModel(SLOW))
+    check("slow reply cut off at the call deadline",
+          isinstance(result, llm.LLMUnavailable) and ms < 300 + slack_ms, f"{ms:.0f} ms")
+
+    model = FakeModel(SLOW, FAST)
+    result, ms = _timed(llm.complete, [], model)
+    check("slow first attempt hedged", result == "ok" and model.calls == 2 and ms < 100 + 10 + slack_ms,
+          f"{ms:.0f} ms, {model.calls} attempts")
+
+    model = FakeModel(SLOW, FAST)
+    result, ms = _timed(asyncio.run, llm.acomplete([], model))
+    check("async hedge", result == "ok" and model.calls == 2, f"{ms:.0f} ms")
+    check("every attempt tagged nostream",
+          all(llm.NOSTREAM_TAG in (c or {}).get("tags", ()) for c in model.configs), str(model.configs))
+
+    model = FakeModel(FAIL, FAST)
+    result, _ = _timed(llm.complete, [], model)
+    check("failed attempt retried", result == "ok" and model.calls == 2)
+
+    with llm.turn_budget(150):
+        result, ms = _timed(llm.complete, [], FakeModel(SLOW))
+    check("turn budget caps the call deadline",
+          isinstance(result, llm.LLMUnavailable) and ms < 150 + slack_ms, f"{ms:.0f} ms")
+    with llm.turn_budget(0):
+        result, _ = _timed(llm.complete, [], FakeModel(FAST))
+    check("spent budget refuses without calling", isinstance(result, llm.LLMUnavailable))
+
+    llm.breaker = llm.CircuitBreaker(failures=3, cooldown_s=0.3)
+    for _ in range(3):
+        _timed(llm.complete, [], FakeModel(FAIL))
+    model = FakeModel(FAST)
+    result, ms = _timed(llm.complete, [], model)
+    check("breaker opens and fails fast",
+          isinstance(result, llm.LLMUnavailable) and model.calls == 0 and ms < 20,
+          f"{llm.breaker.state()['state']}, {ms:.1f} ms")
+    time.sleep(0.35)
+    result, _ = _timed(llm.complete, [], FakeModel(FAST))
+    check("half-open probe closes the breaker", result == "ok" and llm.breaker.state()["state"] == "closed")
+
+    for _ in range(3):
+        _timed(llm.complete, [], FakeModel(FAIL))
+    time.sleep(0.35)
+
+    async def cancelled_probe():
+        task = asyncio.ensure_future(llm.acomplete([], FakeModel(SLOW)))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    asyncio.run(cancelled_probe())
+    result, _ = _timed(llm.complete, [], FakeModel(FAST))
+    check("cancelled probe frees the half-open slot", result == "ok", llm.breaker.state()["state"])
+
+    llm.breaker = llm.CircuitBreaker(failures=3, cooldown_s=0.3)
+    saved = {k: os.environ.pop(k, None) for k in ("GEMINI_API_KEY", "LLM_PROVIDER")}
+    try:
+        result, _ = _timed(llm.complete, [])
+    finally:
+        os.environ.update({k: v for k, v in saved.items() if v is not None})
+    check("missing client raises LLMUnavailable", isinstance(result, llm.LLMUnavailable), str(result))
+    return failures
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check deadlines, hedging and the circuit breaker of tools/llm.py")
+    parser.add_argument("--slack-ms", type=float, default=100.0, help="allowed lateness of a deadline")
+    args = parser.parse_args(argv)
+    failures = run_checks(args.slack_ms)
+    if failures:
+        print("\nLLM guard check failed:\n  " + "\n  ".join(failures))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+# load_test.py
+"""
+Concurrent end-to-end load test of the booking flow.
+
+Drives N simulated patients through run_turn (lookup -> "Dr. X on DATE" -> option pick)
+against a synthetic schedule in a temporary data directory. SMS, email, reminders and
+the LLM are stubbed locally, so nothing leaves the machine.
+
+Usage:
+    python load_test.py --patients 200 --concurrency 20 --doctors 5 --days 5
+    python load_test.py --mode async --patients 500 --concurrency 100 --json report.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+CONFLICT_TEXT = "just taken"
+
+class Stats:
+    def __init__(self):
+        self._guard = threading.Lock()
+        self.turn_latency = {}   # turn kind -> [seconds]
+        self.lock_waits = []
+        self.bookings = 0
+        self.attempts = 0
+        self.conflicts = 0
+        self.no_slots = 0
+        self.errors = 0
+
+    def add_turn(self, kind, seconds):
+        with self._guard:
+            self.turn_latency.setdefault(kind, []).append(seconds)
+
+    def add_lock_wait(self, seconds):
+        with self._guard:
+            self.lock_waits.append(seconds)
+
+    def bump(self, field, n=1):
+        with self._guard:
+            setattr(self, field, getattr(self, field) + n)
+
+def _percentiles(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pct(50) * 1000,
+        "p90_ms": pct(90) * 1000,
+        "p99_ms": pct(99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+def _install_stubs(stats):
+    """Replace notifications/reminders with local no-ops and time the data-file lock."""
+    import agents.confirm_agent as confirm_agent
+    import agents.reminder_agent as reminder_agent
+    from tools import data_io
+
+    confirm_agent.send_sms = lambda to, body: "SM-loadtest"
+    confirm_agent.send_email = lambda to, subject, body: None
+
+    async def _asend_sms(to, body):
+        return "SM-loadtest"
+
+    async def _asend_email(to, subject, body):
+        return None
+
+    confirm_agent.asend_sms = _asend_sms
+    confirm_agent.asend_email = _asend_email
+    reminder_agent.schedule_reminder_job = lambda appt: None
+
+    original_lock = data_io._file_lock
+
+    @contextmanager
+    def timed_lock():
+        outermost = getattr(data_io._lock_depth, "n", 0) == 0
+        t0 = time.perf_counter()
+        with original_lock():
+            if outermost:
+                stats.add_lock_wait(time.perf_counter() - t0)
+            yield
+
+    data_io._file_lock = timed_lock
+
+def _plan(patient_row, doctors, start_day, days, rng):
+    return {
+        "patient": {
+            "first_name": patient_row["first_name"],
+            "last_name": patient_row["last_name"],
+            "dob": patient_row["dob"],
+            "cell_phone": patient_row["cell_phone"],
+            "email": patient_row["email"],
+        },
+        "doctor": rng.choice(doctors),
+        "day": start_day + timedelta(days=rng.randrange(days)),
+    }
+
+def _booked(state):
+    return state.get("appointment", {}).get("status") == "confirmed"
+
+def _simulate(app, run_turn, plan, stats, pick, max_retries, rng):
+    from agent_graph import AgentState
+    state = AgentState(messages=[], patient=dict(plan["patient"]))
+
+    def turn(kind, text):
+        nonlocal state
+        t0 = time.perf_counter()
+        state, reply = run_turn(app, text, state)
+        stats.add_turn(kind, time.perf_counter() - t0)
+        return reply
+
+    turn("lookup", "")
+    for _ in range(max_retries + 1):
+        turn("request", f"{plan['doctor']} on {plan['day']:%Y-%m-%d}")
+        options = state.get("appointment", {}).get("options") or []
+        if not options:
+            stats.bump("no_slots")
+            return
+        choice = 1 if pick == "first" else rng.randint(1, len(options))
+        stats.bump("attempts")
+        reply = turn("pick", str(choice))
+        if _booked(state):
+            stats.bump("bookings")
+            return
+        if CONFLICT_TEXT in reply:
+            stats.bump("conflicts")
+            continue
+        return
+
+async def _asimulate(app, arun_turn, plan, stats, pick, max_retries, rng):
+    from agent_graph import AgentState
+    state = AgentState(messages=[], patient=dict(plan["patient"]))
+
+    async def turn(kind, text):
+        nonlocal state
+        t0 = time.perf_counter()
+        state, reply = await arun_turn(app, text, state)
+        stats.add_turn(kind, time.perf_counter() - t0)
+        return reply
+
+    await turn("lookup", "")
+    for _ in range(max_retries + 1):
+        await turn("request", f"{plan['doctor']} on {plan['day']:%Y-%m-%d}")
+        options = state.get("appointment", {}).get("options") or []
+        if not options:
+            stats.bump("no_slots")
+            return
+        choice = 1 if pick == "first" else rng.randint(1, len(options))
+        stats.bump("attempts")
+        reply = await turn("pick", str(choice))
+        if _booked(state):
+            stats.bump("bookings")
+            return
+        if CONFLICT_TEXT in reply:
+            stats.bump("conflicts")
+            continue
+        return
+
+def _run_threads(app, plans, stats, args):
+    from agent_graph import run_turn
+
+    def one(i, plan):
+        try:
+            _simulate(app, run_turn, plan, stats, args.pick, args.max_retries, random.Random(args.seed + i))
+        except Exception as e:
+            stats.bump("errors")
+            print(f"patient {i} failed: {e}", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda ip: one(*ip), enumerate(plans)))
+
+async def _run_async(app, plans, stats, args):
+    from agent_graph import arun_turn
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one(i, plan):
+        async with sem:
+            try:
+                await _asimulate(app, arun_turn, plan, stats, args.pick, args.max_retries, random.Random(args.seed + i))
+            except Exception as e:
+                stats.bump("errors")
+                print(f"patient {i} failed: {e}", file=sys.stderr)
+
+    await asyncio.gather(*(one(i, p) for i, p in enumerate(plans)))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent booking-flow load test")
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--doctors", type=int, default=5)
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--slots-per-day", type=int, default=16)
+    parser.add_argument("--mode", choices=["threads", "async"], default="threads")
+    parser.add_argument("--pick", choices=["first", "random"], default="random",
+                        help="'first' makes every patient race for the same option")
+    parser.add_argument("--max-retries", type=int, default=2, help="re-requests after a conflict")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep-data", action="store_true", help="keep the temporary data directory")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    data_dir = tempfile.mkdtemp(prefix="clinic-load-")
+    # Must be set before tools.data_io is imported
+    os.environ["CLINIC_DATA_DIR"] = data_dir
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+
+    from tools.synthetic import make_schedule, make_patients, write_dataset, doctor_names
+    start_day = date.today() + timedelta(days=1)
+    patients = make_patients(args.patients, seed=args.seed)
+    write_dataset(
+        data_dir,
+        make_schedule(args.doctors, args.days, start_day, slots_per_day=args.slots_per_day, seed=args.seed),
+        patients,
+    )
+
+    from agent_graph import build_graph
+    stats = Stats()
+    _install_stubs(stats)
+    app = build_graph()
+
+    rng = random.Random(args.seed)
+    doctors = doctor_names(args.doctors)
+    plans = [_plan(row, doctors, start_day, args.days, rng) for row in patients.to_dict("records")]
+
+    t0 = time.perf_counter()
+    try:
+        if args.mode == "async":
+            asyncio.run(_run_async(app, plans, stats, args))
+        else:
+            _run_threads(app, plans, stats, args)
+        elapsed = time.perf_counter() - t0
+    finally:
+        if not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    all_turns = [s for v in stats.turn_latency.values() for s in v]
+    report = {
+        "config": vars(args),
+        "elapsed_s": elapsed,
+        "bookings": stats.bookings,
+        "bookings_per_s": stats.bookings / elapsed if elapsed else 0.0,
+        "reservation_attempts": stats.attempts,
+        "conflicts": stats.conflicts,
+        "conflict_rate": stats.conflicts / stats.attempts if stats.attempts else 0.0,
+        "no_slots": stats.no_slots,
+        "errors": stats.errors,
+        "turn_latency": {"all": _percentiles(all_turns),
+                         **{k: _percentiles(v) for k, v in stats.turn_latency.items()}},
+        "lock_wait": {**_percentiles(stats.lock_waits), "total_s": sum(stats.lock_waits)},
+    }
+
+    print(f"{stats.bookings} bookings in {elapsed:.2f}s → {report['bookings_per_s']:.2f} bookings/s "
+          f"({args.patients} patients, concurrency {args.concurrency}, {args.mode})")
+    print(f"conflicts: {stats.conflicts}/{stats.attempts} attempts ({report['conflict_rate']:.1%}), "
+          f"no slots: {stats.no_slots}, errors: {stats.errors}")
+    for kind, summary in report["turn_latency"].items():
+        if summary["count"]:
+            print(f"turn {kind:8s} n={summary['count']:5d} p50={summary['p50_ms']:8.1f}ms "
+                  f"p90={summary['p90_ms']:8.1f}ms p99={summary['p99_ms']:8.1f}ms max={summary['max_ms']:8.1f}ms")
+    lw = report["lock_wait"]
+    if lw["count"]:
+        print(f"lock wait  n={lw['count']:5d} mean={lw['mean_ms']:8.1f}ms p99={lw['p99_ms']:8.1f}ms "
+              f"max={lw['max_ms']:8.1f}ms total={lw['total_s']:.2f}s")
+    if args.keep_data:
+        print(f"data kept in {data_dir}")
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2, default=str)
+    return 0 if stats.errors == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
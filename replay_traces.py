@@ -0,0 +1,138 @@
+# replay_traces.py
+"""
+Replay recorded turns (tools/recorder.py, TURN_RECORD_DIR) against the current code.
+
+Each recorded turn is re-run through run_turn from its recorded input state. Data reads and
+writes, reservations, SMS/email, reminder scheduling and LLM replies return what they returned
+in production, so a replay sends nothing and writes nothing; with --live-reads the read-only
+queries run for real against the local data files instead. Per graph node the report compares
+recorded and replayed time (wall, and "self" = time outside recorded tool calls), and lists
+turns whose result state or sequence of tool calls no longer matches the recording.
+
+Usage:
+    python replay_traces.py /var/log/clinic/turns/
+    python replay_traces.py turns-20251016-4242.jsonl.gz --limit 500 --live-reads
+    python replay_traces.py traces/ --threshold 0.3 --json replay.json
+Exits 1 when a node's median self time is slower than recorded by more than the threshold,
+or when a turn could not be replayed.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+def _quantiles(values: list) -> dict:
+    if not values:
+        return {"n": 0, "p50": None, "p95": None}
+    ordered = sorted(values)
+    return {"n": len(values), "p50": round(statistics.median(ordered), 3),
+            "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3)}
+
+def replay(records, live_reads: bool = False, limit: int = None) -> dict:
+    """Re-run recorded turns; returns per-node timings (recorded vs replayed) and divergent turns."""
+    from agent_graph import build_graph, run_turn
+    from tools import recorder, tenancy
+
+    app = build_graph()
+    timings = {}   # node -> {"recorded": [], "replayed": [], "recorded_self": [], "replayed_self": []}
+    diverged, failed, turns = [], [], 0
+
+    def add(node, key, value):
+        timings.setdefault(node, {"recorded": [], "replayed": [], "recorded_self": [], "replayed_self": []})[key].append(value)
+
+    for i, record in enumerate(records):
+        if limit is not None and turns >= limit:
+            break
+        turns += 1
+        clinic = record.get("clinic") or tenancy.DEFAULT_TENANT
+        if not tenancy.tenant_exists(clinic):
+            clinic = tenancy.DEFAULT_TENANT
+        state = recorder.decode(record["state"])
+        where = {"turn": i, "at": record.get("at"), "user_text": record.get("user_text")}
+        with tenancy.use_tenant(clinic), recorder.replaying(record, live_reads=live_reads) as rec:
+            t0 = time.perf_counter()
+            try:
+                run_turn(app, record.get("user_text") or "", state)
+            except Exception as e:
+                failed.append({**where, "error": f"{type(e).__name__}: {e}"})
+                continue
+            total_ms = (time.perf_counter() - t0) * 1000.0
+
+        add("turn", "recorded", record.get("total_ms", 0.0))
+        add("turn", "replayed", total_ms)
+        recorded_tools, replayed_tools = record.get("tool_ms", {}), rec.tool_ms
+        for node, ms in record.get("nodes", {}).items():
+            add(node, "recorded", ms)
+            add(node, "recorded_self", ms - recorded_tools.get(node, 0.0))
+        for node, ms in rec.nodes.items():
+            add(node, "replayed", ms)
+            add(node, "replayed_self", ms - replayed_tools.get(node, 0.0))
+
+        reasons = []
+        if record.get("result_digest") and getattr(rec, "result_digest", None) != record["result_digest"]:
+            reasons.append("result state differs")
+        if rec.remaining():
+            reasons.append(f"{rec.remaining()} recorded call(s) not made")
+        if reasons:
+            diverged.append({**where, "reasons": reasons})
+
+    nodes = {node: {k: _quantiles(v) for k, v in t.items()} for node, t in timings.items()}
+    return {"turns": turns, "nodes": nodes, "diverged": diverged, "failed": failed, "live_reads": live_reads}
+
+def regressions(report: dict, threshold: float, min_delta_ms: float) -> list:
+    """[(node, recorded p50, replayed p50)] for nodes whose median self time got slower past the threshold."""
+    out = []
+    for node, t in report["nodes"].items():
+        ref, now = t["recorded_self"]["p50"], t["replayed_self"]["p50"]
+        if ref is None or now is None:
+            continue
+        if now > ref * (1 + threshold) and now - ref > min_delta_ms:
+            out.append((node, ref, now))
+    return out
+
+def _print_report(report: dict):
+    print(f"{report['turns']} turns replayed{' (live reads)' if report['live_reads'] else ''}")
+    print(f"{'node':12s} {'rec p50':>9s} {'new p50':>9s} {'rec self':>9s} {'new self':>9s} {'change':>8s} {'new p95':>9s}")
+    fmt = lambda v: f"{v:9.2f}" if v is not None else f"{'-':>9s}"
+    for node in sorted(report["nodes"], key=lambda n: (n == "turn", n)):
+        t = report["nodes"][node]
+        ref, now = t["recorded_self"]["p50"], t["replayed_self"]["p50"]
+        change = f"{(now / ref - 1):+.0%}" if ref and now is not None else ""
+        print(f"{node:12s} {fmt(t['recorded']['p50'])} {fmt(t['replayed']['p50'])} {fmt(ref)} {fmt(now)} "
+              f"{change:>8s} {fmt(t['replayed']['p95'])}")
+    for d in report["diverged"][:20]:
+        print(f"DIVERGED turn {d['turn']} ({d['at']}): {'; '.join(d['reasons'])}", file=sys.stderr)
+    for f in report["failed"][:20]:
+        print(f"FAILED turn {f['turn']} ({f['at']}): {f['error']}", file=sys.stderr)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded turns and compare per-node timings")
+    parser.add_argument("traces", nargs="+", help="trace files (.jsonl.gz) or directories of them")
+    parser.add_argument("--limit", type=int, help="replay at most this many turns")
+    parser.add_argument("--live-reads", action="store_true",
+                        help="run read-only data queries against the local data files instead of stubbing them")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown of a node's median self time")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    # A replay must never record itself or reach a real model
+    os.environ.pop("TURN_RECORD_DIR", None)
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    from tools import recorder
+
+    report = replay(recorder.iter_traces(args.traces), live_reads=args.live_reads, limit=args.limit)
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    slow = regressions(report, args.threshold, args.min_delta_ms)
+    for node, ref, now in slow:
+        print(f"REGRESSION {node}: {ref:.2f} ms -> {now:.2f} ms (median self time)", file=sys.stderr)
+    return 1 if slow or report["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,135 +1,225 @@
 # In ai-scheduling-agent/streamlit_app.py
 
+import os
+
 import streamlit as st
 from dotenv import load_dotenv
-from datetime import datetime
-from langchain_core.messages import HumanMessage
+from datetime import date, datetime
 
-from agent_graph import build_graph, AgentState, run_turn
-from tools.data_io import list_doctor_names
+from agent_graph import build_graph, AgentState, run_turn, stream_turn
+from tools import tenancy
 
 # --- Initialization ---
 load_dotenv()
+ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD")
 
 st.set_page_config(page_title="Clinic Scheduler", page_icon="🩺", layout="centered")
 st.title("🩺 Clinic Appointment Scheduler")
 
+# --- Shared Resources ---
+@st.cache_resource
+def get_graph():
+    # The compiled graph is stateless; one instance serves every browser session in the process
+    return build_graph()
+
 # --- Session State Setup ---
-if "graph" not in st.session_state:
-    st.session_state.graph = build_graph()
 if "agent_state" not in st.session_state:
     st.session_state.agent_state = AgentState(messages=[])
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "step" not in st.session_state:
     st.session_state.step = "start"
+elif st.session_state.step.startswith("get_"):
+    # Sessions from the old one-field-per-step intake continue with the single form
+    st.session_state.step = "intake"
+
+# --- Clinic ---
+# Each browser session works on one clinic's data (?clinic=<id>, or the sidebar picker)
+def _reset_booking():
+    st.session_state.agent_state = AgentState(messages=[])
+    st.session_state.messages = []
+    st.session_state.step = "start"
+
+_clinics = tenancy.list_tenants()
+if st.session_state.get("clinic") not in _clinics:
+    requested = st.query_params.get("clinic")
+    st.session_state.clinic = requested if requested in _clinics else (
+        tenancy.current_tenant() if tenancy.current_tenant() in _clinics else tenancy.DEFAULT_TENANT)
+if len(_clinics) > 1:
+    st.sidebar.selectbox("Clinic", _clinics, key="clinic", on_change=_reset_booking)
+tenancy.set_tenant(st.session_state.clinic)
 
 # --- UI Helper Functions ---
 def add_message(role, content):
     st.session_state.messages.append({"role": role, "content": content})
 
-def render_chat():
-    for msg in st.session_state.messages:
+# A chat fragment redraws only the messages added since the last full rerun; once this many
+# have piled up, the next turn does a full rerun and they become part of the drawn history
+CHAT_TAIL_LIMIT = 12
+
+def render_chat(messages):
+    for msg in messages:
         with st.chat_message(msg["role"]):
             st.write(msg["content"])
 
+def _intake_widget(field):
+    """Input widget for one intake schema field (tools/intake_schema.py)."""
+    label = f"{field.label} *" if field.required else field.label
+    if field.type == "date":
+        return st.date_input(label, value=None, min_value=date(1900, 1, 1), max_value=date.today(),
+                             key=f"intake_{field.name}")
+    if field.type == "enum":
+        return st.selectbox(label, field.choices, index=None, key=f"intake_{field.name}")
+    return st.text_input(label, key=f"intake_{field.name}")
+
+def _reply_tokens(events, progress, outcome):
+    """Turn stream_turn events into text for st.write_stream; node progress goes to a caption."""
+    for kind, payload in events:
+        if kind == "token":
+            yield payload
+        elif kind == "node":
+            progress.caption(f"Working on it… ({payload})")
+        elif kind == "done":
+            outcome["result"] = payload
+
+def render_admin():
+    """Utilization/no-show dashboard; reads the materialized aggregates, never the full calendar."""
+    import hmac
+    from tools import analytics
+
+    st.header("📊 Clinic utilization")
+    entered = st.sidebar.text_input("Admin password", type="password")
+    if not (ADMIN_PASSWORD and hmac.compare_digest(entered.encode(), ADMIN_PASSWORD.encode())):
+        st.info("Enter the admin password in the sidebar.")
+        return
+    days = analytics.days()
+    if not days:
+        st.info("No schedule data yet.")
+        return
+    today = datetime.now().strftime("%Y-%m-%d")
+    default = next((d for d in days if d >= today), days[-1])
+    day = st.selectbox("Day", days, index=days.index(default))
+
+    specialties = analytics.by_specialty(day)
+    cols = st.columns(max(1, len(specialties)))
+    for col, row in zip(cols, specialties):
+        col.metric(row["specialty"], f"{row['utilization']:.0%}", f"{row['free']} free", delta_color="off")
+
+    st.subheader("By doctor")
+    st.dataframe(
+        [{"Doctor": r["doctor"], "Specialty": r["specialty"], "Booked": r["booked"], "Free": r["free"],
+          "Utilization": f"{r['utilization']:.0%}", "No-shows": r["no_shows"]} for r in analytics.utilization(day)],
+        hide_index=True, use_container_width=True,
+    )
+    st.subheader("All days")
+    st.dataframe(
+        [{"Doctor": r["doctor"], "Appointments": r["appointments"], "Utilization": f"{r['utilization']:.0%}",
+          "No-show rate": f"{r['no_show_rate']:.0%}"} for r in analytics.doctor_totals()],
+        hide_index=True, use_container_width=True,
+    )
+
+@st.fragment
+def scheduling_chat():
+    """
+    Chat input, doctor picker and new messages. A turn reruns only this fragment, so the
+    history drawn by the last full run is neither re-executed nor re-sent to the browser.
+    """
+    # Fragment reruns skip the top of the script, including the clinic selection
+    tenancy.set_tenant(st.session_state.clinic)
+    render_chat(st.session_state.messages[st.session_state.history_len:])
+    # The form part is done, now we use the chat input for scheduling
+    user_input = st.chat_input("Enter doctor and date, or select a time...")
+    # Typeahead doctor picker; composes the same "Dr. X on YYYY-MM-DD" request as typing it
+    if not st.session_state.agent_state.get("appointment", {}).get("options"):
+        from tools.doctor_catalog import get_catalog
+        catalog = get_catalog()
+        with st.expander("Find a doctor"):
+            with st.form("doctor_pick", clear_on_submit=True):
+                entry = st.selectbox("Doctor", catalog.entries, index=None, placeholder="Start typing a name…",
+                                     format_func=catalog.summary)
+                day = st.date_input("Date")
+                if st.form_submit_button("Check availability") and entry:
+                    user_input = f"{entry['name']} on {day:%Y-%m-%d}"
+    if user_input:
+        add_message("user", user_input)
+        with st.chat_message("user"):
+            st.write(user_input)
+        # Stream the reply as the graph produces it instead of waiting for the whole turn
+        outcome = {}
+        with st.chat_message("assistant"):
+            progress = st.empty()
+            streamed = st.write_stream(
+                _reply_tokens(stream_turn(get_graph(), user_input, st.session_state.agent_state), progress, outcome)
+            )
+            progress.empty()
+        final_state, reply = outcome["result"]
+        st.session_state.agent_state = final_state
+        if streamed or reply:
+            add_message("assistant", streamed or reply)
+
+        # Check if the appointment is confirmed
+        if final_state.get("appointment", {}).get("status") == 'confirmed':
+            st.session_state.step = "done"
+            st.rerun()
+        if len(st.session_state.messages) - st.session_state.history_len > CHAT_TAIL_LIMIT:
+            st.rerun()
+        st.rerun(scope="fragment")
+
 # --- Main Application Flow ---
 
+# Patients never see the admin page unless a clinic has configured its password
+if ADMIN_PASSWORD and st.sidebar.radio("Page", ["Book an appointment", "Admin: utilization"]) != "Book an appointment":
+    render_admin()
+    st.stop()
+
 # Initial greeting
 if st.session_state.step == "start":
-    add_message("assistant", "Hello! I'm your clinic assistant. Let's get you ready for an appointment. Please provide your details below.")
-    st.session_state.step = "get_first_name"
-    st.rerun()
+    add_message("assistant", "Hello! I'm your clinic assistant. Let's get you ready for an appointment. Please fill in your details below.")
+    st.session_state.step = "intake"
 
-# Render chat history
-render_chat()
+# Render chat history; chat turns after this only draw what they add (scheduling_chat)
+render_chat(st.session_state.messages)
+st.session_state.history_len = len(st.session_state.messages)
 
 # --- Part 1: Form-Based Data Collection ---
-if st.session_state.step.startswith("get_"):
-    if st.session_state.step == "get_first_name":
-        with st.form("first_name_form", clear_on_submit=True):
-            first_name = st.text_input("First Name")
-            if st.form_submit_button("Continue"):
-                add_message("user", first_name)
-                add_message("assistant", f"Thanks, {first_name}. What is your last name?")
-                st.session_state.agent_state.setdefault("patient", {})["first_name"] = first_name
-                st.session_state.step = "get_last_name"
-                st.rerun()
-
-    elif st.session_state.step == "get_last_name":
-        with st.form("last_name_form", clear_on_submit=True):
-            last_name = st.text_input("Last Name")
-            if st.form_submit_button("Continue"):
-                add_message("user", last_name)
-                add_message("assistant", "Got it. What's your date of birth?")
-                st.session_state.agent_state["patient"]["last_name"] = last_name
-                st.session_state.step = "get_dob"
-                st.rerun()
-
-    elif st.session_state.step == "get_dob":
-        with st.form("dob_form", clear_on_submit=True):
-            dob = st.date_input("Date of Birth", min_value=datetime(1920, 1, 1), value=datetime(2000, 1, 1))
-            if st.form_submit_button("Continue"):
-                dob_str = dob.strftime("%Y-%m-%d")
-                add_message("user", dob_str)
-                add_message("assistant", "Thank you. What's a good cell phone number?")
-                st.session_state.agent_state["patient"]["dob"] = dob_str
-                st.session_state.step = "get_cell_phone"
-                st.rerun()
-
-    elif st.session_state.step == "get_cell_phone":
-        with st.form("phone_form", clear_on_submit=True):
-            phone = st.text_input("Cell Phone")
-            if st.form_submit_button("Continue"):
-                add_message("user", phone)
-                add_message("assistant", "Perfect. And your email address?")
-                st.session_state.agent_state["patient"]["cell_phone"] = phone
-                st.session_state.step = "get_email"
-                st.rerun()
-
-    elif st.session_state.step == "get_email":
-        with st.form("email_form", clear_on_submit=True):
-            email = st.text_input("Email")
-            if st.form_submit_button("Continue"):
-                add_message("user", email)
-                add_message("assistant", "Great. What is your insurance provider?")
-                st.session_state.agent_state["patient"]["email"] = email
-                st.session_state.step = "get_primary_insurance"
-                st.rerun()
-
-    elif st.session_state.step == "get_primary_insurance":
-        with st.form("ins_form", clear_on_submit=True):
-            insurance = st.text_input("Insurance Provider")
-            if st.form_submit_button("Continue"):
-                add_message("user", insurance)
-                add_message("assistant", "And your Member ID?")
-                st.session_state.agent_state["patient"]["primary_insurance"] = insurance
-                st.session_state.step = "get_primary_member_id"
-                st.rerun()
-
-    elif st.session_state.step == "get_primary_member_id":
-        with st.form("member_id_form", clear_on_submit=True):
-            member_id = st.text_input("Member ID")
-            if st.form_submit_button("Continue"):
-                add_message("user", member_id)
-                st.session_state.agent_state["patient"]["primary_member_id"] = member_id
-                # Show available doctor names to help the user choose
-                try:
-                    names = list_doctor_names()
-                    if names:
-                        add_message("assistant", "Available doctors: " + ", ".join(names))
-                except Exception as e:
-                    # Do not block the flow if listing fails
-                    pass
-                st.session_state.step = "run_backend_lookup"
-                st.rerun()
+if st.session_state.step == "intake":
+    from tools.intake_schema import get_schema
+    schema = get_schema()
+    # One form generated from templates/intake_form.json; nothing reruns until it is submitted
+    with st.form("intake_form"):
+        values = {}
+        for title, fields in schema.sections():
+            st.markdown(f"**{title}**")
+            cols = st.columns(2)
+            for i, field in enumerate(fields):
+                with cols[i % 2]:
+                    values[field.name] = _intake_widget(field)
+        submitted = st.form_submit_button("Continue")
+    if submitted:
+        clean, errors = schema.validate(values)
+        if errors:
+            st.error("Please check these fields:\n" + "\n".join(f"- {msg}" for msg in errors.values()))
+        else:
+            st.session_state.agent_state.setdefault("patient", {}).update(clean)
+            add_message("user", f"{clean['first_name']} {clean['last_name']}, born {clean['dob']}")
+            # Show available doctor names to help the user choose
+            try:
+                from tools.doctor_catalog import get_catalog
+                catalog = get_catalog()
+                if len(catalog):
+                    add_message("assistant", "Available doctors:\n" + "\n".join(f"- {catalog.summary(e)}" for e in catalog.entries))
+            except Exception as e:
+                # Do not block the flow if listing fails
+                pass
+            st.session_state.step = "run_backend_lookup"
+            st.rerun()
 
 
 # --- Part 2: Backend Logic and Conversation ---
 elif st.session_state.step == "run_backend_lookup":
     with st.spinner("Looking up your patient record..."):
         # Run the graph from the beginning. It will stop after the 'lookup' agent.
-        final_state, reply = run_turn(st.session_state.graph, "", st.session_state.agent_state)
+        final_state, reply = run_turn(get_graph(), "", st.session_state.agent_state)
         st.session_state.agent_state = final_state
         # Display all the new messages from the backend
         for msg in final_state['messages']:
@@ -139,22 +229,7 @@ elif st.session_state.step == "run_backend_lookup":
         st.rerun()
 
 elif st.session_state.step == "conversational_scheduling":
-    # The form part is done, now we use the chat input for scheduling
-    user_input = st.chat_input("Enter doctor and date, or select a time...")
-    if user_input:
-        add_message("user", user_input)
-        with st.spinner("Thinking..."):
-            # Run the graph again with the new user input
-            final_state, reply = run_turn(st.session_state.graph, user_input, st.session_state.agent_state)
-            st.session_state.agent_state = final_state
-            if reply:
-                add_message("assistant", reply)
-
-        # Check if the appointment is confirmed
-        if final_state.get("appointment", {}).get("status") == 'confirmed':
-            st.session_state.step = "done"
-
-        st.rerun()
+    scheduling_chat()
 
 elif st.session_state.step == "done":
     st.success("✅ Your appointment is booked! A confirmation has been sent via SMS/email.")
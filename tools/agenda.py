@@ -0,0 +1,157 @@
+# ai-scheduling-agent/tools/agenda.py
+"""
+Daily per-doctor agenda digests.
+
+One pass builds every digest: the day's rows are taken from the cached schedule with a single
+date mask, consecutive booked slots of the same patient are merged into visits
+(data_io._booked_visits), joined to patients.csv once and grouped by doctor. All digests then go out over pooled SMTP
+connections (tools.email.send_emails), so a clinic with fifty doctors costs one scan and a
+handful of logins rather than fifty queries and fifty handshakes.
+
+Recipients come from the clinic's agenda_recipients.json:
+    {"Dr. Alice Wong": "alice@clinic.example", "*": "frontdesk@clinic.example"}
+"*" receives every doctor's digest. Doctors without an address are reported and skipped.
+
+Run daily from cron, e.g. at 18:00 for the next day's agendas:
+    0 18 * * *  cd /srv/clinic && python -m tools.agenda
+    python -m tools.agenda --date 2025-09-16 --dry-run      # print instead of sending
+    python -m tools.agenda --clinic north --clinic south
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+import pandas as pd
+
+from tools import data_io, tenancy
+from tools.tracing import span
+
+RECIPIENTS_FILE = "agenda_recipients.json"
+_ALL = "*"
+
+def _key(text) -> str:
+    return str(text).strip().casefold() if text else ""
+
+def recipients() -> dict:
+    """{doctor casefold or "*": [email, ...]} for the current clinic."""
+    path = data_io.paths().file(RECIPIENTS_FILE)
+    if not os.path.exists(path):
+        return {}
+    def build():
+        with open(path, encoding="utf-8") as fh:
+            spec = json.load(fh)
+        out = {}
+        for name, emails in spec.items():
+            emails = [emails] if isinstance(emails, str) else list(emails or [])
+            out.setdefault(_ALL if name == _ALL else _key(name), []).extend(emails)
+        return out
+    return data_io._cached(path, "recipients", build)
+
+def visits_by_doctor(day: date) -> dict:
+    """
+    {doctor name: DataFrame of the day's visits (start, end, patient columns)} from one scan of
+    the schedule and one join with patients.csv.
+    """
+    schedule = data_io._read_schedule()
+    if schedule.empty or "patient_id" not in schedule.columns:
+        return {}
+    lo = pd.Timestamp(day)
+    day_rows = schedule[(schedule["date_slot"] >= lo) & (schedule["date_slot"] < lo + pd.Timedelta(days=1))]
+    visits = data_io._booked_visits(day_rows)
+    if visits.empty:
+        return {}
+
+    patients = data_io._read_patients()
+    columns = [c for c in ("patient_id", "first_name", "last_name", "dob", "phone_e164") if c in patients.columns]
+    if "patient_id" in columns:
+        patients = patients[columns].assign(patient_id=pd.to_numeric(patients["patient_id"], errors="coerce"))
+        visits = visits.merge(patients.drop_duplicates("patient_id"), on="patient_id", how="left")
+    visits = visits.sort_values("start", kind="stable")
+    return {name: group for name, group in visits.groupby("doctor_name", sort=True)}
+
+def _text(value) -> str:
+    return "" if value is None or pd.isna(value) else str(value)
+
+def render(doctor: str, day: date, visits: pd.DataFrame) -> tuple:
+    """(subject, plain-text body) of one doctor's agenda."""
+    subject = f"Agenda for {doctor} - {day:%A %Y-%m-%d} ({len(visits)} visit{'s' if len(visits) != 1 else ''})"
+    lines = [f"{doctor}, your appointments for {day:%A, %d %B %Y}:", ""]
+    for row in visits.itertuples(index=False):
+        name = " ".join(p for p in (_text(getattr(row, "first_name", None)), _text(getattr(row, "last_name", None))) if p)
+        details = [f"patient {int(row.patient_id)}" if pd.notna(row.patient_id) else "unknown patient"]
+        if _text(getattr(row, "dob", None)):
+            details.append(f"DOB {_text(row.dob)[:10]}")
+        if _text(getattr(row, "phone_e164", None)):
+            details.append(_text(row.phone_e164))
+        lines.append(f"{row.start:%H:%M}-{row.end:%H:%M}  {name or 'Unnamed'} ({', '.join(details)})")
+    lines += ["", "Sent automatically by the clinic scheduler."]
+    return subject, "\n".join(lines)
+
+def build_digests(day: date) -> tuple:
+    """([(to_email, subject, body)], [doctors without a recipient]) for the current clinic."""
+    with span("agenda.build", day=str(day)) as sp:
+        by_doctor = visits_by_doctor(day)
+        to = recipients()
+        messages, unaddressed = [], []
+        for doctor, visits in by_doctor.items():
+            emails = to.get(_key(doctor), []) + to.get(_ALL, [])
+            if not emails:
+                unaddressed.append(doctor)
+                continue
+            subject, body = render(doctor, day, visits)
+            messages.extend((email, subject, body) for email in emails)
+        sp.set(doctors=len(by_doctor), messages=len(messages))
+    return messages, unaddressed
+
+def send_digests(day: date = None, dry_run: bool = False) -> dict:
+    """Build and send the current clinic's digests for `day` (default tomorrow); returns a report."""
+    day = day or date.today() + timedelta(days=1)
+    messages, unaddressed = build_digests(day)
+    report = {"clinic": tenancy.current_tenant(), "day": day.isoformat(), "messages": len(messages),
+              "sent": 0, "failed": [], "no_recipient": unaddressed, "dry_run": dry_run}
+    if dry_run:
+        report["digests"] = messages
+    if dry_run or not messages:
+        return report
+    from tools.email import send_emails
+    for (to_email, subject, _), error in zip(messages, send_emails(messages)):
+        if error:
+            report["failed"].append({"to": to_email, "subject": subject, "error": error})
+        else:
+            report["sent"] += 1
+    return report
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Send each doctor the agenda for a day")
+    parser.add_argument("--date", type=date.fromisoformat, help="agenda day (default: tomorrow)")
+    parser.add_argument("--clinic", action="append", help="clinic id (repeatable; default: every clinic)")
+    parser.add_argument("--dry-run", action="store_true", help="print the digests instead of sending them")
+    args = parser.parse_args(argv)
+
+    status = 0
+    for clinic in args.clinic or tenancy.list_tenants():
+        if not tenancy.tenant_exists(clinic):
+            print(f"Unknown clinic: {clinic}", file=sys.stderr)
+            status = 2
+            continue
+        with tenancy.use_tenant(clinic):
+            try:
+                report = send_digests(args.date, dry_run=args.dry_run)
+            except (OSError, RuntimeError) as e:
+                print(f"[{clinic}] agenda digests failed: {e}", file=sys.stderr)
+                status = 1
+                continue
+        for to_email, subject, body in report.get("digests", []):
+            print(f"To: {to_email}\nSubject: {subject}\n\n{body}\n")
+        print(f"[{clinic}] {report['day']}: {report['sent']}/{report['messages']} digests sent"
+              f"{' (dry run)' if args.dry_run else ''}; no recipient for: {', '.join(report['no_recipient']) or '-'}")
+        for failure in report["failed"]:
+            print(f"[{clinic}] failed to send to {failure['to']}: {failure['error']}", file=sys.stderr)
+            status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+# ai-scheduling-agent/tools/aio.py
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_executor = None
+_executor_guard = threading.Lock()
+
+def _get_executor():
+    # Small shared pool for blocking file/SMTP work; the event loop itself never blocks on it
+    global _executor
+    if _executor is None:
+        with _executor_guard:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.environ.get("BLOCKING_IO_THREADS", "4")),
+                    thread_name_prefix="blocking-io",
+                )
+    return _executor
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the shared pool, carrying the caller's context variables along."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_get_executor(), call)
+
+def submit_blocking(func, *args, **kwargs):
+    """Fire-and-forget from synchronous code: run func on the shared pool and return its Future."""
+    ctx = contextvars.copy_context()
+    return _get_executor().submit(ctx.run, func, *args, **kwargs)
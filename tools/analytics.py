@@ -0,0 +1,273 @@
+# ai-scheduling-agent/tools/analytics.py
+"""
+Materialized utilization and no-show aggregates.
+
+Each clinic's analytics.json holds counters keyed for direct lookup:
+    doctor_day[date][doctor]       slots, booked, appointments, no_shows (+ specialty)
+    specialty_day[date][specialty] the same counters rolled up by specialty
+    doctor_total[doctor]           the same counters over all days
+
+Bookings, releases and no-shows adjust only the affected counters (record_booking /
+record_release / record_no_show, called by tools.data_io under its file lock), so the
+query functions never rescan the schedule. A group commit of reservations is applied
+with one record_bookings call, i.e. one aggregates write per schedule write.
+
+Updates are appended as one line to analytics.journal instead of rewriting analytics.json;
+loading replays the journal lines of the file's generation. Every ANALYTICS_COMPACT_EVENTS
+updates the journal is folded into analytics.json under a new generation, so lines left
+behind by a crash mid-compaction are never applied twice. The file remembers which
+doctors.xlsx version it matches; if the schedule is changed outside the app the aggregates
+are rebuilt once.
+"""
+
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+from tools import data_io
+from tools.tracing import span
+
+ANALYTICS_FILE = "analytics.json"
+JOURNAL_FILE = "analytics.journal"
+COMPACT_EVENTS = int(os.environ.get("ANALYTICS_COMPACT_EVENTS", "500"))
+COUNTERS = ("slots", "booked", "appointments", "no_shows")
+UNKNOWN_SPECIALTY = "Unspecified"
+
+# Guards in-place counter updates against concurrent queries in this process.
+# Always taken after data_io's file lock, never before it.
+_agg_lock = threading.RLock()
+
+def _empty(source=None) -> dict:
+    return {"source": source, "doctor_day": {}, "specialty_day": {}, "doctor_total": {}}
+
+def _zero() -> dict:
+    return dict.fromkeys(COUNTERS, 0)
+
+def _day_key(when) -> str:
+    return str(when)[:10]
+
+def _path() -> str:
+    """The current clinic's aggregates file."""
+    return data_io.paths().file(ANALYTICS_FILE)
+
+def _journal() -> str:
+    return data_io.paths().file(JOURNAL_FILE)
+
+def _sources() -> tuple:
+    return (_path(), _journal())
+
+def _load_file() -> dict:
+    with span("io.read", file=ANALYTICS_FILE):
+        with open(_path(), encoding="utf-8") as fh:
+            agg = json.load(fh)
+    agg["pending"] = 0
+    try:
+        with open(_journal(), encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    update = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of a crashed append
+                if update.get("g") != agg.get("generation"):
+                    continue  # already folded into analytics.json
+                for doctor, specialty, day, deltas in update["b"]:
+                    _bump(agg, doctor, specialty, day, **deltas)
+                agg["source"] = update["s"]
+                agg["pending"] += 1
+    except FileNotFoundError:
+        pass
+    return agg
+
+def _save(agg: dict):
+    """Write the whole aggregates file under a new generation and drop the journal it absorbs."""
+    path = _path()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    agg["generation"] = os.urandom(6).hex()
+    agg["pending"] = 0
+    with span("io.write", file=ANALYTICS_FILE):
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({k: v for k, v in agg.items() if k != "pending"}, fh, separators=(",", ":"))
+        os.replace(tmp, path)
+    try:
+        os.remove(_journal())
+    except FileNotFoundError:
+        pass
+    data_io._store_cached(_sources(), "aggregates", agg)
+
+def _append(agg: dict, bumps: list):
+    """Journal one update (already applied to `agg`); compacts once enough have piled up."""
+    line = json.dumps({"g": agg.get("generation"), "s": agg["source"], "b": bumps}, separators=(",", ":"))
+    with span("io.write", file=JOURNAL_FILE):
+        with open(_journal(), "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+    agg["pending"] = agg.get("pending", 0) + 1
+    if agg["pending"] >= COMPACT_EVENTS:
+        _save(agg)
+    else:
+        data_io._store_cached(_sources(), "aggregates", agg)
+
+def _schedule_version():
+    version = data_io._file_version(data_io.paths().schedule_sources)
+    return [list(v) if v else None for v in version] if version else None
+
+def _bump(agg: dict, doctor: str, specialty, day: str, **deltas):
+    specialty = specialty or UNKNOWN_SPECIALTY
+    row = agg["doctor_day"].setdefault(day, {}).setdefault(doctor, {**_zero(), "specialty": specialty})
+    rollups = (
+        row,
+        agg["specialty_day"].setdefault(day, {}).setdefault(row["specialty"], _zero()),
+        agg["doctor_total"].setdefault(doctor, {**_zero(), "specialty": row["specialty"]}),
+    )
+    for counters in rollups:
+        for name, delta in deltas.items():
+            counters[name] = max(0, counters[name] + delta)
+
+def _rule_slot_count(rule, day) -> int:
+    """Slots a rule-based doctor has on `day`: generated ones plus any stored extra rows."""
+    entry = data_io._schedule_index().get(rule.name.casefold(), data_io._NO_ROWS)
+    stored = {t for t in entry["open"] if t.date() == day} | {t for t in entry["closed"] if t.date() == day}
+    return len(stored.union(rule.expand(day, day)))
+
+def rebuild() -> dict:
+    """Recompute every aggregate from the schedule and appointments.csv (one full scan)."""
+    from tools import availability
+    with data_io._file_lock(), _agg_lock, span("analytics.rebuild"):
+        agg = _empty(_schedule_version())
+        rules = availability.rules()
+        df = data_io._read_schedule()
+        if not df.empty and "doctor_name" in df.columns:
+            df = df[df["doctor_name"].notna()].copy()
+            df["doctor_name"] = df["doctor_name"].astype(str).str.strip()
+            df["day"] = df["date_slot"].dt.strftime("%Y-%m-%d")
+            if "specialty" not in df.columns:
+                df["specialty"] = None
+            booked = df[df["is_available"] == False]
+            appts = booked.drop_duplicates(["doctor_name", "day", "patient_id"]) if "patient_id" in df.columns else booked
+            for (doctor, day), group in df.groupby(["doctor_name", "day"], sort=False):
+                if rules.get(doctor) is not None:
+                    continue  # counted from the rule below
+                specialty = group["specialty"].dropna().iloc[0] if group["specialty"].notna().any() else None
+                _bump(agg, doctor, specialty, day, slots=len(group))
+            for (doctor, day), n in booked.groupby(["doctor_name", "day"]).size().items():
+                _bump(agg, doctor, None, day, booked=int(n))
+            for (doctor, day), n in appts.groupby(["doctor_name", "day"]).size().items():
+                _bump(agg, doctor, None, day, appointments=int(n))
+        # Rule-based doctors: slots over the availability horizon (and any day holding stored rows)
+        today = date.today()
+        for rule in rules.doctors.values():
+            entry = data_io._schedule_index().get(rule.name.casefold(), data_io._NO_ROWS)
+            days = {today + timedelta(days=i) for i in range(availability.HORIZON_DAYS + 1)}
+            days |= {t.date() for t in entry["open"]} | {t.date() for t in entry["closed"]}
+            for day in sorted(days):
+                n = _rule_slot_count(rule, day)
+                if n:
+                    _bump(agg, rule.name, rule.specialty, day.isoformat(), slots=n)
+        appts_df = data_io._read_appts()
+        if "status" in appts_df.columns and len(appts_df):
+            no_shows = appts_df[appts_df["status"].astype(str).str.lower() == "no_show"]
+            for row in no_shows.to_dict("records"):
+                _bump(agg, str(row["doctor_name"]).strip(), None, _day_key(row["date_slot"]), no_shows=1)
+        _save(agg)
+        return agg
+
+def _aggregates() -> dict:
+    """Current aggregates; rebuilt when missing or out of step with doctors.xlsx."""
+    agg, path = None, _path()
+    if os.path.exists(path):
+        agg = data_io._cached(_sources(), "aggregates", _load_file)
+    if agg is None or agg.get("source") != _schedule_version():
+        agg = rebuild()
+    return agg
+
+def _record(doctor: str, when, specialty=None, **deltas):
+    _record_many([(doctor, when, specialty, deltas)])
+
+def _record_many(events: list):
+    """Apply [(doctor, when, specialty, {counter: delta})] and save the aggregates once."""
+    # Callers hold data_io's file lock and have just written doctors.xlsx
+    with data_io._file_lock(), _agg_lock:
+        path = _path()
+        agg = data_io._cached(_sources(), "aggregates", _load_file) if os.path.exists(path) else None
+        if agg is None:
+            rebuild()
+            return
+        bumps = []  # (doctor, specialty, day, deltas) as applied, for the journal
+        for doctor, when, specialty, deltas in events:
+            doctor, day = str(doctor).strip(), _day_key(when)
+            if doctor not in agg["doctor_day"].get(day, {}):
+                # First activity on a day outside the materialized range: count its slots once
+                from tools import availability
+                rule = availability.rule_for(doctor)
+                if rule is not None:
+                    bumps.append((rule.name, rule.specialty, day,
+                                  {"slots": _rule_slot_count(rule, date.fromisoformat(day))}))
+                    _bump(agg, *bumps[-1][:3], **bumps[-1][3])
+            bumps.append((doctor, specialty, day, deltas))
+            _bump(agg, doctor, specialty, day, **deltas)
+        agg["source"] = _schedule_version()
+        _append(agg, bumps)
+
+def record_booking(doctor: str, when, slots: int = 1, specialty=None):
+    """A booking of `slots` consecutive schedule slots starting at `when`."""
+    _record(doctor, when, specialty, booked=slots, appointments=1)
+
+def record_bookings(bookings: list):
+    """Several bookings, each (doctor, when, slots, specialty), committed in one schedule write."""
+    if bookings:
+        _record_many([(doctor, when, specialty, {"booked": slots, "appointments": 1})
+                      for doctor, when, slots, specialty in bookings])
+
+def record_release(doctor: str, when, slots: int = 1, specialty=None):
+    """A cancelled/rescheduled booking gave its slots back."""
+    _record(doctor, when, specialty, booked=-slots, appointments=-1)
+
+def record_slots(doctor: str, when, added: int = 0, freed: int = 0, specialty=None):
+    """Slots added to the schedule and/or booked slots made free again (without a booking change)."""
+    _record(doctor, when, specialty, slots=added, booked=-freed)
+
+def record_no_show(doctor: str, when, specialty=None):
+    _record(doctor, when, specialty, no_shows=1)
+
+def _with_ratios(counters: dict) -> dict:
+    out = dict(counters)
+    out["free"] = max(0, out["slots"] - out["booked"])
+    out["utilization"] = out["booked"] / out["slots"] if out["slots"] else 0.0
+    out["no_show_rate"] = out["no_shows"] / out["appointments"] if out["appointments"] else 0.0
+    return out
+
+def doctor_day(doctor: str, day) -> dict:
+    """Counters and ratios for one doctor on one day (zeros if nothing is scheduled)."""
+    agg = _aggregates()
+    with _agg_lock:
+        row = agg["doctor_day"].get(_day_key(day), {}).get(doctor)
+        return _with_ratios(row or _zero())
+
+def utilization(day, specialty: str = None) -> list:
+    """One row per doctor scheduled on `day`: doctor, specialty, counters, free, utilization, no_show_rate."""
+    agg = _aggregates()
+    with _agg_lock:
+        rows = agg["doctor_day"].get(_day_key(day), {})
+        return [
+            {"doctor": doctor, **_with_ratios(counters)}
+            for doctor, counters in sorted(rows.items())
+            if specialty is None or counters.get("specialty") == specialty
+        ]
+
+def by_specialty(day) -> list:
+    agg = _aggregates()
+    with _agg_lock:
+        rows = agg["specialty_day"].get(_day_key(day), {})
+        return [{"specialty": name, **_with_ratios(c)} for name, c in sorted(rows.items())]
+
+def doctor_totals() -> list:
+    agg = _aggregates()
+    with _agg_lock:
+        rows = agg["doctor_total"]
+        return [{"doctor": doctor, **_with_ratios(c)} for doctor, c in sorted(rows.items())]
+
+def days() -> list:
+    """Days that have any scheduled slots, sorted."""
+    agg = _aggregates()
+    with _agg_lock:
+        return sorted(agg["doctor_day"])
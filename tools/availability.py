@@ -0,0 +1,229 @@
+# ai-scheduling-agent/tools/availability.py
+"""
+Recurring doctor availability: weekly templates plus exceptions, expanded lazily.
+
+data/availability.json:
+    {
+      "doctors": [
+        {"doctor_name": "Dr. Alice Wong", "specialty": "Allergy",
+         "weekly": {"mon": ["09:00-12:00", "13:00-17:00"], "wed": ["09:00-13:00"]},
+         "valid_from": "2025-09-01", "valid_until": null}
+      ],
+      "exceptions": [
+        {"doctor_name": null, "from": "2025-12-25", "to": "2025-12-25", "reason": "Holiday"},
+        {"doctor_name": "Dr. Alice Wong", "from": "2025-10-06", "to": "2025-10-10", "reason": "Vacation"},
+        {"doctor_name": "Dr. Alice Wong", "from": "2025-10-14 13:00", "to": "2025-10-14 17:00", "reason": "Closure"}
+      ]
+    }
+
+Exceptions without a doctor apply clinic-wide. Date-only ranges cover whole days (inclusive);
+ranges with a time are half-open [from, to). Slots are generated only for the days being
+queried, so doctors.xlsx needs rows only for booked or blocked slots of these doctors (plus
+any ad-hoc extra openings). Doctors without a rule keep the one-row-per-slot grid.
+
+Convert an existing grid with:
+    python -m tools.availability migrate            # print the inferred rules
+    python -m tools.availability migrate --write    # write availability.json and shrink doctors.xlsx
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+
+from tools import data_io
+
+# The booking logic works in 30-minute units (60-minute visits take two consecutive slots)
+SLOT_MINUTES = 30
+# How far ahead "next available" searches and analytics look for rule-based doctors
+HORIZON_DAYS = int(os.environ.get("AVAILABILITY_HORIZON_DAYS", "180"))
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+def _parse_point(value: str, end: bool):
+    """'2025-10-06' -> whole-day bound; '2025-10-14 13:00' -> exact time."""
+    value = str(value).strip()
+    if len(value) <= 10:
+        day = date.fromisoformat(value)
+        return datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    return datetime.fromisoformat(value)
+
+def _parse_interval(text: str):
+    start, end = (time.fromisoformat(p.strip()) for p in text.split("-"))
+    return start, end
+
+class DoctorRule:
+    __slots__ = ("name", "specialty", "weekly", "valid_from", "valid_until", "closures")
+
+    def __init__(self, spec: dict):
+        self.name = str(spec["doctor_name"]).strip()
+        self.specialty = spec.get("specialty")
+        self.weekly = {WEEKDAYS.index(day[:3].lower()): [_parse_interval(i) for i in intervals]
+                       for day, intervals in (spec.get("weekly") or {}).items()}
+        self.valid_from = date.fromisoformat(spec["valid_from"]) if spec.get("valid_from") else None
+        self.valid_until = date.fromisoformat(spec["valid_until"]) if spec.get("valid_until") else None
+        self.closures = []  # sorted [(start, end)] from exceptions, filled by Rules
+
+    def expand(self, start_day: date, end_day: date):
+        """Yield open slot datetimes for start_day..end_day (inclusive), in order."""
+        step = timedelta(minutes=SLOT_MINUTES)
+        day = max(start_day, self.valid_from) if self.valid_from else start_day
+        last = min(end_day, self.valid_until) if self.valid_until else end_day
+        while day <= last:
+            intervals = self.weekly.get(day.weekday())
+            if intervals:
+                day_start = datetime.combine(day, time.min)
+                day_end = day_start + timedelta(days=1)
+                # Only the closures touching this day need checking
+                closures = [(s, e) for s, e in self.closures if s < day_end and e > day_start]
+                for begin, finish in intervals:
+                    slot = datetime.combine(day, begin)
+                    stop = datetime.combine(day, finish)
+                    while slot + step <= stop:
+                        if not any(s <= slot < e for s, e in closures):
+                            yield slot
+                        slot += step
+            day += timedelta(days=1)
+
+class Rules:
+    def __init__(self, spec: dict):
+        self.doctors = {}
+        for d in spec.get("doctors", []):
+            rule = DoctorRule(d)
+            self.doctors[rule.name.casefold()] = rule
+        for exc in spec.get("exceptions", []):
+            window = (_parse_point(exc["from"], end=False), _parse_point(exc.get("to") or exc["from"], end=True))
+            who = exc.get("doctor_name")
+            targets = [self.doctors.get(str(who).strip().casefold())] if who else self.doctors.values()
+            for rule in targets:
+                if rule is not None:
+                    rule.closures.append(window)
+        for rule in self.doctors.values():
+            rule.closures.sort()
+
+    def get(self, doctor_name: str):
+        return self.doctors.get(str(doctor_name).strip().casefold())
+
+def _load() -> Rules:
+    with open(data_io.paths().availability_json, encoding="utf-8") as fh:
+        return Rules(json.load(fh))
+
+def rules() -> Rules:
+    """The current clinic's parsed rules, cached until availability.json changes (empty when absent)."""
+    path = data_io.paths().availability_json
+    if not os.path.exists(path):
+        return Rules({})
+    return data_io._cached(path, "rules", _load)
+
+def rule_for(doctor_name: str):
+    """The doctor's DoctorRule, or None for grid-only doctors."""
+    return rules().get(doctor_name)
+
+def rule_doctors() -> list:
+    return [{"doctor_name": r.name, "specialty": r.specialty} for r in rules().doctors.values()]
+
+# --- Grid -> rules migration ---
+
+def _intervals(times: list) -> list:
+    """Sorted slot start times -> ['09:00-12:00', ...] merging consecutive slots."""
+    step = timedelta(minutes=SLOT_MINUTES)
+    out, start, prev = [], None, None
+    for t in times:
+        cur = datetime.combine(date.min, t)
+        if start is None:
+            start = prev = cur
+        elif cur == prev + step:
+            prev = cur
+        else:
+            out.append(f"{start:%H:%M}-{prev + step:%H:%M}")
+            start = prev = cur
+    if start is not None:
+        out.append(f"{start:%H:%M}-{prev + step:%H:%M}")
+    return out
+
+def infer_rules(df) -> dict:
+    """
+    Infer weekly templates from a one-row-per-slot grid: for each doctor and weekday, the slot
+    times present on at least half of that weekday's dates. Dates in the covered range where
+    the template would open but the grid had no slots at all become whole-day exceptions.
+    Each template ends on the last date of its doctor's grid, so migrating never publishes
+    weeks the grid did not; extend valid_until by hand to keep a schedule open-ended.
+    """
+    df = df[df["doctor_name"].notna()].copy()
+    df["doctor_name"] = df["doctor_name"].astype(str).str.strip()
+    doctors, exceptions = [], []
+    for name, group in df.groupby("doctor_name", sort=True):
+        days = group["date_slot"].dt.date
+        weekly = {}
+        for wd in range(7):
+            on_day = group[group["date_slot"].dt.weekday == wd]
+            n_dates = on_day["date_slot"].dt.date.nunique()
+            if not n_dates:
+                continue
+            counts = Counter(on_day["date_slot"].dt.time)
+            keep = sorted(t for t, n in counts.items() if n * 2 >= n_dates)
+            if keep:
+                weekly[WEEKDAYS[wd]] = _intervals(keep)
+        first, last = days.min(), days.max()
+        present = set(days)
+        day = first
+        while day <= last:
+            if WEEKDAYS[day.weekday()] in weekly and day not in present:
+                exceptions.append({"doctor_name": name, "from": day.isoformat(), "to": day.isoformat(),
+                                   "reason": "Not in original grid"})
+            day += timedelta(days=1)
+        specialty = group["specialty"].dropna().iloc[0] if "specialty" in group and group["specialty"].notna().any() else None
+        doctors.append({"doctor_name": name, "specialty": specialty, "weekly": weekly,
+                        "valid_from": first.isoformat(), "valid_until": last.isoformat()})
+    return {"doctors": doctors, "exceptions": exceptions}
+
+def migrate(write: bool = False) -> dict:
+    """Infer rules from doctors.xlsx; with write=True also keep only rows the rules cannot express."""
+    with data_io._file_lock():
+        df = data_io._read_schedule()
+        if df.empty:
+            raise RuntimeError(f"No schedule grid found at {data_io.paths().doctors_xlsx}")
+        spec = infer_rules(df)
+        if write:
+            parsed = Rules(spec)
+            keep = []
+            for name, group in df.groupby(df["doctor_name"].astype(str).str.strip()):
+                rule = parsed.get(name)
+                lo, hi = group["date_slot"].min().date(), group["date_slot"].max().date()
+                generated = list(rule.expand(lo, hi))
+                is_generated = group["date_slot"].isin(generated)
+                # Booked/blocked rows, plus open rows the template does not generate (ad-hoc openings)
+                keep.append(group[(group["is_available"] == False) | ~is_generated])
+                # Template slots the grid never offered stay closed via explicit blocked rows
+                missing = sorted(set(generated) - set(group["date_slot"].dt.to_pydatetime()))
+                if missing:
+                    keep.append(pd.DataFrame({"doctor_name": name, "specialty": rule.specialty,
+                                              "date_slot": missing, "is_available": False, "patient_id": pd.NA}))
+            path = data_io.paths().availability_json
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(spec, fh, indent=2)
+            os.replace(tmp, path)
+            data_io._write_doctors(pd.concat(keep, ignore_index=True).sort_values(["doctor_name", "date_slot"]))
+        return spec
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Recurring availability rules")
+    sub = parser.add_subparsers(dest="command", required=True)
+    mig = sub.add_parser("migrate", help="infer weekly rules from the doctors.xlsx slot grid")
+    mig.add_argument("--write", action="store_true",
+                     help="write availability.json and keep only booked/blocked/extra rows in doctors.xlsx")
+    args = parser.parse_args(argv)
+    if args.command == "migrate":
+        spec = migrate(write=args.write)
+        print(json.dumps(spec, indent=2))
+        if args.write:
+            print(f"wrote {data_io.paths().availability_json}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
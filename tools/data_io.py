@@ -1,247 +1,1150 @@
 # In ai-scheduling-agent/tools/data_io.py
 
 import os
+import sys
 import threading
+from collections import OrderedDict
+from bisect import bisect_left
 import warnings
+from contextlib import contextmanager
 from datetime import datetime, date, timedelta
 import pandas as pd
 
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-PATIENTS_CSV = os.path.join(DATA_DIR, "patients.csv")
-# Use the actual Excel file for doctors
-DOCTORS_XLSX = os.path.join(DATA_DIR, "doctors.xlsx")
-APPTS_CSV = os.path.join(DATA_DIR, "appointments.csv")
-APPTS_XLSX = os.path.join(DATA_DIR, "appointments.xlsx")
+from tools import tenancy
+from tools.aio import run_blocking
+from tools.recorder import recorded
+from tools.tracing import span
+from tools.utils import normalize_emails, normalize_phones
 
-_lock = threading.Lock()
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock is available
+    fcntl = None
+
+# The default clinic's data directory; other clinics live under tenancy.TENANTS_DIR
+DATA_DIR = tenancy.DEFAULT_DATA_DIR
+# How far ahead list_doctors() expands rule-based availability for "next available" hints
+CATALOG_LOOKAHEAD_DAYS = 60
+
+class _Paths:
+    """One clinic's data files."""
+    def __init__(self, root: str):
+        self.root = root
+        self.patients_csv = os.path.join(root, "patients.csv")
+        # Use the actual Excel file for doctors
+        self.doctors_xlsx = os.path.join(root, "doctors.xlsx")
+        self.appts_csv = os.path.join(root, "appointments.csv")
+        self.appts_xlsx = os.path.join(root, "appointments.xlsx")
+        # Weekly availability templates (tools/availability.py); doctors.xlsx then only holds booked/blocked rows
+        self.availability_json = os.path.join(root, "availability.json")
+        # Everything that determines which slots exist
+        self.schedule_sources = (self.doctors_xlsx, self.availability_json)
+        self.lock_file = os.path.join(root, ".data.lock")
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+_paths = {}
+
+def paths() -> _Paths:
+    """Data files of the current clinic (tools.tenancy)."""
+    root = tenancy.tenant_dir()
+    found = _paths.get(root)
+    if found is None:
+        found = _paths.setdefault(root, _Paths(root))
+    return found
+
+# Derived from cell_phone/email when a patient row is written, so senders skip per-message regex work
+CONTACT_COLUMNS = ["phone_e164", "email_norm", "contact_valid"]
+# A bare read_csv turns "+9198..." into a float and a contact_valid column with gaps into text
+_CONTACT_DTYPES = {"phone_e164": str, "email_norm": str}
+_BOOL_TEXT = {True: True, False: False, "True": True, "False": False, "true": True, "false": False}
+
+_locks = {}
+_locks_guard = threading.Lock()
+_lock_depth = threading.local()
+
+@contextmanager
+def _file_lock():
+    """
+    Serialize read-modify-write cycles on the current clinic's data files across threads and,
+    where fcntl is available, across worker processes. Re-entrant within a thread. Clinics
+    do not block each other.
+    """
+    p = paths()
+    with _locks_guard:
+        lock = _locks.setdefault(p.root, threading.RLock())
+    with lock:
+        depths = getattr(_lock_depth, "by_root", None)
+        if depths is None:
+            depths = _lock_depth.by_root = {}
+        depth = depths.get(p.root, 0)
+        if fcntl is None or depth > 0:
+            depths[p.root] = depth + 1
+            try:
+                yield
+            finally:
+                depths[p.root] = depth
+            return
+        os.makedirs(p.root, exist_ok=True)
+        with open(p.lock_file, "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            depths[p.root] = 1
+            try:
+                yield
+            finally:
+                depths[p.root] = 0
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+def _holds_lock() -> bool:
+    """True when this thread is inside _file_lock() for the current clinic."""
+    depths = getattr(_lock_depth, "by_root", None) or {}
+    return depths.get(paths().root, 0) > 0
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+def _load_csv(path, **kwargs):
+    with span("io.read", file=os.path.basename(path)) as sp:
+        df = pd.read_csv(path, **kwargs)
+        sp.set(rows=len(df), bytes=_file_size(path))
+    return df
+
+def _load_excel(path):
+    with span("io.read", file=os.path.basename(path)) as sp:
+        df = pd.read_excel(path)
+        sp.set(rows=len(df), bytes=_file_size(path))
+    return df
+
+def _save_csv(df, path):
+    # Write to a temp file and swap it in, so streaming readers (tools/export.py) never see a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with span("io.write", file=os.path.basename(path), rows=len(df)) as sp:
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+        sp.set(bytes=_file_size(path))
+
+def _save_excel(df, path):
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.{os.getpid()}.tmp{ext}"  # keep the extension so pandas picks the Excel writer
+    with span("io.write", file=os.path.basename(path), rows=len(df)) as sp:
+        df.to_excel(tmp, index=False)
+        os.replace(tmp, path)
+        sp.set(bytes=_file_size(path))
+
+# --- Process-wide read caches ---
+# Parsed files (and values derived from them) are shared by every session in the process.
+# An entry is reused while the file's mtime/size are unchanged; our own writes drop it explicitly.
+# Keys are file paths, so each clinic gets its own entries; the least recently used ones are
+# evicted once their estimated size passes DATA_CACHE_MB.
+CACHE_BUDGET_BYTES = int(float(os.environ.get("DATA_CACHE_MB", "256")) * 1024 * 1024)
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+def _approx_size(value, depth: int = 0) -> int:
+    """Rough in-memory size of a cached value (frames by their buffers, containers a few levels deep)."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(index=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    size = sys.getsizeof(value)
+    if depth >= 3:
+        return size
+    if isinstance(value, dict):
+        return size + sum(_approx_size(k, depth + 1) + _approx_size(v, depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(_approx_size(v, depth + 1) for v in value)
+    if hasattr(value, "__dict__"):
+        return size + _approx_size(vars(value), depth + 1)
+    return size
+
+def _cache_put(key, version, value):
+    global _cache_bytes
+    size = _approx_size(value)
+    with _cache_lock:
+        old = _cache.pop(key, None)
+        if old is not None:
+            _cache_bytes -= old[2]
+        _cache[key] = (version, value, size)
+        _cache_bytes += size
+        # Keep at least the entry just added, even if it alone exceeds the budget
+        while _cache_bytes > CACHE_BUDGET_BYTES and len(_cache) > 1:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= evicted[2]
+
+def _file_version(path):
+    # A tuple of paths is one cache source (e.g. the slot store plus the availability rules)
+    if isinstance(path, tuple):
+        versions = tuple(_file_version(p) for p in path)
+        return None if all(v is None for v in versions) else versions
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _cached(path, name, build):
+    version = _file_version(path)
+    if version is None:
+        return build()
+    with _cache_lock:
+        hit = _cache.get((path, name))
+        if hit is not None and hit[0] == version:
+            _cache.move_to_end((path, name))
+            return hit[1]
+    value = build()
+    _cache_put((path, name), version, value)
+    return value
+
+def _store_cached(path, name, value):
+    """Seed the cache after writing `path` ourselves, so the next read skips re-parsing it."""
+    version = _file_version(path)
+    if version is not None:
+        _cache_put((path, name), version, value)
+
+def cache_stats() -> dict:
+    with _cache_lock:
+        return {"entries": len(_cache), "bytes": _cache_bytes, "budget_bytes": CACHE_BUDGET_BYTES}
+
+def invalidate_caches(path: str = None):
+    """Drop cached data for one file (or everything), e.g. after editing data files by hand."""
+    global _cache_bytes
+    with _cache_lock:
+        for key in [k for k in _cache if path is None or k[0] == path
+                    or (isinstance(k[0], tuple) and path in k[0])]:
+            _cache_bytes -= _cache.pop(key)[2]
+
+def _with_contacts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fill phone_e164 / email_norm / contact_valid for rows that lack them (new or edited rows,
+    and every row of a file written before these columns existed), one vectorized pass.
+    """
+    if df.empty:
+        return df
+    stale = df["contact_valid"].isna() if "contact_valid" in df.columns else pd.Series(True, index=df.index)
+    if "phone_e164" in df.columns:
+        # Numbers mangled by an older untyped read ("914504283286.0") are derived again
+        phone = df["phone_e164"].astype("string")
+        stale |= (phone.notna() & ~phone.str.fullmatch(r"\+\d+").fillna(False)).to_numpy(dtype=bool)
+    if not stale.any():
+        return df
+    for col in CONTACT_COLUMNS:
+        if col not in df.columns:
+            df[col] = pd.Series(pd.NA, index=df.index, dtype=object)
+        elif df[col].dtype != object:
+            df[col] = df[col].astype(object)
+    rows = df.loc[stale]
+    missing = pd.Series(pd.NA, index=rows.index, dtype="string")
+    phones = normalize_phones(rows["cell_phone"]) if "cell_phone" in df.columns else missing
+    emails = normalize_emails(rows["email"]) if "email" in df.columns else missing
+    df.loc[stale, "phone_e164"] = phones.astype(object)
+    df.loc[stale, "email_norm"] = emails.astype(object)
+    df.loc[stale, "contact_valid"] = (phones.notna() | emails.notna()).astype(object)
+    return df
 
 def _read_patients():
-    if not os.path.exists(PATIENTS_CSV):
+    path = paths().patients_csv
+    if not os.path.exists(path):
         return pd.DataFrame()
-    return pd.read_csv(PATIENTS_CSV)
+    return _cached(path, "df", lambda: _with_contacts(_load_patients_csv(path))).copy()
+
+def _load_patients_csv(path):
+    df = _load_csv(path, dtype=_CONTACT_DTYPES)
+    if "contact_valid" in df.columns:
+        df["contact_valid"] = df["contact_valid"].map(_BOOL_TEXT).astype(object)
+    return df
 
 def _write_patients(df: pd.DataFrame):
-    with _lock:
-        df.to_csv(PATIENTS_CSV, index=False)
+    with _file_lock():
+        df = _with_contacts(df)
+        path = paths().patients_csv
+        _save_csv(df, path)
+        invalidate_caches(path)
+
+def _patient_lookup():
+    """(patients frame, {(first, last, dob): row position}) for O(1) name + DOB lookups."""
+    def build():
+        df = _read_patients()
+        index = {}
+        if df.empty:
+            return df, index
+        firsts = df['first_name'].astype(str).str.lower()
+        lasts = df['last_name'].astype(str).str.lower()
+        dobs = pd.to_datetime(df['dob'], errors='coerce').dt.date
+        for pos, key in enumerate(zip(firsts, lasts, dobs)):
+            # Keep the first match, as the original row scan did
+            index.setdefault(key, pos)
+        return df, index
+    if not os.path.exists(paths().patients_csv):
+        return pd.DataFrame(), {}
+    return _cached(paths().patients_csv, "lookup", build)
 
 def _read_doctors():
     # Read from Excel to match repository data
-    if not os.path.exists(DOCTORS_XLSX):
+    path = paths().doctors_xlsx
+    if not os.path.exists(path):
         return pd.DataFrame()
-    return pd.read_excel(DOCTORS_XLSX)
+    return _cached(path, "df", lambda: _load_excel(path)).copy()
+
+def _normalize_schedule(df: pd.DataFrame) -> pd.DataFrame:
+    # Normalize types
+    df['date_slot'] = pd.to_datetime(df['date_slot'])
+    # Coerce availability to real booleans (handles 'TRUE'/'FALSE', 1/0, etc.)
+    if 'is_available' in df.columns:
+        df['is_available'] = df['is_available'].apply(
+            lambda x: True if str(x).strip().lower() in ('true','1','yes','y','t') else False
+        )
+    else:
+        df['is_available'] = True
+    return df
+
+def _read_schedule():
+    """Doctors schedule with parsed datetimes and boolean availability, normalized once per file version."""
+    if not os.path.exists(paths().doctors_xlsx):
+        return pd.DataFrame()
+    def build():
+        df = _read_doctors()
+        return df if df.empty else _normalize_schedule(df)
+    return _cached(paths().doctors_xlsx, "schedule", build).copy()
+
+def _schedule_index():
+    """
+    {doctor casefold: {"name", "specialty", "open": sorted datetimes, "closed": set}} built once
+    per doctors.xlsx version, so slot queries bisect one doctor's rows instead of masking the grid.
+    """
+    def build():
+        df = _read_schedule()
+        index = {}
+        if df.empty or 'doctor_name' not in df.columns:
+            return index
+        df = df[df['doctor_name'].notna()]
+        names = df['doctor_name'].astype(str).str.strip()
+        has_specialty = 'specialty' in df.columns
+        for key, group in df.groupby(names.str.casefold(), sort=False):
+            times = group['date_slot'].dt.to_pydatetime()
+            available = group['is_available'].to_numpy()
+            specialty = None
+            if has_specialty and group['specialty'].notna().any():
+                specialty = group['specialty'].dropna().iloc[0]
+            index[key] = {
+                "name": names[group.index[0]],
+                "specialty": specialty,
+                "open": sorted(t for t, a in zip(times, available) if a),
+                "closed": {t for t, a in zip(times, available) if not a},
+            }
+        return index
+    if not os.path.exists(paths().doctors_xlsx):
+        return {}
+    return _cached(paths().doctors_xlsx, "index", build)
+
+_NO_ROWS = {"name": None, "specialty": None, "open": [], "closed": frozenset()}
+
+def _open_slot_times(doctor_name: str, start_day: date, end_day: date) -> list:
+    """
+    Sorted open slot datetimes for start_day..end_day (inclusive): open rows stored in
+    doctors.xlsx plus slots generated from the doctor's weekly rule, minus booked/blocked rows.
+    """
+    from tools import availability
+    entry = _schedule_index().get(str(doctor_name).strip().casefold(), _NO_ROWS)
+    lo = datetime.combine(start_day, datetime.min.time())
+    hi = datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+    stored = entry["open"][bisect_left(entry["open"], lo):bisect_left(entry["open"], hi)]
+    rule = availability.rule_for(doctor_name)
+    if rule is None:
+        return stored
+    closed = entry["closed"]
+    generated = [t for t in rule.expand(start_day, end_day) if t not in closed]
+    return sorted(set(stored).union(generated)) if stored else generated
+
+def _canonical_doctor(doctor_name: str):
+    """(display name, specialty) from the stored rows or the availability rule."""
+    from tools import availability
+    entry = _schedule_index().get(str(doctor_name).strip().casefold(), _NO_ROWS)
+    rule = availability.rule_for(doctor_name)
+    name = entry["name"] or (rule.name if rule else doctor_name)
+    specialty = entry["specialty"] or (rule.specialty if rule else None)
+    return name, specialty
+
+def _with_duration(times: list, duration_min: int) -> list:
+    """Start times that fit `duration_min` (60 minutes needs two consecutive 30-minute slots)."""
+    if duration_min == 30:
+        return list(times)
+    if duration_min == 60:
+        available = set(times)
+        return [t for t in times if t + timedelta(minutes=30) in available]
+    return []
+
+def _booked_visits(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Booked schedule rows merged into visits: one row per run of consecutive 30-minute slots held
+    by the same patient with the same doctor. Columns: doctor_name, patient_id, start, end, slots.
+    """
+    booked = df[(df['is_available'] == False) & df['patient_id'].notna()]
+    pid = pd.to_numeric(booked['patient_id'], errors='coerce')
+    booked = booked.assign(patient_id=pid, doctor_name=booked['doctor_name'].astype(str).str.strip())[pid.notna()]
+    if booked.empty:
+        # Typed like a non-empty result, so callers can use .dt on start/end
+        return pd.DataFrame({"doctor_name": pd.Series(dtype=object), "patient_id": pd.Series(dtype=float),
+                             "start": pd.Series(dtype="datetime64[ns]"), "end": pd.Series(dtype="datetime64[ns]"),
+                             "slots": pd.Series(dtype=int)})
+    booked = booked.sort_values(['doctor_name', 'patient_id', 'date_slot'], kind='stable')
+    new_visit = ((booked['doctor_name'] != booked['doctor_name'].shift())
+                 | (booked['patient_id'] != booked['patient_id'].shift())
+                 | (booked['date_slot'] - booked['date_slot'].shift() != pd.Timedelta(minutes=30)))
+    visits = (booked.assign(visit=new_visit.cumsum())
+              .groupby('visit', sort=False)
+              .agg(doctor_name=('doctor_name', 'first'), patient_id=('patient_id', 'first'),
+                   start=('date_slot', 'first'), slots=('date_slot', 'size'))
+              .reset_index(drop=True))
+    visits['end'] = visits['start'] + pd.to_timedelta(visits['slots'] * 30, unit='m')
+    return visits
+
+def _patient_index() -> dict:
+    """
+    {patient_id: [(start, end, doctor_name), ...] sorted by start} over booked slots. Built once per
+    doctors.xlsx version; reserve/release/reschedule hand the updated index back to the cache after
+    their write (_reindex_patients), so per-patient queries never scan the schedule.
+    """
+    def build():
+        df = _read_schedule()
+        index = {}
+        if df.empty or 'patient_id' not in df.columns:
+            return index
+        visits = _booked_visits(df)
+        if visits.empty:
+            return index  # nothing booked yet, e.g. a new clinic
+        for pid, start, end, doctor in zip(visits['patient_id'], visits['start'].dt.to_pydatetime(),
+                                           visits['end'].dt.to_pydatetime(), visits['doctor_name']):
+            index.setdefault(int(pid), []).append((start, end, doctor))
+        for entries in index.values():
+            entries.sort()
+        return index
+    if not os.path.exists(paths().doctors_xlsx):
+        return {}
+    return _cached(paths().doctors_xlsx, "by_patient", build)
+
+def _reindex_patients(index: dict, removed=(), added=()):
+    """
+    Seed the cache for the doctors.xlsx just written with `index` (read before the write) minus
+    `removed` and plus `added` bookings, each (patient_id, doctor_name, slots). Copy-on-write: the
+    old index may still be in use by readers.
+    """
+    index = dict(index)
+    for pid, doctor, slots in removed:
+        pid, key, taken = int(pid), str(doctor).strip().casefold(), set(slots)
+        kept = []
+        for start, end, name in index.get(pid, []):
+            held = _slot_run(start, int((end - start).total_seconds() // 60))
+            if name.casefold() != key or taken.isdisjoint(held):
+                kept.append((start, end, name))
+                continue
+            # Keep whatever part of the visit was not released (back-to-back bookings merge into one visit)
+            rest = [t for t in held if t not in taken]
+            for i, t in enumerate(rest):
+                if i and t == rest[i - 1] + timedelta(minutes=30):
+                    kept[-1] = (kept[-1][0], t + timedelta(minutes=30), name)
+                else:
+                    kept.append((t, t + timedelta(minutes=30), name))
+        if kept:
+            index[pid] = sorted(kept)
+        else:
+            index.pop(pid, None)
+    for pid, doctor, slots in added:
+        pid = int(pid)
+        visit = (slots[0], slots[-1] + timedelta(minutes=30), str(doctor).strip())
+        index[pid] = sorted(index.get(pid, []) + [visit])
+    _store_cached(paths().doctors_xlsx, "by_patient", index)
+
+def _overlaps(entries: list, start: datetime, end: datetime) -> list:
+    return [{"doctor_name": d, "date_slot": s, "duration_min": int((e - s).total_seconds() // 60)}
+            for s, e, d in entries if s < end and e > start]
+
+@recorded(readonly=True)
+def patient_conflicts(patient_id: int, start: datetime, duration_min: int = 30) -> list:
+    """The patient's booked visits (any doctor) that overlap [start, start + duration)."""
+    if patient_id is None:
+        return []
+    start = pd.to_datetime(start).to_pydatetime()
+    end = start + timedelta(minutes=max(30, int(duration_min)))
+    return _overlaps(_patient_index().get(int(patient_id), []), start, end)
+
+@recorded(readonly=True)
+def upcoming_appointments(patient_id: int, after: datetime = None, limit: int = None) -> list:
+    """The patient's visits that end after `after` (default now), earliest first."""
+    entries = _patient_index().get(int(patient_id), [])
+    after = after or datetime.now()
+    # Visits are at most an hour long, so every visit ending after `after` starts after this
+    i = bisect_left(entries, (after - timedelta(hours=1),))
+    out = [{"doctor_name": d, "date_slot": s, "duration_min": int((e - s).total_seconds() // 60)}
+           for s, e, d in entries[i:] if e > after]
+    return out[:limit] if limit else out
 
 def _write_doctors(df: pd.DataFrame):
-    with _lock:
+    with _file_lock():
         # Persist back to Excel
         try:
-            df.to_excel(DOCTORS_XLSX, index=False)
+            _save_excel(df, paths().doctors_xlsx)
         except Exception:
             # As a fallback, still attempt to write CSV sidecar to avoid data loss
             try:
-                df.to_csv(os.path.splitext(DOCTORS_XLSX)[0] + ".csv", index=False)
+                _save_csv(df, os.path.splitext(paths().doctors_xlsx)[0] + ".csv")
             except Exception:
                 pass
+        invalidate_caches(paths().doctors_xlsx)
+
+APPT_COLUMNS = ["patient_id","first_name","last_name","doctor_name","date_slot","duration_min","status"]
+SCHEDULE_COLUMNS = ["doctor_name", "specialty", "date_slot", "is_available", "patient_id"]
 
 def _read_appts():
-    if not os.path.exists(APPTS_CSV):
-        return pd.DataFrame(columns=["patient_id","first_name","last_name","doctor_name","date_slot"])
-    return pd.read_csv(APPTS_CSV, parse_dates=["date_slot"])
+    if not os.path.exists(paths().appts_csv):
+        return pd.DataFrame(columns=APPT_COLUMNS)
+    df = _load_csv(paths().appts_csv, parse_dates=["date_slot"])
+    # Rows written before cancel/reschedule existed are 30-minute confirmed bookings
+    if "status" not in df.columns:
+        df["status"] = "confirmed"
+    if "duration_min" not in df.columns:
+        df["duration_min"] = 30
+    return df
 
 def _write_appts(df: pd.DataFrame):
-    with _lock:
-        df.to_csv(APPTS_CSV, index=False)
+    with _file_lock():
+        _save_csv(df, paths().appts_csv)
         try:
-            df.to_excel(APPTS_XLSX, index=False)
+            _save_excel(df, paths().appts_xlsx)
         except Exception:
             pass
 
+@recorded(readonly=True)
 def find_patient_by_name_dob(first_name: str, last_name: str, dob: str):
-    df = _read_patients()
-    if df.empty or not all([first_name, last_name, dob]):
+    if not all([first_name, last_name, dob]):
         return None
-    mask = (
-        (df['first_name'].str.lower() == str(first_name).lower()) &
-        (df['last_name'].str.lower() == str(last_name).lower()) &
-        (pd.to_datetime(df['dob']).dt.date == pd.to_datetime(dob).date())
-    )
-    match = df[mask]
-    if match.empty:
+    df, index = _patient_lookup()
+    if df.empty:
+        return None
+    pos = index.get((str(first_name).lower(), str(last_name).lower(), pd.to_datetime(dob).date()))
+    if pos is None:
         return None
-    row = match.iloc[0].to_dict()
+    row = df.iloc[pos].to_dict()
     row['dob'] = pd.to_datetime(row['dob']).date().isoformat()
     return row
 
+@recorded()
 def ensure_patient_record(patient: dict):
+    with _file_lock():
+        return _ensure_patient_record(patient)
+
+def _ensure_patient_record(patient: dict):
     df = _read_patients()
     if df.empty:
         next_id = 1
-        df = pd.DataFrame(columns=pd.read_csv(PATIENTS_CSV).columns)
+        df = pd.DataFrame(columns=pd.read_csv(paths().patients_csv).columns)
     else:
         next_id = int(df['patient_id'].max()) + 1
 
-    record = {k: patient.get(k) for k in df.columns if k != "patient_id"}
+    # Contact columns are derived below, never copied from (possibly stale) session data
+    record = {k: patient.get(k) for k in df.columns if k != "patient_id" and k not in CONTACT_COLUMNS}
     record["patient_id"] = next_id
     
     # Suppress the FutureWarning for cleaner output
     with warnings.catch_warnings():
         warnings.simplefilter(action='ignore', category=FutureWarning)
-        new_df = pd.concat([df, pd.DataFrame([record])], ignore_index=True)
+        new_df = _with_contacts(pd.concat([df, pd.DataFrame([record])], ignore_index=True))
+    record.update({k: new_df[k].iloc[-1] for k in CONTACT_COLUMNS})
         
     _write_patients(new_df)
     record['dob'] = pd.to_datetime(record['dob']).date().isoformat() if record.get('dob') else None
     return record
 
+@recorded(readonly=True)
 def find_available_slots(doctor_name: str, day: date, duration_min: int = 30):
-    df = _read_doctors()
-    if df.empty:
-        return []
-
-    # Normalize types
-    df['date_slot'] = pd.to_datetime(df['date_slot'])
-    # Coerce availability to real booleans (handles 'TRUE'/'FALSE', 1/0, etc.)
-    if 'is_available' in df.columns:
-        df['is_available'] = df['is_available'].apply(
-            lambda x: True if str(x).strip().lower() in ('true','1','yes','y','t') else False
-        )
-    else:
-        df['is_available'] = True
-    day_mask = df['date_slot'].dt.date == day
-    # Case and whitespace-insensitive doctor name match
-    doc_series = df['doctor_name'].astype(str).str.strip().str.casefold()
-    target_doc = str(doctor_name).strip().casefold()
-    doc_mask = doc_series == target_doc
-    available_slots_df = df[doc_mask & day_mask & (df['is_available'] == True)].sort_values('date_slot')
-
-    slots = []
-    if duration_min == 30:
-        for _, r in available_slots_df.iterrows():
-            slots.append({"doctor_name": r['doctor_name'], "date_slot": r['date_slot'].to_pydatetime()})
+    with span("slots.find", doctor=str(doctor_name), day=str(day), duration_min=duration_min) as sp:
+        times = _open_slot_times(doctor_name, day, day)
+        name, _ = _canonical_doctor(doctor_name)
+        slots = [{"doctor_name": name, "date_slot": t} for t in _with_duration(times, duration_min)]
+        sp.set(open_times=len(times), slots=len(slots))
         if not slots:
-            try:
-                # Debug diagnostics
-                total = len(df)
-                doc_only = len(df[doc_mask])
-                day_only = len(df[day_mask])
-                doc_day = len(df[doc_mask & day_mask])
-                avail_total = len(df[df['is_available'] == True])
-                print(f"DEBUG no-slots: total={total} doc_match={doc_only} day_match={day_only} doc_day_match={doc_day} avail_total={avail_total} doctor='{doctor_name}' day='{day}'")
-                # Show a preview of matching rows for quick inspection
-                preview = df[doc_mask & day_mask][['doctor_name','date_slot','is_available']].head(5)
-                print(preview)
-            except Exception:
-                pass
-        return slots
-    
-    if duration_min == 60:
-        slot_times = available_slots_df['date_slot'].tolist()
-        for i in range(len(slot_times) - 1):
-            if slot_times[i+1] == slot_times[i] + timedelta(minutes=30):
-                slots.append({"doctor_name": doctor_name, "date_slot": slot_times[i].to_pydatetime()})
-        return slots
-
+            # Why nothing was found: unknown doctor (no stored rows) or a fully booked day
+            sp.set(stored_rows=str(doctor_name).strip().casefold() in _schedule_index())
     return slots
 
+@recorded()
 def reserve_slot(doctor_name: str, date_time: datetime, patient_id: int, duration_min: int = 30):
-    df = _read_doctors()
+    # Hold the lock across read and write so two sessions cannot both see the slot as free
+    with _file_lock():
+        return _reserve_slot(doctor_name, date_time, patient_id, duration_min)
+
+def _slot_run(start: datetime, duration_min: int) -> list:
+    """The consecutive 30-minute slots a visit of `duration_min` occupies."""
+    return [start + timedelta(minutes=30 * i) for i in range(max(1, int(duration_min) // 30))]
+
+def _doctor_mask(df: pd.DataFrame, doctor_name: str) -> pd.Series:
+    # Match doctor robustly (case and whitespace-insensitive)
+    return df['doctor_name'].astype(str).str.strip().str.casefold() == str(doctor_name).strip().casefold()
+
+def _book_rows(df: pd.DataFrame, doctor_name: str, slots: list, patient_id: int) -> pd.DataFrame:
+    """Mark `slots` booked for the patient; slots generated from a rule get a new booked row."""
+    name, specialty = _canonical_doctor(doctor_name)
+    mask = _doctor_mask(df, doctor_name) & (df['date_slot'].isin(slots))
+    df.loc[mask, 'is_available'] = False
+    df.loc[mask, 'patient_id'] = int(patient_id)
+
+    # Slots generated from an availability rule have no row yet; store only the booking
+    stored = set(pd.to_datetime(df.loc[mask, 'date_slot']).dt.to_pydatetime())
+    new_rows = [
+        {"doctor_name": name, "specialty": specialty, "date_slot": t, "is_available": False, "patient_id": int(patient_id)}
+        for t in slots if t not in stored
+    ]
+    if new_rows:
+        with warnings.catch_warnings():
+            warnings.simplefilter(action='ignore', category=FutureWarning)
+            df = pd.concat([df, pd.DataFrame(new_rows)], ignore_index=True)
+    return df
+
+def _free_rows(df: pd.DataFrame, doctor_name: str, slots: list) -> pd.DataFrame:
+    """Make stored `slots` bookable: drop rows the doctor's rule regenerates, reopen the others."""
+    from tools import availability
+    if not slots:
+        return df
+    rule = availability.rule_for(doctor_name)
+    generated = set()
+    if rule is not None:
+        generated = set(rule.expand(min(slots).date(), max(slots).date()))
+    mask = _doctor_mask(df, doctor_name) & (df['date_slot'].isin(slots))
+    regen = mask & df['date_slot'].isin(list(generated))
+    df.loc[mask & ~regen, 'is_available'] = True
+    df.loc[mask & ~regen, 'patient_id'] = pd.NA
+    return df[~regen]
+
+# Failure detail of a reservation refused because the patient already has an overlapping visit
+PATIENT_CONFLICT = "patient_conflict"
+
+def _conflict_failure(clash: list) -> tuple:
+    return False, {"reason": PATIENT_CONFLICT, "conflict": clash[0]}
+
+@recorded()
+def reserve_slots(requests: list) -> list:
+    """
+    Apply several reservations, each (doctor_name, date_time, patient_id, duration_min), against one
+    schedule snapshot and persist them in one write. Requests are taken in order; one that needs a
+    slot already booked (or booked earlier in the same batch) fails without affecting the others.
+    Returns one (ok, reserved row) per request; failures are (False, None) for a taken slot and
+    (False, {"reason": PATIENT_CONFLICT, "conflict": visit}) when the patient already has a visit
+    (with any doctor, or earlier in the batch) overlapping the requested time.
+    """
+    with _file_lock():
+        return _reserve_slots(requests)
+
+def _reserve_slot(doctor_name: str, date_time: datetime, patient_id: int, duration_min: int = 30):
+    return _reserve_slots([(doctor_name, date_time, patient_id, duration_min)])[0]
+
+def _reserve_slots(requests: list) -> list:
+    from tools import analytics
+    results, accepted = [], []
+    taken = set()  # (doctor casefold, slot) granted earlier in this batch
+    index = _patient_index()
+    granted = {}  # patient_id -> visits granted earlier in this batch
+    for doctor_name, date_time, patient_id, duration_min in requests:
+        start = pd.to_datetime(date_time).to_pydatetime()
+        slots = _slot_run(start, 60 if duration_min == 60 else 30)
+        key = str(doctor_name).strip().casefold()
+        open_times = set(_open_slot_times(doctor_name, start.date(), slots[-1].date()))
+        if patient_id is None or not all(t in open_times and (key, t) not in taken for t in slots):
+            results.append((False, None))
+            continue
+        # Checked under the data lock, so two sessions of one patient cannot both pass
+        end = slots[-1] + timedelta(minutes=30)
+        clash = _overlaps(index.get(int(patient_id), []) + granted.get(int(patient_id), []), start, end)
+        if clash:
+            results.append(_conflict_failure(clash))
+            continue
+        taken.update((key, t) for t in slots)
+        name, specialty = _canonical_doctor(doctor_name)
+        granted.setdefault(int(patient_id), []).append((start, end, name))
+        accepted.append((doctor_name, name, specialty, start, int(patient_id), slots))
+        results.append((True, {"doctor_name": name, "specialty": specialty, "date_slot": pd.Timestamp(start),
+                               "is_available": False, "patient_id": int(patient_id)}))
+    if not accepted:
+        return results
+
+    df = _read_schedule()
     if df.empty:
-        return False, None
-    
-    df['date_slot'] = pd.to_datetime(df['date_slot'])
-    # Coerce availability to real booleans
-    if 'is_available' in df.columns:
-        df['is_available'] = df['is_available'].apply(
-            lambda x: True if str(x).strip().lower() in ('true','1','yes','y','t') else False
-        )
-    else:
-        df['is_available'] = True
-    
-    slots_to_reserve = [pd.to_datetime(date_time)]
-    if duration_min == 60:
-        slots_to_reserve.append(pd.to_datetime(date_time) + timedelta(minutes=30))
-    
-    # Match doctor robustly
-    doc_series = df['doctor_name'].astype(str).str.strip().str.casefold()
-    target_doc = str(doctor_name).strip().casefold()
-    mask = (doc_series == target_doc) & (df['date_slot'].isin(slots_to_reserve))
-    available_mask = mask & (df['is_available'] == True)
-    
-    if len(df[available_mask]) != len(slots_to_reserve):
-        return False, None
+        df = pd.DataFrame(columns=SCHEDULE_COLUMNS)
+    for doctor_name, _, _, _, pid, slots in accepted:
+        df = _book_rows(df, doctor_name, slots, pid)
+    _write_doctors(df)
+    _reindex_patients(index, added=[(pid, name, slots) for _, name, _, _, pid, slots in accepted])
 
-    indices_to_update = df[available_mask].index
-    df.loc[indices_to_update, 'is_available'] = False
-    df.loc[indices_to_update, 'patient_id'] = int(patient_id)
+    # One aggregates update for the whole commit
+    analytics.record_bookings([(name, start, len(slots), specialty) for _, name, specialty, start, _, slots in accepted])
+    return results
+
+@recorded()
+def open_slot(doctor_name: str, date_time: datetime) -> bool:
+    """
+    Make one slot bookable (a cancelled booking or an extra opening) and offer it to the waitlist.
+    Returns False if the slot was already open.
+    """
+    with _file_lock():
+        if not _open_slot(doctor_name, date_time):
+            return False
+        from tools import waitlist
+        waitlist.on_slot_freed(doctor_name, date_time)
+    return True
+
+def _open_slot(doctor_name: str, date_time: datetime) -> bool:
+    from tools import analytics, availability
+    slot = pd.to_datetime(date_time).to_pydatetime()
+    if slot in set(_open_slot_times(doctor_name, slot.date(), slot.date())):
+        return False
+    df = _read_schedule()
+    if df.empty:
+        df = pd.DataFrame(columns=SCHEDULE_COLUMNS)
+    name, specialty = _canonical_doctor(doctor_name)
+    was_stored = bool((_doctor_mask(df, doctor_name) & (df['date_slot'] == pd.Timestamp(slot))).any())
+    rule = availability.rule_for(doctor_name)
+    generated = rule is not None and slot in set(rule.expand(slot.date(), slot.date()))
+    if was_stored:
+        df = _free_rows(df, doctor_name, [slot])
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter(action='ignore', category=FutureWarning)
+            df = pd.concat([df, pd.DataFrame([{"doctor_name": name, "specialty": specialty, "date_slot": slot,
+                                               "is_available": True, "patient_id": pd.NA}])], ignore_index=True)
     _write_doctors(df)
-    
-    return True, df.loc[indices_to_update].iloc[0].to_dict()
+    analytics.record_slots(name, slot, added=0 if (was_stored or generated) else 1,
+                           freed=1 if was_stored else 0, specialty=specialty)
+    return True
 
+@recorded()
 def append_appointment_export(patient: dict, appt: dict):
+    with _file_lock():
+        _append_appointment_exports(patient, [appt])
+
+@recorded()
+def append_appointment_exports(patient: dict, appts: list):
+    """Append several of the patient's appointments (e.g. a weekly series) in one export write."""
+    with _file_lock():
+        _append_appointment_exports(patient, appts)
+
+def _append_appointment_exports(patient: dict, appts: list):
+    if not appts:
+        return
     df = _read_appts()
-    row = {
+    rows = [{
         "patient_id": patient.get("patient_id"),
         "first_name": patient.get("first_name"),
         "last_name": patient.get("last_name"),
         "doctor_name": appt.get("doctor_name"),
-        "date_slot": appt.get("date_slot")
-    }
+        "date_slot": appt.get("date_slot"),
+        "duration_min": appt.get("duration_min", 30),
+        "status": "confirmed",
+    } for appt in appts]
     
     with warnings.catch_warnings():
         warnings.simplefilter(action='ignore', category=FutureWarning)
-        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+        df = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
 
     _write_appts(df)
 
+def _booking_slots(df: pd.DataFrame, doctor_name: str, start: datetime, patient_id=None, duration_min: int = None):
+    """(slots, patient_id) of the booking starting at `start`, or (None, None) if there is none."""
+    doc_mask = _doctor_mask(df, doctor_name)
+    booked = df[doc_mask & (df['is_available'] == False) & df['patient_id'].notna()]
+    at = booked[booked['date_slot'] == pd.Timestamp(start)]
+    if patient_id is not None:
+        at = at[at['patient_id'].astype(int) == int(patient_id)]
+    if at.empty:
+        return None, None
+    pid = int(at['patient_id'].iloc[0])
+    if duration_min is None:
+        record = _find_appointment(doctor_name, start, pid)
+        if record is not None and pd.notna(record.get("duration_min")):
+            duration_min = int(record["duration_min"])
+        else:
+            # No record: a following slot held by the same patient means a 60-minute visit
+            nxt = booked[(booked['date_slot'] == pd.Timestamp(start + timedelta(minutes=30)))
+                         & (booked['patient_id'].astype(int) == pid)]
+            duration_min = 60 if len(nxt) else 30
+    return _slot_run(start, duration_min), pid
+
+def _find_appointment(doctor_name: str, start: datetime, patient_id: int):
+    appts = _read_appts()
+    if appts.empty:
+        return None
+    match = appts[_doctor_mask(appts, doctor_name) & (appts['date_slot'] == pd.Timestamp(start))
+                  & (pd.to_numeric(appts['patient_id'], errors='coerce') == int(patient_id))
+                  & (appts['status'].fillna("confirmed") == "confirmed")]
+    return None if match.empty else match.iloc[-1].to_dict()
+
+def _update_appointment(doctor_name: str, start: datetime, patient_id: int, **changes):
+    """Apply `changes` to the confirmed appointment record; re-create it if the export had drifted."""
+    appts = _read_appts()
+    mask = (_doctor_mask(appts, doctor_name) & (appts['date_slot'] == pd.Timestamp(start))
+            & (pd.to_numeric(appts['patient_id'], errors='coerce') == int(patient_id))
+            & (appts['status'].fillna("confirmed") == "confirmed"))
+    if mask.any():
+        for col, val in changes.items():
+            appts.loc[mask, col] = val
+    elif changes.get("status", "confirmed") == "confirmed":
+        patient = _patient_by_id(patient_id)
+        row = {"patient_id": int(patient_id), "first_name": patient.get("first_name"),
+               "last_name": patient.get("last_name"), "doctor_name": doctor_name, "date_slot": start,
+               "duration_min": 30, "status": "confirmed", **changes}
+        with warnings.catch_warnings():
+            warnings.simplefilter(action='ignore', category=FutureWarning)
+            appts = pd.concat([appts, pd.DataFrame([row])], ignore_index=True)
+    else:
+        return
+    _write_appts(appts)
+
+def _patient_by_id(patient_id) -> dict:
+    df = _read_patients()
+    if df.empty or 'patient_id' not in df.columns:
+        return {}
+    rows = df[pd.to_numeric(df['patient_id'], errors='coerce') == int(patient_id)]
+    return {} if rows.empty else rows.iloc[0].to_dict()
+
+def _replace_reminders(old: dict = None, new: dict = None):
+    """Cancel the old appointment's reminder jobs and schedule the new one's; failures are logged."""
+    try:
+        from agents import reminder_agent
+        if old:
+            reminder_agent.cancel_reminder_jobs(old)
+        if new:
+            reminder_agent.schedule_reminder_job(new)
+    except Exception as e:
+        print("reminder update failed:", e)
+
+@recorded()
+def release_slot(doctor_name: str, date_time: datetime, patient_id: int = None, duration_min: int = None):
+    """
+    Cancel the booking starting at `date_time`: free all its slots in one schedule write, mark the
+    appointment record cancelled, drop its reminders and offer the freed slots to the waitlist.
+    Returns the released booking ({doctor_name, date_slot, patient_id, slots}) or None.
+    """
+    with _file_lock():
+        released = _release_slot(doctor_name, date_time, patient_id, duration_min)
+        if released is None:
+            return None
+        _replace_reminders(old=released)
+        from tools import waitlist
+        for slot in released["slots"]:
+            waitlist.on_slot_freed(released["doctor_name"], slot)
+    return released
+
+def _release_slot(doctor_name, date_time, patient_id=None, duration_min=None):
+    from tools import analytics
+    start = pd.to_datetime(date_time).to_pydatetime()
+    df = _read_schedule()
+    if df.empty:
+        return None
+    slots, pid = _booking_slots(df, doctor_name, start, patient_id, duration_min)
+    if not slots:
+        return None
+    name, specialty = _canonical_doctor(doctor_name)
+    index = _patient_index()
+    _write_doctors(_free_rows(df, doctor_name, slots))
+    _reindex_patients(index, removed=[(pid, name, slots)])
+    _update_appointment(name, start, pid, status="cancelled")
+    analytics.record_release(name, start, slots=len(slots), specialty=specialty)
+    return {"doctor_name": name, "date_slot": start, "patient_id": pid, "slots": slots,
+            "patient": _patient_by_id(pid)}
+
+@recorded()
+def reschedule(doctor_name: str, date_time: datetime, new_date_time: datetime, new_doctor_name: str = None,
+               patient_id: int = None, duration_min: int = None):
+    """
+    Move a booking to `new_date_time` (optionally with another doctor). The old slots are freed and
+    the new ones reserved in a single schedule write under the data lock, so there is no window in
+    which another session can take either; the appointment record and reminders follow.
+    Returns (True, new booking) or (False, None) when the booking is missing or the new slot is taken.
+    """
+    with _file_lock():
+        result = _reschedule(doctor_name, date_time, new_date_time, new_doctor_name, patient_id, duration_min)
+        if result is None:
+            return False, None
+        old, new = result
+        _replace_reminders(old=old, new=new)
+        from tools import waitlist
+        for slot in old["slots"]:
+            if not (old["doctor_name"] == new["doctor_name"] and slot in new["slots"]):
+                waitlist.on_slot_freed(old["doctor_name"], slot)
+    return True, new
+
+def _reschedule(doctor_name, date_time, new_date_time, new_doctor_name=None, patient_id=None, duration_min=None):
+    from tools import analytics
+    start = pd.to_datetime(date_time).to_pydatetime()
+    new_start = pd.to_datetime(new_date_time).to_pydatetime()
+    df = _read_schedule()
+    if df.empty:
+        return None
+    old_slots, pid = _booking_slots(df, doctor_name, start, patient_id)
+    if not old_slots:
+        return None
+    old_name, old_specialty = _canonical_doctor(doctor_name)
+    new_name, new_specialty = _canonical_doctor(new_doctor_name or doctor_name)
+    same_doctor = new_name.casefold() == old_name.casefold()
+    new_slots = _slot_run(new_start, duration_min or len(old_slots) * 30)
+
+    # The booking's own slots count as free when moving within the same doctor's day
+    open_times = set(_open_slot_times(new_name, new_slots[0].date(), new_slots[-1].date()))
+    if same_doctor:
+        open_times.update(old_slots)
+    if not all(t in open_times for t in new_slots):
+        return None
+
+    index = _patient_index()
+    df = _free_rows(df, old_name, [t for t in old_slots if not (same_doctor and t in new_slots)])
+    df = _book_rows(df, new_name, new_slots, pid)
+    _write_doctors(df)
+    _reindex_patients(index, removed=[(pid, old_name, old_slots)], added=[(pid, new_name, new_slots)])
+    _update_appointment(old_name, start, pid, doctor_name=new_name, date_slot=new_start,
+                        duration_min=len(new_slots) * 30)
+    analytics.record_release(old_name, start, slots=len(old_slots), specialty=old_specialty)
+    analytics.record_booking(new_name, new_start, slots=len(new_slots), specialty=new_specialty)
+
+    patient = _patient_by_id(pid)
+    old = {"doctor_name": old_name, "date_slot": start, "patient_id": pid, "slots": old_slots, "patient": patient}
+    new = {"doctor_name": new_name, "date_slot": new_start, "patient_id": pid, "slots": new_slots,
+           "duration_min": len(new_slots) * 30, "patient": patient, "status": "confirmed"}
+    return old, new
+
+@recorded(readonly=True)
 def find_next_available_slots(doctor_name: str, start_day: date, duration_min: int = 30, limit: int = 5):
     """
     Return up to `limit` available slots for the given doctor on or after `start_day`.
     Respects 30 or 60 minute durations (for 60 min requires two consecutive 30-min slots).
+    Rule-based availability is expanded two weeks at a time, only as far as needed.
     """
-    df = _read_doctors()
-    if df.empty:
+    from tools import availability
+    entry = _schedule_index().get(str(doctor_name).strip().casefold(), _NO_ROWS)
+    has_rule = availability.rule_for(doctor_name) is not None
+    if not has_rule and not entry["open"]:
         return []
-    # Normalize types
-    df['date_slot'] = pd.to_datetime(df['date_slot'])
-    if 'is_available' in df.columns:
-        df['is_available'] = df['is_available'].apply(
-            lambda x: True if str(x).strip().lower() in ('true','1','yes','y','t') else False
-        )
-    else:
-        df['is_available'] = True
-
-    # Doctor match robustly
-    doc_series = df['doctor_name'].astype(str).str.strip().str.casefold()
-    target_doc = str(doctor_name).strip().casefold()
-    doc_mask = doc_series == target_doc
-
-    # On or after start_day
-    start_ts = pd.Timestamp(start_day)
-    day_mask = df['date_slot'] >= start_ts
-    pool = df[doc_mask & day_mask & (df['is_available'] == True)].sort_values('date_slot')
+    last_day = start_day + timedelta(days=availability.HORIZON_DAYS) if has_rule else start_day
+    if entry["open"]:
+        last_day = max(last_day, entry["open"][-1].date())
 
+    name, _ = _canonical_doctor(doctor_name)
     slots = []
-    if duration_min == 30:
-        for _, r in pool.iterrows():
-            slots.append({"doctor_name": r['doctor_name'], "date_slot": r['date_slot'].to_pydatetime()})
+    day = start_day
+    while day <= last_day and len(slots) < limit:
+        window_end = min(day + timedelta(days=13), last_day)
+        for t in _with_duration(_open_slot_times(doctor_name, day, window_end), duration_min):
+            slots.append({"doctor_name": name, "date_slot": t})
             if len(slots) >= limit:
                 break
-        return slots
-    if duration_min == 60:
-        times = pool['date_slot'].tolist()
-        for i in range(len(times) - 1):
-            if times[i+1] == times[i] + timedelta(minutes=30):
-                slots.append({"doctor_name": doctor_name, "date_slot": times[i].to_pydatetime()})
-                if len(slots) >= limit:
-                    break
-        return slots
+        day = window_end + timedelta(days=1)
     return slots
 
-def list_doctor_names() -> list:
+# Series anchors are tried on the slot grid
+SERIES_GRID_MIN = 30
+
+def _merged_windows(offsets: list, shift: int) -> list:
+    """[lo, hi] minute windows within `shift` of any offset (offsets sorted), overlapping ones merged."""
+    windows = []
+    for o in offsets:
+        if windows and o - shift <= windows[-1][1]:
+            windows[-1][1] = o + shift
+        else:
+            windows.append([o - shift, o + shift])
+    return windows
+
+def _intersect_windows(a: list, b: list) -> list:
+    """Intersection of two sorted, disjoint window lists (two-pointer sweep)."""
+    out, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        lo, hi = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if lo <= hi:
+            out.append([lo, hi])
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return out
+
+@recorded(readonly=True)
+def find_series_slots(doctor_name: str, start_day: date, weeks: int, duration_min: int = 30,
+                      max_shift_min: int = 60, limit: int = 3):
     """
-    Return a sorted list of unique doctor names from the doctors schedule file.
-    If the file is missing or empty, return an empty list.
+    Weekly series for `weeks` weeks from `start_day`: the same weekday and time every week, where
+    any single week may move by up to `max_shift_min` minutes if the usual time is taken.
+
+    Open start times are read once for the whole range and expressed as minutes into their week.
+    Each week's times widened by the allowed shift form a set of windows; intersecting the windows
+    of all weeks leaves exactly the anchor times every week can serve. Each anchor on the slot
+    grid picks the nearest open time per week, and series with the most exact weeks come first.
+    Returns up to `limit` dicts: doctor_name, date_slot (first visit), series (all visit starts),
+    exact_weeks.
     """
-    df = _read_doctors()
-    if df.empty or 'doctor_name' not in df.columns:
+    if weeks < 1:
         return []
-    names = sorted(df['doctor_name'].dropna().astype(str).unique().tolist())
-    return names
\ No newline at end of file
+    end_day = start_day + timedelta(days=7 * weeks - 1)
+    origin = datetime.combine(start_day, datetime.min.time())
+    by_week = [[] for _ in range(weeks)]
+    for t in _with_duration(_open_slot_times(doctor_name, start_day, end_day), duration_min):
+        minutes = int((t - origin).total_seconds() // 60)
+        by_week[minutes // (7 * 24 * 60)].append(minutes % (7 * 24 * 60))
+    if not all(by_week):
+        return []
+
+    windows = _merged_windows(by_week[0], max_shift_min)
+    for offsets in by_week[1:]:
+        windows = _intersect_windows(windows, _merged_windows(offsets, max_shift_min))
+        if not windows:
+            return []
+
+    name, _ = _canonical_doctor(doctor_name)
+    candidates, seen = [], set()
+    for lo, hi in windows:
+        anchor = -(-lo // SERIES_GRID_MIN) * SERIES_GRID_MIN
+        while anchor <= hi:
+            picks = []
+            for offsets in by_week:
+                i = bisect_left(offsets, anchor)
+                near = [o for o in offsets[max(0, i - 1):i + 1] if abs(o - anchor) <= max_shift_min]
+                picks.append(min(near, key=lambda o: (abs(o - anchor), o)))
+            key = tuple(picks)
+            if key not in seen:
+                seen.add(key)
+                exact = sum(1 for o in picks if o == anchor)
+                candidates.append((-exact, anchor, picks))
+            anchor += SERIES_GRID_MIN
+    candidates.sort(key=lambda c: (c[0], c[1]))
+
+    series_list = []
+    for neg_exact, _, picks in candidates[:limit]:
+        series = [origin + timedelta(days=7 * w, minutes=o) for w, o in enumerate(picks)]
+        series_list.append({"doctor_name": name, "date_slot": series[0], "series": series,
+                            "exact_weeks": -neg_exact})
+    return series_list
+
+@recorded()
+def reserve_series(doctor_name: str, starts: list, patient_id: int, duration_min: int = 30):
+    """
+    Reserve every visit of a series or none: all slots are checked and booked in one schedule
+    write under the data lock. Returns (True, [booked visit rows]), (False, None) when a slot is
+    taken, or (False, {"reason": PATIENT_CONFLICT, "conflict": visit}) like reserve_slots.
+    """
+    with _file_lock():
+        return _reserve_series(doctor_name, starts, patient_id, duration_min)
+
+def _reserve_series(doctor_name: str, starts: list, patient_id: int, duration_min: int = 30):
+    from tools import analytics
+    starts = sorted(pd.to_datetime(s).to_pydatetime() for s in starts)
+    if not starts:
+        return False, None
+    runs = [_slot_run(s, 60 if duration_min == 60 else 30) for s in starts]
+    wanted = [t for run in runs for t in run]
+
+    open_times = set(_open_slot_times(doctor_name, starts[0].date(), wanted[-1].date()))
+    if patient_id is None or not all(t in open_times for t in wanted):
+        return False, None
+    index = _patient_index()
+    visits = index.get(int(patient_id), [])
+    for run in runs:
+        clash = _overlaps(visits, run[0], run[-1] + timedelta(minutes=30))
+        if clash:
+            return _conflict_failure(clash)
+
+    df = _read_schedule()
+    if df.empty:
+        df = pd.DataFrame(columns=SCHEDULE_COLUMNS)
+    name, specialty = _canonical_doctor(doctor_name)
+    _write_doctors(_book_rows(df, doctor_name, wanted, patient_id))
+    _reindex_patients(index, added=[(patient_id, name, run) for run in runs])
+
+    analytics.record_bookings([(name, start, len(run), specialty) for start, run in zip(starts, runs)])
+    booked = []
+    for start in starts:
+        booked.append({"doctor_name": name, "specialty": specialty, "date_slot": pd.Timestamp(start),
+                       "is_available": False, "patient_id": int(patient_id)})
+    return True, booked
+
+@recorded(readonly=True)
+def list_doctor_names() -> list:
+    """
+    Return a sorted list of unique doctor names from the schedule (stored rows and availability rules).
+    If there is no schedule, return an empty list.
+    """
+    return [d["doctor_name"] for d in list_doctors()]
+
+@recorded(readonly=True)
+def list_doctors() -> list:
+    """
+    One dict per doctor: doctor_name, specialty and the sorted list of open slot datetimes
+    ('open_slots'; for rule-based doctors, the next CATALOG_LOOKAHEAD_DAYS days only).
+    The list is cached per schedule version and day, and shared; treat it as read-only.
+    """
+    from tools import availability
+    today = date.today()
+    def build():
+        index = _schedule_index()
+        rules = availability.rules().doctors
+        doctors = []
+        for key in set(index) | set(rules):
+            entry, rule = index.get(key, _NO_ROWS), rules.get(key)
+            name = entry["name"] or rule.name
+            if rule is None:
+                open_slots = entry["open"]
+            else:
+                open_slots = _open_slot_times(name, today, today + timedelta(days=CATALOG_LOOKAHEAD_DAYS))
+            specialty = entry["specialty"] or (rule.specialty if rule else None)
+            doctors.append({"doctor_name": name, "specialty": specialty, "open_slots": open_slots})
+        return sorted(doctors, key=lambda d: d["doctor_name"])
+    return _cached(paths().schedule_sources, f"doctors:{today}", build)
+
+# --- Async variants: the pandas/openpyxl work runs on the shared blocking-I/O pool ---
+
+async def afind_patient_by_name_dob(first_name: str, last_name: str, dob: str):
+    return await run_blocking(find_patient_by_name_dob, first_name, last_name, dob)
+
+async def aensure_patient_record(patient: dict):
+    return await run_blocking(ensure_patient_record, patient)
+
+async def afind_available_slots(doctor_name: str, day: date, duration_min: int = 30):
+    return await run_blocking(find_available_slots, doctor_name, day, duration_min)
+
+async def afind_next_available_slots(doctor_name: str, start_day: date, duration_min: int = 30, limit: int = 5):
+    return await run_blocking(find_next_available_slots, doctor_name, start_day, duration_min, limit)
+
+async def areserve_slot(doctor_name: str, date_time: datetime, patient_id: int, duration_min: int = 30):
+    return await run_blocking(reserve_slot, doctor_name, date_time, patient_id, duration_min)
+
+async def areserve_slots(requests: list) -> list:
+    return await run_blocking(reserve_slots, requests)
+
+async def arelease_slot(doctor_name: str, date_time: datetime, patient_id: int = None, duration_min: int = None):
+    return await run_blocking(release_slot, doctor_name, date_time, patient_id, duration_min)
+
+async def areschedule(doctor_name: str, date_time: datetime, new_date_time: datetime, new_doctor_name: str = None,
+                      patient_id: int = None, duration_min: int = None):
+    return await run_blocking(reschedule, doctor_name, date_time, new_date_time, new_doctor_name, patient_id, duration_min)
+
+async def aappend_appointment_export(patient: dict, appt: dict):
+    return await run_blocking(append_appointment_export, patient, appt)
+
+async def aappend_appointment_exports(patient: dict, appts: list):
+    return await run_blocking(append_appointment_exports, patient, appts)
+
+async def afind_series_slots(doctor_name: str, start_day: date, weeks: int, duration_min: int = 30,
+                             max_shift_min: int = 60, limit: int = 3):
+    return await run_blocking(find_series_slots, doctor_name, start_day, weeks, duration_min, max_shift_min, limit)
+
+async def areserve_series(doctor_name: str, starts: list, patient_id: int, duration_min: int = 30):
+    return await run_blocking(reserve_series, doctor_name, starts, patient_id, duration_min)
+
+async def apatient_conflicts(patient_id: int, start: datetime, duration_min: int = 30) -> list:
+    return await run_blocking(patient_conflicts, patient_id, start, duration_min)
+
+async def aupcoming_appointments(patient_id: int, after: datetime = None, limit: int = None) -> list:
+    return await run_blocking(upcoming_appointments, patient_id, after, limit)
+
+async def alist_doctor_names() -> list:
+    return await run_blocking(list_doctor_names)
+
+async def alist_doctors() -> list:
+    return await run_blocking(list_doctors)
@@ -0,0 +1,180 @@
+# ai-scheduling-agent/tools/doctor_catalog.py
+"""
+Doctor catalog with prefix autocomplete and fuzzy name resolution.
+
+Built once per clinic and schedule version from tools.data_io.list_doctors() and indexed two ways:
+  - a sorted list of name keys (full name and each name part) for prefix typeahead via bisect
+  - a trigram -> doctors map, so misspelled or partial names ("wong", "Dr Alice", "alise wong")
+    resolve by scoring only the doctors that share trigrams with the query
+resolve() picks a doctor only if every word of the query matches one of that doctor's name
+parts, so an incidental word ("my daughter Emma needs a visit") never selects a doctor.
+"""
+
+import bisect
+import difflib
+import re
+import threading
+from datetime import datetime
+
+from tools import data_io
+from tools.data_io import list_doctors
+
+# Words that appear around doctor names in chat but are never part of one
+_STOPWORDS = {
+    "dr", "doctor", "doc", "on", "with", "for", "at", "an", "a", "the", "to", "see", "book",
+    "appointment", "please", "i", "want", "like", "would", "need", "me", "and", "or", "next",
+    "available", "is", "am", "pm", "tomorrow", "today", "can", "could", "my", "visit", "slot",
+    "schedule", "make", "get", "in", "of",
+}
+
+# A name part counts as matched only above this similarity
+_MIN_TOKEN_SIM = 0.5
+# resolve() needs at least this much total evidence
+_MIN_RESOLVE_SCORE = 0.6
+
+def _norm_tokens(text: str) -> list:
+    return [t for t in re.findall(r"[a-z]+", str(text).lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+def _trigrams(token: str) -> set:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _similarity(query_token: str, name_token: str) -> float:
+    if query_token == name_token:
+        return 1.0
+    if len(query_token) >= 3 and name_token.startswith(query_token):
+        return 0.9
+    a, b = _trigrams(query_token), _trigrams(name_token)
+    jaccard = len(a & b) / len(a | b)
+    # Trigrams are weak on short transposed words ("smiht"); edit similarity covers those
+    edit = difflib.SequenceMatcher(None, query_token, name_token).ratio() * 0.85
+    return max(jaccard, edit)
+
+class DoctorCatalog:
+    def __init__(self, doctors: list):
+        self.entries = [
+            {"name": d["doctor_name"], "specialty": d.get("specialty"), "open_slots": d.get("open_slots", [])}
+            for d in doctors
+        ]
+        self._tokens = [_norm_tokens(e["name"]) for e in self.entries]
+        self._by_name = {e["name"].casefold(): i for i, e in enumerate(self.entries)}
+        self._by_tokens = {" ".join(tokens): i for i, tokens in enumerate(self._tokens) if tokens}
+
+        keys = []
+        trigram_index = {}
+        for i, tokens in enumerate(self._tokens):
+            keys.append((" ".join(tokens), i))
+            for tok in tokens:
+                keys.append((tok, i))
+                for tri in _trigrams(tok):
+                    trigram_index.setdefault(tri, set()).add(i)
+        keys.sort()
+        self._prefix_keys = [k for k, _ in keys]
+        self._prefix_ids = [i for _, i in keys]
+        self._trigram_index = trigram_index
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def next_available(entry: dict, now: datetime = None):
+        """Earliest open slot at or after `now`, or None."""
+        slots = entry["open_slots"]
+        pos = bisect.bisect_left(slots, now or datetime.now())
+        return slots[pos] if pos < len(slots) else None
+
+    def summary(self, entry: dict, now: datetime = None) -> str:
+        """'Dr. Alice Wong (Allergy) — next: 2025-09-15 09:30' for chat and pickers."""
+        text = entry["name"]
+        if entry.get("specialty"):
+            text += f" ({entry['specialty']})"
+        nxt = self.next_available(entry, now)
+        text += f" — next: {nxt:%Y-%m-%d %H:%M}" if nxt else " — no open slots"
+        return text
+
+    def complete(self, prefix: str, limit: int = 10) -> list:
+        """Doctors whose full name or any name part starts with `prefix` (typeahead)."""
+        query = " ".join(_norm_tokens(prefix))
+        if not query:
+            return self.entries[:limit]
+        out, seen = [], set()
+        pos = bisect.bisect_left(self._prefix_keys, query)
+        while pos < len(self._prefix_keys) and self._prefix_keys[pos].startswith(query):
+            idx = self._prefix_ids[pos]
+            if idx not in seen:
+                seen.add(idx)
+                out.append(self.entries[idx])
+                if len(out) >= limit:
+                    break
+            pos += 1
+        return out
+
+    def match(self, text: str, limit: int = 5) -> list:
+        """Rank doctors against free text; returns [(score, entry)] best first."""
+        exact = self._by_name.get(str(text).strip().casefold())
+        if exact is not None:
+            return [(float("inf"), self.entries[exact])]
+        query = _norm_tokens(text)
+        if not query:
+            return []
+        candidates = set()
+        for tok in query:
+            for tri in _trigrams(tok):
+                candidates |= self._trigram_index.get(tri, set())
+        scored = []
+        for idx in candidates:
+            score = 0.0
+            for q in query:
+                best = max((_similarity(q, t) for t in self._tokens[idx]), default=0.0)
+                if best >= _MIN_TOKEN_SIM:
+                    score += best
+            if score > 0:
+                scored.append((score, self.entries[idx]))
+        scored.sort(key=lambda x: (-x[0], x[1]["name"]))
+        return scored[:limit]
+
+    def exact(self, name: str):
+        """Canonical name of the doctor called exactly `name` ("Dr John Smith" = "Dr. John Smith"), or None."""
+        idx = self._by_name.get(str(name).strip().casefold())
+        if idx is None:
+            idx = self._by_tokens.get(" ".join(_norm_tokens(name)))
+        return self.entries[idx]["name"] if idx is not None else None
+
+    @staticmethod
+    def full_name(text: str) -> bool:
+        """True when `text` has two or more name words ("John Smith"), which resolve only exactly."""
+        return len(_norm_tokens(text)) >= 2
+
+    def _covers(self, query: list, entry: dict) -> bool:
+        tokens = self._tokens[self._by_name[entry["name"].casefold()]]
+        return all(max((_similarity(q, t) for t in tokens), default=0.0) >= _MIN_TOKEN_SIM for q in query)
+
+    def resolve(self, text: str):
+        """
+        Canonical doctor name for `text`, or None if nothing matches, a word of `text` matches no
+        part of the best doctor's name, or the best match is ambiguous.
+        """
+        ranked = self.match(text, limit=2)
+        if not ranked or ranked[0][0] < _MIN_RESOLVE_SCORE:
+            return None
+        if len(ranked) > 1 and ranked[1][0] >= ranked[0][0] - 0.05:
+            return None
+        if ranked[0][0] != float("inf") and not self._covers(_norm_tokens(text), ranked[0][1]):
+            return None
+        return ranked[0][1]["name"]
+
+_catalog_guard = threading.Lock()
+
+def get_catalog() -> DoctorCatalog:
+    """The current clinic's catalog; rebuilt only when list_doctors() returns a new schedule version."""
+    doctors = list_doctors()
+    sources = data_io.paths().schedule_sources
+    with _catalog_guard:
+        source, catalog = data_io._cached(sources, "catalog", lambda: (doctors, DoctorCatalog(doctors)))
+        if source is not doctors:
+            catalog = DoctorCatalog(doctors)
+            data_io._store_cached(sources, "catalog", (doctors, catalog))
+        return catalog
+
+def resolve_doctor(text: str):
+    return get_catalog().resolve(text)
@@ -2,8 +2,14 @@
 
 import os
 import smtplib
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from tools.utils import sanitize_email
+from tools.aio import run_blocking
+from tools.recorder import recorded
+from tools.tracing import span
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
@@ -26,35 +32,122 @@ def _get_email_credentials():
         )
     return user, password
 
-def send_email(to_email: str, subject: str, body: str):
-    from_email, password = _get_email_credentials()
-    to_email_norm = sanitize_email(to_email)
-    if not to_email_norm:
-        raise RuntimeError(f"Invalid recipient email: {to_email}")
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+# Logged-in connections kept for reuse; idle ones are dropped before the server times them out
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_IDLE_SECONDS = 60
 
+_pool = []  # [(server, last used)], most recently used last
+_pool_guard = threading.Lock()
+
+def _connect(user: str, password: str):
+    server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+    server.starttls()
+    server.login(user, password)
+    return server
+
+def _close(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        pass
+
+@contextmanager
+def smtp_connection():
+    """
+    Borrow a logged-in SMTP connection from the pool (or open one). It goes back to the pool
+    afterwards unless the connection itself failed, so bursts of mail skip the TLS handshake
+    and login per message.
+    """
+    user, password = _get_email_credentials()
+    server, stale = None, []
+    now = time.monotonic()
+    with _pool_guard:
+        while _pool and server is None:
+            candidate, used = _pool.pop()
+            if now - used < SMTP_IDLE_SECONDS:
+                server = candidate
+            else:
+                stale.append(candidate)
+    for old in stale:
+        _close(old)
+    if server is None:
+        server = _connect(user, password)
+    healthy = True
+    try:
+        yield server
+    except (smtplib.SMTPServerDisconnected, OSError):
+        healthy = False
+        raise
+    finally:
+        _release(server, healthy)
+
+def _release(server, healthy: bool):
+    if healthy:
+        with _pool_guard:
+            if len(_pool) < SMTP_POOL_SIZE:
+                _pool.append((server, time.monotonic()))
+                return
+    _close(server)
+
+def _message(from_email: str, to_email: str, subject: str, body: str):
     msg = MIMEMultipart()
     msg['From'] = from_email
-    msg['To'] = to_email_norm
+    msg['To'] = to_email
     msg['Subject'] = subject or ""
     msg.attach(MIMEText(body or "", 'plain'))
+    return msg
 
-    server = smtplib.SMTP('smtp.gmail.com', 587)
-    server.starttls()
-    server.login(from_email, password)
-    server.sendmail(from_email, to_email_norm, msg.as_string())
-    server.quit()
+def _deliver(from_email: str, to_email: str, msg):
+    # A pooled connection may have been closed by the server since it was last used; retry once on a new one
+    for attempt in range(2):
+        try:
+            with smtp_connection() as server:
+                server.sendmail(from_email, to_email, msg.as_string())
+            return
+        except smtplib.SMTPServerDisconnected:
+            if attempt:
+                raise
+
+@recorded("email")
+def send_email(to_email: str, subject: str, body: str):
+    from_email, _ = _get_email_credentials()
+    to_email_norm = sanitize_email(to_email)
+    if not to_email_norm:
+        raise RuntimeError(f"Invalid recipient email: {to_email}")
+
+    with span("notify.email"):
+        _deliver(from_email, to_email_norm, _message(from_email, to_email_norm, subject, body))
+
+@recorded("email.batch")
+def send_emails(messages: list) -> list:
+    """
+    Send several (to_email, subject, body) messages over pooled connections.
+    Returns one error per message (None when it was sent); one bad recipient does not stop the rest.
+    """
+    from_email, _ = _get_email_credentials()
+    errors = []
+    with span("notify.email", batch=len(messages)):
+        for to_email, subject, body in messages:
+            to_email_norm = sanitize_email(to_email)
+            if not to_email_norm:
+                errors.append(f"Invalid recipient email: {to_email}")
+                continue
+            try:
+                _deliver(from_email, to_email_norm, _message(from_email, to_email_norm, subject, body))
+                errors.append(None)
+            except (smtplib.SMTPException, OSError) as e:
+                errors.append(str(e))
+    return errors
 
 def send_email_with_attachment(to_email: str, subject: str, body: str, file_path: str):
-    from_email, password = _get_email_credentials()
+    from_email, _ = _get_email_credentials()
     to_email_norm = sanitize_email(to_email)
     if not to_email_norm:
         raise RuntimeError(f"Invalid recipient email: {to_email}")
 
-    msg = MIMEMultipart()
-    msg['From'] = from_email
-    msg['To'] = to_email_norm
-    msg['Subject'] = subject or ""
-    msg.attach(MIMEText(body or "", 'plain'))
+    msg = _message(from_email, to_email_norm, subject, body)
 
     try:
         with open(file_path, "rb") as attachment:
@@ -68,11 +161,18 @@ def send_email_with_attachment(to_email: str, subject: str, body: str, file_path
         return
 
     try:
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(from_email, password)
-        server.sendmail(from_email, to_email_norm, msg.as_string())
-        server.quit()
+        with span("notify.email", attachment=True):
+            _deliver(from_email, to_email_norm, msg)
         print("Email sent successfully.")
     except Exception as e:
         print(f"Email failed: {e}")
+
+# smtplib has no async API; run the SMTP exchange on the shared blocking-I/O pool
+async def asend_email(to_email: str, subject: str, body: str):
+    return await run_blocking(send_email, to_email, subject, body)
+
+async def asend_emails(messages: list) -> list:
+    return await run_blocking(send_emails, messages)
+
+async def asend_email_with_attachment(to_email: str, subject: str, body: str, file_path: str):
+    return await run_blocking(send_email_with_attachment, to_email, subject, body, file_path)
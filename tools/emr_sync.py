@@ -0,0 +1,219 @@
+# ai-scheduling-agent/tools/emr_sync.py
+"""
+Incremental EMR -> patients.csv sync.
+
+Streams an EMR patient extract (CSV) in chunks, hashes each row's content with
+pandas.util.hash_pandas_object and compares it with the hash of the stored row for the
+same key. Only new and changed rows are kept in memory; they are applied in one batch
+write of patients.csv under the data lock. Unchanged rows cost a hash and a dict lookup.
+
+Stored-row hashes are kept between runs in the clinic's emr_hashes.json, so a sync only
+hashes the extract plus the stored rows the file does not cover (patients registered
+locally since the last sync); the file is rebuilt when the compared columns change.
+
+Rows are matched on patient_id when the extract has it, otherwise on first name, last name
+and date of birth (the same identity the lookup agent uses). New patients without an id get
+the next free patient_id. Patients missing from the extract are reported, never deleted.
+Inserted and updated rows get their normalized contact columns (phone_e164, email_norm,
+contact_valid) in the same write.
+
+Usage:
+    python -m tools.emr_sync emr_extract.csv
+    python -m tools.emr_sync emr_extract.csv --dry-run --json report.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+
+import pandas as pd
+
+from tools import data_io
+from tools.tracing import span
+
+DEFAULT_CHUNKSIZE = 50_000
+NATURAL_KEY = ("first_name", "last_name", "dob")
+HASHES_FILE = "emr_hashes.json"
+
+def _canonical(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """String form used for hashing, so '87397' and 87397.0 or ' Ann' and 'Ann' compare equal."""
+    out = df.reindex(columns=columns).astype("string").fillna("")
+    for col in columns:
+        out[col] = out[col].str.strip().str.replace(r"^(-?\d+)\.0+$", r"\1", regex=True)
+    if "dob" in columns:
+        parsed = pd.to_datetime(out["dob"], errors="coerce")
+        out["dob"] = parsed.dt.strftime("%Y-%m-%d").where(parsed.notna(), out["dob"])
+    return out
+
+def _keys(canon: pd.DataFrame, key_cols: list) -> pd.Series:
+    if key_cols == ["patient_id"]:
+        return canon["patient_id"]
+    return canon[key_cols].apply(lambda col: col.str.casefold()).agg("|".join, axis=1)
+
+def _hashes(canon: pd.DataFrame) -> list:
+    return [int(h) for h in pd.util.hash_pandas_object(canon, index=False)]
+
+def _store_keys(store: pd.DataFrame, key_cols: list) -> dict:
+    """{key: row position} for the current patients.csv."""
+    if store.empty:
+        return {}
+    return {k: pos for pos, k in enumerate(_keys(_canonical(store, key_cols), key_cols)) if k}
+
+def _version(version) -> list:
+    return list(version) if version else None
+
+def _load_hashes(compare_cols: list, key_cols: list, version) -> dict:
+    """
+    {key: content hash} saved by the last sync, or {} when it compared other columns or
+    patients.csv has been written since (`version` is its current data_io._file_version).
+    """
+    try:
+        with open(data_io.paths().file(HASHES_FILE), encoding="utf-8") as fh:
+            saved = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    if saved.get("compare_cols") != compare_cols or saved.get("key_cols") != key_cols:
+        return {}
+    if saved.get("patients_version") != _version(version):
+        return {}  # rows may have been edited locally; their saved hashes no longer describe them
+    return saved.get("hashes", {})
+
+def _save_hashes(hashes: dict, compare_cols: list, key_cols: list, version):
+    path = data_io.paths().file(HASHES_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"compare_cols": compare_cols, "key_cols": key_cols, "patients_version": _version(version),
+                   "hashes": hashes}, fh, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def _stored_hashes(store: pd.DataFrame, positions: dict, compare_cols: list, key_cols: list, version) -> tuple:
+    """
+    ({key: content hash} for every stored key, number of rows hashed now): saved hashes are
+    reused while patients.csv is still at the `version` they were saved for; otherwise, and
+    for stored rows they do not cover, rows are hashed.
+    """
+    saved = _load_hashes(compare_cols, key_cols, version)
+    hashes = {k: saved[k] for k in positions if k in saved}
+    missing = [pos for k, pos in positions.items() if k not in hashes]
+    if missing:
+        canon = _canonical(store.iloc[missing], compare_cols)
+        hashes.update(zip(_keys(canon, key_cols), _hashes(canon)))
+    return hashes, len(missing)
+
+def sync(extract_path: str, dry_run: bool = False, chunksize: int = DEFAULT_CHUNKSIZE) -> dict:
+    """Apply inserts/updates from the extract to patients.csv; returns a report of counts."""
+    t0 = time.perf_counter()
+    # Taken before the read: a write in between makes the saved hashes look stale, never current
+    version = data_io._file_version(data_io.paths().patients_csv)
+    store = data_io._read_patients()
+    extract_cols = list(pd.read_csv(extract_path, nrows=0).columns)
+    columns = list(store.columns) if len(store.columns) else extract_cols
+    key_cols = ["patient_id"] if "patient_id" in extract_cols else list(NATURAL_KEY)
+    missing_key = [c for c in key_cols if c not in extract_cols]
+    if missing_key:
+        raise ValueError(f"Extract is missing key columns: {', '.join(missing_key)}")
+    # Compare only what the extract actually carries; other stored columns are left alone
+    compare_cols = [c for c in columns if c in extract_cols]
+    positions = _store_keys(store, key_cols)
+    stored, rehashed = _stored_hashes(store, positions, compare_cols, key_cols, version)
+
+    report = {"rows_read": 0, "inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0,
+              "not_in_extract": 0, "stored_rows_hashed": rehashed, "dry_run": dry_run}
+    inserts, updates, seen = {}, {}, set()
+    with span("emr.scan", file=extract_path) as sp:
+        for chunk in pd.read_csv(extract_path, chunksize=chunksize, dtype=str, keep_default_na=False):
+            report["rows_read"] += len(chunk)
+            canon = _canonical(chunk, compare_cols)
+            keys = _keys(canon, key_cols)
+            for pos, key, h in zip(range(len(chunk)), keys, _hashes(canon)):
+                if not key or key in seen:
+                    report["skipped"] += 1  # no usable key, or a duplicate within the extract
+                    continue
+                seen.add(key)
+                if key not in positions:
+                    inserts[key] = chunk.iloc[pos][compare_cols].to_dict()
+                elif stored.get(key) != h:
+                    updates[key] = chunk.iloc[pos][compare_cols].to_dict()
+                else:
+                    report["unchanged"] += 1
+                    continue
+                stored[key] = h
+        sp.set(rows=report["rows_read"])
+    report["inserted"], report["updated"] = len(inserts), len(updates)
+    report["not_in_extract"] = len(set(positions) - seen)
+
+    if not dry_run:
+        if inserts or updates:
+            version = _apply(inserts, updates, compare_cols, key_cols)
+        if inserts or updates or rehashed:
+            _save_hashes(stored, compare_cols, key_cols, version)
+    report["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    return report
+
+def _apply(inserts: dict, updates: dict, compare_cols: list, key_cols: list):
+    """
+    One read-modify-write of patients.csv for all changes (both dicts map key -> extract row).
+    Returns the file version it wrote, taken under the lock so no other write slips in between.
+    """
+    with data_io._file_lock(), span("emr.apply", inserts=len(inserts), updates=len(updates)):
+        current = data_io._read_patients()
+        if current.empty:
+            current = pd.DataFrame(columns=compare_cols)
+        # Rows may have been registered since the scan; resolve keys against the store as it is now
+        positions = _store_keys(current, key_cols)
+        changes = {**inserts, **updates}
+        new_rows = []
+        # Extract values are text; typed columns (int64 ids, float phones) would reject them
+        targets = [c for c in compare_cols + ["contact_valid"] if c in current.columns]
+        current = current.astype({c: object for c in targets})
+        with warnings.catch_warnings():
+            warnings.simplefilter(action='ignore', category=FutureWarning)
+            for key, row in changes.items():
+                pos = positions.get(key)
+                if pos is None:
+                    new_rows.append(row)
+                    continue
+                for col, val in row.items():
+                    current.at[current.index[pos], col] = val if val != "" else None
+                if "contact_valid" in current.columns:
+                    # Re-derived for this row by _write_patients
+                    current.at[current.index[pos], "contact_valid"] = None
+            if new_rows:
+                new = pd.DataFrame(new_rows).replace({"": None})
+                if "patient_id" not in new.columns:
+                    new["patient_id"] = None
+                missing = new["patient_id"].isna()
+                if missing.any():
+                    ids = pd.to_numeric(current["patient_id"], errors="coerce") if "patient_id" in current.columns else pd.Series(dtype=float)
+                    next_id = int(ids.max()) + 1 if ids.notna().any() else 1
+                    new.loc[missing, "patient_id"] = list(range(next_id, next_id + int(missing.sum())))
+                current = pd.concat([current, new], ignore_index=True)
+        data_io._write_patients(current)
+        return data_io._file_version(data_io.paths().patients_csv)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Incremental EMR patient sync into patients.csv")
+    parser.add_argument("extract", help="EMR patient extract (CSV with patients.csv column names)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+    try:
+        report = sync(args.extract, dry_run=args.dry_run, chunksize=args.chunksize)
+    except (OSError, ValueError) as e:
+        print(f"EMR sync failed: {e}", file=sys.stderr)
+        return 2
+    print(f"{report['rows_read']} rows read: {report['inserted']} inserted, {report['updated']} updated, "
+          f"{report['unchanged']} unchanged, {report['skipped']} skipped, "
+          f"{report['not_in_extract']} stored patients not in extract"
+          f"{' (dry run)' if report['dry_run'] else ''} in {report['elapsed_s']}s")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
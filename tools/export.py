@@ -0,0 +1,158 @@
+# ai-scheduling-agent/tools/export.py
+"""
+Streaming appointment export for admins.
+
+Reads data/appointments.csv in chunks, filters each chunk (date range, doctor, status) and
+hands it straight to a writer, so memory stays flat no matter how much history there is:
+  - csv:     appended chunk by chunk
+  - xlsx:    openpyxl write-only workbook (rows are streamed to disk, never held as cells)
+  - parquet: pyarrow ParquetWriter, one row group per chunk (needs `pip install pyarrow`)
+
+Usage:
+    python -m tools.export --from 2025-09-01 --to 2025-09-30 -o september.xlsx
+    python -m tools.export --doctor "Dr. Alice Wong" --status confirmed -o wong.csv
+    python -m tools.export --from 2025-09-01 --format csv -o -        # CSV to stdout
+"""
+
+import argparse
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from tools.data_io import paths
+from tools.tracing import span
+
+FORMATS = ("csv", "xlsx", "parquet")
+DEFAULT_CHUNKSIZE = 50_000
+
+# Rows written before the status column existed are bookings, i.e. confirmed
+_DEFAULT_STATUS = "confirmed"
+
+def _as_date(value):
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return date.fromisoformat(str(value))
+
+def iter_appointments(start=None, end=None, doctor: str = None, status: str = None,
+                      chunksize: int = DEFAULT_CHUNKSIZE, path: str = None):
+    """
+    Yield filtered DataFrame chunks of the appointment history.
+    `start`/`end` are inclusive dates; `doctor` and `status` match case-insensitively.
+    """
+    path = path or paths().appts_csv
+    if not os.path.exists(path):
+        return
+    start, end = _as_date(start), _as_date(end)
+    lo = pd.Timestamp(start) if start else None
+    hi = pd.Timestamp(end + timedelta(days=1)) if end else None
+    doctor_key = doctor.strip().casefold() if doctor else None
+    status_key = status.strip().casefold() if status else None
+
+    # Writers replace the file atomically, so this handle keeps reading one consistent version
+    with open(path, newline="") as fh:
+        for chunk in pd.read_csv(fh, chunksize=chunksize):
+            chunk["date_slot"] = pd.to_datetime(chunk["date_slot"], errors="coerce")
+            if "status" not in chunk.columns:
+                chunk["status"] = _DEFAULT_STATUS
+            mask = pd.Series(True, index=chunk.index)
+            if lo is not None:
+                mask &= chunk["date_slot"] >= lo
+            if hi is not None:
+                mask &= chunk["date_slot"] < hi
+            if doctor_key:
+                mask &= chunk["doctor_name"].astype(str).str.strip().str.casefold() == doctor_key
+            if status_key:
+                mask &= chunk["status"].fillna(_DEFAULT_STATUS).astype(str).str.casefold() == status_key
+            out = chunk[mask]
+            if len(out):
+                yield out
+
+def _write_csv(chunks, out):
+    rows = 0
+    fh = sys.stdout if out == "-" else open(out, "w", newline="")
+    try:
+        for chunk in chunks:
+            chunk.to_csv(fh, index=False, header=rows == 0, date_format="%Y-%m-%d %H:%M:%S")
+            rows += len(chunk)
+    finally:
+        if fh is not sys.stdout:
+            fh.close()
+    return rows
+
+def _write_xlsx(chunks, out):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("appointments")
+    rows = 0
+    for chunk in chunks:
+        if rows == 0:
+            ws.append(list(chunk.columns))
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for values in chunk.itertuples(index=False, name=None):
+            ws.append([v.to_pydatetime() if isinstance(v, pd.Timestamp) else v for v in values])
+        rows += len(chunk)
+    wb.save(out)
+    return rows
+
+def _write_parquet(chunks, out):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    writer, schema, rows = None, None, 0
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = pq.ParquetWriter(out, schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+_WRITERS = {"csv": _write_csv, "xlsx": _write_xlsx, "parquet": _write_parquet}
+
+def export_appointments(out: str, fmt: str = None, start=None, end=None, doctor: str = None,
+                        status: str = None, chunksize: int = DEFAULT_CHUNKSIZE) -> int:
+    """Stream the filtered appointments to `out` ('-' = stdout for CSV). Returns the row count."""
+    fmt = (fmt or os.path.splitext(out)[1].lstrip(".") or "csv").lower()
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unsupported export format '{fmt}' (choose from {', '.join(FORMATS)})")
+    if out == "-" and fmt != "csv":
+        raise ValueError("Only CSV can be written to stdout")
+    chunks = iter_appointments(start, end, doctor, status, chunksize)
+    with span("export.appointments", format=fmt) as sp:
+        rows = _WRITERS[fmt](chunks, out)
+        sp.set(rows=rows)
+    return rows
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export appointments (streamed, filterable)")
+    parser.add_argument("-o", "--output", required=True, help="output file, or '-' for CSV on stdout")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the output file extension")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="first day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="last day, inclusive (YYYY-MM-DD)")
+    parser.add_argument("--doctor", help="exact doctor name, e.g. 'Dr. Alice Wong'")
+    parser.add_argument("--status", help="appointment status, e.g. confirmed or cancelled")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    try:
+        rows = export_appointments(args.output, args.format, args.start, args.end,
+                                   args.doctor, args.status, args.chunksize)
+    except (ValueError, RuntimeError) as e:
+        print(f"export failed: {e}", file=sys.stderr)
+        return 2
+    print(f"exported {rows} appointments to {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# ai-scheduling-agent/tools/intake_schema.py
+"""
+Patient intake fields generated from templates/intake_form.json.
+
+The schema is read once per process and each field gets its validator up front (phone and
+email normalizers for contact fields, date parsing, enum choices, required checks). The
+Streamlit app renders one form from these fields and validates the whole submission in a
+single pass, so intake takes one round trip instead of one per field.
+"""
+
+import json
+import os
+import re
+import threading
+from datetime import date, datetime
+
+from tools.utils import sanitize_email, sanitize_phone_in
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", "intake_form.json")
+
+# Labels that the generic "first_name" -> "First name" rule gets wrong or too terse
+_LABELS = {
+    "dob": "Date of birth",
+    "cell_phone": "Cell phone",
+    "zip_code": "ZIP code",
+    "primary_insurance": "Insurance provider",
+    "primary_member_id": "Member ID",
+    "primary_group": "Group number",
+    "secondary_member_id": "Secondary member ID",
+    "secondary_group": "Secondary group number",
+    "chief_complaint": "Reason for visit",
+}
+
+# Form sections, in display order; fields not listed here go to the last one
+SECTIONS = (
+    ("Patient", ("first_name", "middle_initial", "last_name", "dob", "gender")),
+    ("Contact", ("cell_phone", "email")),
+    ("Address", ("street", "city", "state", "zip_code")),
+    ("Emergency contact", ("emergency_contact", "emergency_relation", "emergency_phone")),
+    ("Insurance", ("primary_insurance", "primary_member_id", "primary_group",
+                   "secondary_insurance", "secondary_member_id", "secondary_group")),
+    ("Visit", ()),
+)
+
+_MAX_TEXT = 200
+_ZIP_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9 -]{2,9}")
+
+def _text(value):
+    if value is None:
+        return ""
+    return str(value).strip()
+
+def _check_string(field, value):
+    value = _text(value)
+    if len(value) > _MAX_TEXT:
+        return None, f"{field.label} is too long"
+    return value, None
+
+def _check_phone(field, value):
+    phone = sanitize_phone_in(_text(value))
+    return (phone, None) if phone else (None, f"{field.label} is not a valid phone number")
+
+def _check_email(field, value):
+    email = sanitize_email(_text(value))
+    return (email, None) if email else (None, f"{field.label} is not a valid email address")
+
+def _check_zip(field, value):
+    value = _text(value)
+    if value.endswith(".0"):
+        value = value[:-2]
+    return (value, None) if _ZIP_RE.fullmatch(value) else (None, f"{field.label} is not a valid postal code")
+
+def _check_date(field, value):
+    if isinstance(value, datetime):
+        value = value.date()
+    if not isinstance(value, date):
+        try:
+            value = date.fromisoformat(_text(value))
+        except ValueError:
+            return None, f"{field.label} must be a date (YYYY-MM-DD)"
+    if field.name == "dob" and not date(1900, 1, 1) <= value <= date.today():
+        return None, f"{field.label} is out of range"
+    return value.isoformat(), None
+
+def _check_enum(field, value):
+    value = _text(value)
+    for choice in field.choices:
+        if value.casefold() == str(choice).casefold():
+            return choice, None
+    return None, f"{field.label} must be one of: {', '.join(field.choices)}"
+
+def _validator(spec: dict):
+    name, kind = spec["name"], spec.get("type", "string")
+    if kind == "date":
+        return _check_date
+    if kind == "enum":
+        return _check_enum
+    if name == "email":
+        return _check_email
+    if name.endswith("_phone"):
+        return _check_phone
+    if name == "zip_code":
+        return _check_zip
+    return _check_string
+
+class Field:
+    __slots__ = ("name", "type", "required", "choices", "label", "section", "_check")
+
+    def __init__(self, spec: dict, section: str):
+        self.name = spec["name"]
+        self.type = spec.get("type", "string")
+        self.required = bool(spec.get("required"))
+        self.choices = list(spec.get("choices") or [])
+        self.label = _LABELS.get(self.name) or self.name.replace("_", " ").capitalize()
+        self.section = section
+        self._check = _validator(spec)
+
+    def clean(self, value):
+        """(normalized value, None) or (None, error message). Empty optional fields clean to None."""
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None, (f"{self.label} is required" if self.required else None)
+        return self._check(self, value)
+
+class IntakeSchema:
+    def __init__(self, spec: dict):
+        placement = {name: title for title, names in SECTIONS for name in names}
+        self.fields = [Field(f, placement.get(f["name"], SECTIONS[-1][0])) for f in spec.get("fields", [])]
+
+    def sections(self):
+        """[(title, [Field, ...])] in display order, skipping empty sections."""
+        out = []
+        for title, _ in SECTIONS:
+            fields = [f for f in self.fields if f.section == title]
+            if fields:
+                out.append((title, fields))
+        return out
+
+    def validate(self, values: dict):
+        """Check a whole submission at once: returns (clean values, {field name: error})."""
+        clean, errors = {}, {}
+        for field in self.fields:
+            value, error = field.clean(values.get(field.name))
+            if error:
+                errors[field.name] = error
+            elif value is not None:
+                clean[field.name] = value
+        return clean, errors
+
+_schema = None
+_schema_guard = threading.Lock()
+
+def get_schema() -> IntakeSchema:
+    """The parsed schema with its validators, built on first use and shared by every session."""
+    global _schema
+    if _schema is None:
+        with _schema_guard:
+            if _schema is None:
+                with open(SCHEMA_PATH, encoding="utf-8") as fh:
+                    _schema = IntakeSchema(json.load(fh))
+    return _schema
@@ -1,9 +1,366 @@
+# ai-scheduling-agent/tools/llm.py
+"""
+Chat model factory plus guarded calls for the agents.
+
+complete()/acomplete() never let one slow or failing provider response stall a turn:
+  - deadline: each call gets min(LLM_CALL_TIMEOUT_MS, what is left of the turn's budget,
+    LLM_TURN_BUDGET_MS, started by turn_budget() in agent_graph);
+  - hedging: if the first attempt has not answered after LLM_HEDGE_MS a second one is started
+    and the first reply wins (at most LLM_MAX_ATTEMPTS attempts per call);
+  - circuit breaker: after LLM_BREAKER_FAILURES consecutive failures or timeouts calls fail
+    fast for LLM_BREAKER_COOLDOWN_S, then one probe call decides whether to close again.
+Every refusal raises LLMUnavailable, on which callers use their rule-based parsers.
+
+LLM_PROVIDER=fake uses a local model; FAKE_LLM_LATENCY_MS ("300" or "50-3000") and
+FAKE_LLM_ERROR_RATE (0..1) make it slow or flaky to exercise the guards without a provider.
+"""
+
+import asyncio
+import contextvars
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from tools import recorder, tracing
+
+TURN_BUDGET_MS = float(os.environ.get("LLM_TURN_BUDGET_MS", "8000"))
+CALL_TIMEOUT_MS = float(os.environ.get("LLM_CALL_TIMEOUT_MS", "4000"))
+HEDGE_MS = float(os.environ.get("LLM_HEDGE_MS", "1500"))
+MAX_ATTEMPTS = int(os.environ.get("LLM_MAX_ATTEMPTS", "2"))
+BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_S = float(os.environ.get("LLM_BREAKER_COOLDOWN_S", "30"))
+
+# Guarded calls return whole replies to agent code, never text for the patient: runs with this
+# tag are skipped by LangGraph's "messages" stream (and by agent_graph.stream_turn)
+NOSTREAM_TAG = "nostream"
+
+class LLMUnavailable(RuntimeError):
+    """No model reply within the deadline, or the breaker is open; use the rule-based path."""
+
+def _tracing_callbacks(model: str):
+    """LangChain callback that records an 'llm.call' span per model call, when tracing is on."""
+    if not tracing.ENABLED:
+        return []
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class _LLMSpans(BaseCallbackHandler):
+        def __init__(self):
+            self._starts = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._starts[run_id] = time.perf_counter()
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._starts[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            start = self._starts.pop(run_id, None)
+            if start is not None:
+                tracing.record_span("llm.call", time.perf_counter() - start, model=model)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            start = self._starts.pop(run_id, None)
+            if start is not None:
+                tracing.record_span("llm.call", time.perf_counter() - start, model=model,
+                                    error=type(error).__name__)
+
+    return [_LLMSpans()]
+
+def _recording_callbacks():
+    """LangChain callback that adds each model reply to the turn being recorded (tools.recorder)."""
+    if not recorder.RECORD_DIR:
+        return []
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class _LLMRecorder(BaseCallbackHandler):
+        def __init__(self):
+            self._starts = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._starts[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            start = self._starts.pop(run_id, None)
+            ms = (time.perf_counter() - start) * 1000.0 if start is not None else 0.0
+            text = response.generations[0][0].text if response.generations and response.generations[0] else ""
+            recorder.record_call("llm", None, text, ms=ms)
+
+    return [_LLMRecorder()]
+
+def _latency_range(text: str):
+    lo, _, hi = str(text or "0").partition("-")
+    return float(lo), float(hi or lo)
+
+def get_fake_llm(responses=None, latency_ms=None, error_rate=None):
+    """
+    Local stand-in for the Gemini client: streams canned responses word by word, no network.
+    Responses come from the argument or from FAKE_LLM_RESPONSES (separated by '||') and repeat.
+    latency_ms ((lo, hi), or FAKE_LLM_LATENCY_MS) delays each call by a uniform random amount
+    and error_rate (or FAKE_LLM_ERROR_RATE) makes that share of calls fail.
+    """
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    if responses is None:
+        raw = os.environ.get("FAKE_LLM_RESPONSES", "OK")
+        responses = [r.strip() for r in raw.split("||") if r.strip()]
+    if latency_ms is None:
+        latency_ms = _latency_range(os.environ.get("FAKE_LLM_LATENCY_MS"))
+    if error_rate is None:
+        error_rate = float(os.environ.get("FAKE_LLM_ERROR_RATE", "0"))
+
+    class _FlakyFakeChatModel(GenericFakeChatModel):
+        def _delay(self):
+            time.sleep(random.uniform(*latency_ms) / 1000.0)
+            if random.random() < error_rate:
+                raise RuntimeError("fake LLM error")
+
+        def _generate(self, *args, **kwargs):
+            self._delay()
+            return super()._generate(*args, **kwargs)
+
+        def _stream(self, *args, **kwargs):
+            self._delay()
+            yield from super()._stream(*args, **kwargs)
+
+        async def _agenerate(self, *args, **kwargs):
+            await asyncio.sleep(random.uniform(*latency_ms) / 1000.0)
+            if random.random() < error_rate:
+                raise RuntimeError("fake LLM error")
+            return super()._generate(*args, **kwargs)
+
+    model = _FlakyFakeChatModel if latency_ms != (0.0, 0.0) or error_rate else GenericFakeChatModel
+    return model(messages=itertools.cycle(list(responses)),
+                 callbacks=_tracing_callbacks("fake") + _recording_callbacks())
 
 def get_llm():
+    replies = recorder.replay_results("llm")
+    if replies:
+        # Replaying a recorded turn: answer with the replies the real model gave then
+        return get_fake_llm(replies)
+    if os.environ.get("LLM_PROVIDER", "").lower() == "fake":
+        return get_fake_llm()
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY not set in environment (.env)")
     model = os.environ.get("GEMINI_MODEL", "gemini-2.5-pro")
-    return ChatGoogleGenerativeAI(model=model, api_key=api_key, temperature=0.2)
+    # The Google GenAI client is slow to import; only pay for it when an LLM is actually needed
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    # streaming=True lets graph streaming surface token chunks as they are generated
+    # Client-side timeout and no client retries: complete() owns deadlines, hedging and retries
+    return ChatGoogleGenerativeAI(model=model, api_key=api_key, temperature=0.2, streaming=True,
+                                  timeout=CALL_TIMEOUT_MS / 1000.0, max_retries=0,
+                                  callbacks=_tracing_callbacks(model) + _recording_callbacks())
+
+# --- Guarded calls ---
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open (fail fast) -> half-open (one probe) -> closed."""
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown_s: float = BREAKER_COOLDOWN_S):
+        self.failures = failures
+        self.cooldown_s = cooldown_s
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = None
+        self._probing = False
+        self._probe_at = 0.0
+
+    def admit(self):
+        """None when the call must fail fast; otherwise "call", or "probe" for the half-open trial call."""
+        with self._lock:
+            if self._opened_at is None:
+                return "call"
+            now = time.monotonic()
+            if now - self._opened_at < self.cooldown_s:
+                return None
+            if self._probing and now - self._probe_at < self.cooldown_s:
+                return None
+            # Half-open: this caller's call decides (a probe that never reported back has expired)
+            self._probing, self._probe_at = True, now
+            return "probe"
+
+    def abandon(self, ticket):
+        """An admitted call ended without an outcome (e.g. cancelled); frees its probe, counts nothing."""
+        if ticket == "probe":
+            with self._lock:
+                self._probing = False
+
+    def success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._probing or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def state(self) -> dict:
+        with self._lock:
+            if self._opened_at is None:
+                name = "closed"
+            elif self._probing or time.monotonic() - self._opened_at >= self.cooldown_s:
+                name = "half-open"
+            else:
+                name = "open"
+            return {"state": name, "consecutive_failures": self._consecutive}
+
+breaker = CircuitBreaker()
+
+_deadline = contextvars.ContextVar("llm_turn_deadline", default=None)
+
+@contextmanager
+def turn_budget(budget_ms: float = None):
+    """Give the LLM calls made inside one turn a shared deadline (nested budgets keep the outer one)."""
+    if _deadline.get() is not None:
+        yield
+        return
+    token = _deadline.set(time.monotonic() + (budget_ms if budget_ms is not None else TURN_BUDGET_MS) / 1000.0)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def _call_timeout(timeout_ms: float = None) -> float:
+    """Seconds this call may take: its own timeout capped by what is left of the turn budget."""
+    seconds = (timeout_ms if timeout_ms is not None else CALL_TIMEOUT_MS) / 1000.0
+    deadline = _deadline.get()
+    if deadline is not None:
+        seconds = min(seconds, deadline - time.monotonic())
+    return seconds
+
+def _text(reply) -> str:
+    return reply.content if isinstance(reply.content, str) else str(reply.content)
+
+_pool = None
+_pool_guard = threading.Lock()
+
+def _get_pool():
+    # Attempts that time out cannot be interrupted; they finish here without holding up the turn
+    global _pool
+    if _pool is None:
+        with _pool_guard:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=int(os.environ.get("LLM_THREADS", "8")),
+                                           thread_name_prefix="llm")
+    return _pool
+
+def _admit(timeout_ms: float = None) -> tuple:
+    """(seconds this call may take, breaker ticket), or LLMUnavailable without calling the model."""
+    seconds = _call_timeout(timeout_ms)
+    if seconds <= 0:
+        raise LLMUnavailable("turn latency budget spent")
+    ticket = breaker.admit()
+    if ticket is None:
+        raise LLMUnavailable("LLM circuit breaker is open")
+    return seconds, ticket
+
+def _client(llm):
+    try:
+        return llm or get_llm()
+    except Exception as e:
+        # e.g. GEMINI_API_KEY missing: callers fall back to their rule-based path
+        raise LLMUnavailable(f"LLM client unavailable: {e}") from e
+
+def _config() -> dict:
+    return {"tags": [NOSTREAM_TAG]}
+
+def _unavailable(seconds: float, last_error) -> LLMUnavailable:
+    return LLMUnavailable(f"no LLM reply within {seconds * 1000:.0f} ms"
+                          + (f" ({type(last_error).__name__}: {last_error})" if last_error else ""))
+
+def complete(messages, llm=None, timeout_ms: float = None) -> str:
+    """Guarded model call (deadline, hedged retry, breaker); returns the reply text or raises LLMUnavailable."""
+    seconds, ticket = _admit(timeout_ms)
+    reported = False
+    try:
+        try:
+            llm = _client(llm)
+        except LLMUnavailable:
+            breaker.failure()
+            reported = True
+            raise
+        end = time.monotonic() + seconds
+        with tracing.span("llm.guarded") as sp:
+            pending, attempts, last_error = set(), 0, None
+            while True:
+                now = time.monotonic()
+                if not pending and attempts < MAX_ATTEMPTS and now < end:
+                    # First attempt, or a retry after every running attempt failed
+                    pending.add(_get_pool().submit(contextvars.copy_context().run, llm.invoke, messages, _config()))
+                    attempts += 1
+                if not pending or now >= end:
+                    break
+                hedge_at = now + HEDGE_MS / 1000.0 if attempts < MAX_ATTEMPTS else end
+                done, pending = wait(pending, timeout=max(0.0, min(end, hedge_at) - now), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        breaker.success()
+                        reported = True
+                        sp.set(attempts=attempts, outcome="ok")
+                        return _text(future.result())
+                    last_error = future.exception()
+                if not done and attempts < MAX_ATTEMPTS and time.monotonic() < end:
+                    # Slow first attempt: hedge with a second one, keep both
+                    pending.add(_get_pool().submit(contextvars.copy_context().run, llm.invoke, messages, _config()))
+                    attempts += 1
+            breaker.failure()
+            reported = True
+            sp.set(attempts=attempts, outcome="error" if last_error and not pending else "timeout")
+        raise _unavailable(seconds, last_error)
+    finally:
+        if not reported:
+            # Interrupted before an outcome: never leave the half-open probe taken
+            breaker.abandon(ticket)
+
+async def acomplete(messages, llm=None, timeout_ms: float = None) -> str:
+    """Async complete(): same guards; attempts still running at the deadline are cancelled."""
+    seconds, ticket = _admit(timeout_ms)
+    reported = False
+    pending = set()
+    try:
+        try:
+            llm = _client(llm)
+        except LLMUnavailable:
+            breaker.failure()
+            reported = True
+            raise
+        loop = asyncio.get_running_loop()
+        end = loop.time() + seconds
+        attempts, last_error = 0, None
+        with tracing.span("llm.guarded") as sp:
+            while True:
+                now = loop.time()
+                if not pending and attempts < MAX_ATTEMPTS and now < end:
+                    pending.add(asyncio.ensure_future(llm.ainvoke(messages, _config())))
+                    attempts += 1
+                if not pending or now >= end:
+                    break
+                hedge_at = now + HEDGE_MS / 1000.0 if attempts < MAX_ATTEMPTS else end
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, min(end, hedge_at) - now),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        breaker.success()
+                        reported = True
+                        sp.set(attempts=attempts, outcome="ok")
+                        return _text(task.result())
+                    last_error = task.exception()
+                if not done and attempts < MAX_ATTEMPTS and loop.time() < end:
+                    pending.add(asyncio.ensure_future(llm.ainvoke(messages, _config())))
+                    attempts += 1
+            breaker.failure()
+            reported = True
+            sp.set(attempts=attempts, outcome="error" if last_error and not pending else "timeout")
+        raise _unavailable(seconds, last_error)
+    finally:
+        for task in pending:
+            task.cancel()
+        if not reported:
+            # Cancelled (client gone, stream torn down) before an outcome: free the half-open probe
+            breaker.abandon(ticket)
@@ -3,11 +3,13 @@
 import os
 import re
 from dotenv import load_dotenv
-from twilio.rest import Client
+from tools.recorder import recorded
+from tools.tracing import span
+from tools.utils import sanitize_phone_in
 
 load_dotenv()  # Load .env variables
 
-def _get_twilio_client():
+def _get_twilio_settings():
     sid = os.getenv("TWILIO_ACCOUNT_SID")
     token = os.getenv("TWILIO_AUTH_TOKEN")
     from_number = os.getenv("TWILIO_FROM_NUMBER")
@@ -25,39 +27,48 @@ def _get_twilio_client():
             + "\nPlease set them in your .env file at project root."
         )
 
+    return sid, token, from_number
+
+def _get_twilio_client():
+    # Twilio's SDK is large; load it on the first send rather than at import
+    from twilio.rest import Client
+    sid, token, from_number = _get_twilio_settings()
     return Client(sid, token), from_number
 
-def _normalize_phone(raw: str, default_country_code: str = None) -> str:
-    """
-    Normalize phone numbers to E.164 format.
-    Uses DEFAULT_COUNTRY_CODE from .env if provided (fallback +91).
-    """
-    if not raw:
-        return None
-    default_country_code = default_country_code or os.getenv("DEFAULT_COUNTRY_CODE", "+91")
-    s = re.sub(r"[\s\-()]+", "", str(raw))
-    if s.startswith('+'):
-        return s
-    digits = re.sub(r"\D", "", s)
-    cc = default_country_code.lstrip('+')
-    if digits.startswith(cc) and len(digits) > len(cc):
-        return f"+{digits}"
-    if len(digits) == 10:
-        return f"+{cc}{digits}"
-    if len(digits) == 11 and digits.startswith('0'):
-        return f"+{cc}{digits[1:]}"
-    if 8 <= len(digits) <= 15:
-        return f"+{digits}"
-    return None
+def _checked_destination(to_number: str) -> str:
+    normalized_to = sanitize_phone_in(to_number)
+    if not normalized_to or not re.fullmatch(r"\+\d{8,15}", normalized_to):
+        raise RuntimeError(f"Invalid destination phone number: {to_number}")
+    return normalized_to
 
+@recorded("sms")
 def send_sms(to_number: str, body: str) -> str:
     client, from_number = _get_twilio_client()
-    normalized_to = _normalize_phone(to_number)
-    if not normalized_to or not re.fullmatch(r"\+\d{8,15}", normalized_to):
-        raise RuntimeError(f"Invalid destination phone number: {to_number}")
-    msg = client.messages.create(
-        body=body,
-        from_=from_number,
-        to=normalized_to
-    )
+    normalized_to = _checked_destination(to_number)
+    with span("notify.sms"):
+        msg = client.messages.create(
+            body=body,
+            from_=from_number,
+            to=normalized_to
+        )
+    return msg.sid
+
+@recorded("sms")
+async def asend_sms(to_number: str, body: str) -> str:
+    """Non-blocking send_sms using Twilio's aiohttp-based client."""
+    from twilio.rest import Client
+    from twilio.http.async_http_client import AsyncTwilioHttpClient
+    sid, token, from_number = _get_twilio_settings()
+    normalized_to = _checked_destination(to_number)
+    http_client = AsyncTwilioHttpClient()
+    client = Client(sid, token, http_client=http_client)
+    try:
+        with span("notify.sms", mode="async"):
+            msg = await client.messages.create_async(
+                body=body,
+                from_=from_number,
+                to=normalized_to
+            )
+    finally:
+        await http_client.close()
     return msg.sid
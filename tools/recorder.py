@@ -0,0 +1,314 @@
+# ai-scheduling-agent/tools/recorder.py
+"""
+Opt-in turn recorder, and the stubs replay_traces.py uses to re-run recorded turns.
+
+Set TURN_RECORD_DIR to record every run_turn / arun_turn / stream_turn. Each turn becomes one
+JSON line in TURN_RECORD_DIR/turns-<date>-<pid>.jsonl.gz (one gzip member per turn, appended in
+the background, so a crash loses at most the turn being written):
+    {"v": 1, "at", "clinic", "user_text", "state" (input state), "state_digest", "result_digest",
+     "total_ms", "nodes": {node: ms}, "tool_ms": {node: ms inside recorded calls},
+     "calls": [{"name", "args", "result" or "error", "ms"}]}
+
+Functions decorated with @recorded (data_io queries and writes, reservations, SMS/email,
+reminder scheduling, LLM replies) add a call entry with their arguments, return value and
+duration. Only the outermost recorded call is kept, so a reserve that runs queries inside
+is one entry. During replay the same decorators return the recorded values instead of
+running (read-only calls can be run live with replaying(live_reads=True)), which keeps a
+replay free of writes and notifications.
+
+Traces hold patient data; keep TURN_RECORD_DIR private.
+"""
+
+import asyncio
+import contextvars
+import functools
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import date, datetime
+
+RECORD_DIR = os.environ.get("TURN_RECORD_DIR") or None
+FORMAT_VERSION = 1
+
+_turn = contextvars.ContextVar("recorded_turn", default=None)
+_nested = contextvars.ContextVar("recorded_call_nested", default=False)
+_node_name = contextvars.ContextVar("recorded_node", default=None)
+_write_lock = threading.Lock()
+
+class ReplayError(RuntimeError):
+    """The replayed code made a call the trace has no (more) recorded results for."""
+
+# --- JSON encoding of states and tool values ---
+
+def encode(value):
+    """JSON-safe form that decode() turns back into the same Python values (dates, tuples, messages)."""
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, (int, float)):
+        return None if value != value else value  # NaN -> None
+    if isinstance(value, datetime):  # pandas.Timestamp included
+        return None if value != value else {"$dt": value.isoformat()}  # NaT -> None
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, dict):
+        return {str(k): encode(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return {"$tuple": [encode(v) for v in value]}
+    if isinstance(value, (list, set, frozenset)):
+        return [encode(v) for v in value]
+    if hasattr(value, "type") and hasattr(value, "content"):  # langchain message
+        return {"$msg": value.type, "content": encode(value.content)}
+    if hasattr(value, "item"):  # numpy scalar
+        return encode(value.item())
+    if type(value).__name__ in ("NAType", "NaTType"):
+        return None
+    return {"$repr": repr(value)}
+
+def decode(value):
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    if "$date" in value:
+        return date.fromisoformat(value["$date"])
+    if "$tuple" in value:
+        return tuple(decode(v) for v in value["$tuple"])
+    if "$msg" in value:
+        from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+        kind = {"human": HumanMessage, "system": SystemMessage}.get(value["$msg"], AIMessage)
+        return kind(content=decode(value["content"]))
+    if "$repr" in value:
+        return value["$repr"]
+    return {k: decode(v) for k, v in value.items()}
+
+def digest(value) -> str:
+    """Short content hash of a state (or any value), stable across processes."""
+    text = json.dumps(encode(value), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+# --- Turns ---
+
+class Turn:
+    """Calls and node timings collected for one turn (recording), or the recorded ones to serve (replay)."""
+
+    def __init__(self, record: dict = None, live_reads: bool = False):
+        self.replaying = record is not None
+        self.live_reads = live_reads
+        self.calls = []
+        self.nodes = defaultdict(float)
+        # Time spent inside recorded (or live-replayed) calls per node; node minus this is the node's own work
+        self.tool_ms = defaultdict(float)
+        self._queues = defaultdict(deque)
+        for call in (record or {}).get("calls", []):
+            self._queues[call["name"]].append(call)
+
+    def add(self, name: str, args, result=None, error: BaseException = None, ms: float = 0.0):
+        entry = {"name": name, "args": encode(args), "ms": round(ms, 3)}
+        if error is not None:
+            entry["error"] = f"{type(error).__name__}: {error}"
+        else:
+            entry["result"] = encode(result)
+        self.calls.append(entry)  # list.append is atomic; SMS and email may record from two threads
+
+    def take(self, name: str) -> dict:
+        queue = self._queues.get(name)
+        if not queue:
+            raise ReplayError(f"no recorded result left for {name}")
+        return queue.popleft()
+
+    def serve(self, name: str):
+        call = self.take(name)
+        if "error" in call:
+            raise ReplayError(f"recorded failure of {name}: {call['error']}")
+        return decode(call["result"])
+
+    def remaining(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def finish(self, result_state):
+        self.result_digest = digest(_state_view(result_state))
+
+def current():
+    return _turn.get()
+
+def _state_view(state) -> dict:
+    # Reminder bookkeeping and the attached patient copy are derived; leave them out of digests
+    view = dict(state or {})
+    appt = view.get("appointment")
+    if isinstance(appt, dict):
+        view["appointment"] = {k: v for k, v in appt.items() if k not in ("patient", "reminder_scheduled")}
+    return view
+
+class _NoTurn:
+    def finish(self, result_state):
+        pass
+
+_NO_TURN = _NoTurn()
+
+@contextmanager
+def turn(user_text: str, state: dict):
+    """
+    Wrap one run_turn. Records it when TURN_RECORD_DIR is set; inside replaying() the replay's
+    Turn is used as is. Call .finish(result_state) on the yielded object before leaving.
+    """
+    active = _turn.get()
+    if active is not None or not RECORD_DIR:
+        yield active or _NO_TURN
+        return
+    from tools import tenancy
+    record = {"v": FORMAT_VERSION, "at": datetime.now().isoformat(timespec="milliseconds"),
+              "clinic": tenancy.current_tenant(), "user_text": user_text,
+              "state": encode(state), "state_digest": digest(_state_view(state))}
+    rec = Turn()
+    token = _turn.set(rec)
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    except Exception as e:
+        # Failed turns are kept too: they are often the slow ones
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _turn.reset(token)
+        record.update(total_ms=round((time.perf_counter() - t0) * 1000.0, 3),
+                      result_digest=getattr(rec, "result_digest", None),
+                      nodes={k: round(v, 3) for k, v in rec.nodes.items()},
+                      tool_ms={k: round(v, 3) for k, v in rec.tool_ms.items()}, calls=rec.calls)
+        from tools.aio import submit_blocking
+        submit_blocking(_append, record)
+
+def _append(record: dict):
+    os.makedirs(RECORD_DIR, exist_ok=True)
+    path = os.path.join(RECORD_DIR, f"turns-{date.today():%Y%m%d}-{os.getpid()}.jsonl.gz")
+    line = json.dumps(record, separators=(",", ":"), default=str) + "\n"
+    with _write_lock:
+        with gzip.open(path, "at", encoding="utf-8") as fh:
+            fh.write(line)
+
+@contextmanager
+def replaying(record: dict, live_reads: bool = False):
+    """Serve recorded call results to the code run inside; yields the Turn (node timings, unused calls)."""
+    rec = Turn(record, live_reads=live_reads)
+    token = _turn.set(rec)
+    try:
+        yield rec
+    finally:
+        _turn.reset(token)
+
+@contextmanager
+def node(name: str):
+    """Time a graph node into the current turn; no-op when nothing is recorded or replayed."""
+    rec = _turn.get()
+    if rec is None:
+        yield
+        return
+    token = _node_name.set(name)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        rec.nodes[name] += (time.perf_counter() - t0) * 1000.0
+        _node_name.reset(token)
+
+def record_call(name: str, args, result, ms: float = 0.0):
+    """Add a call measured elsewhere (e.g. from an LLM callback) to the current recording."""
+    rec = _turn.get()
+    if rec is not None and not rec.replaying:
+        rec.add(name, args, result, ms=ms)
+
+def replay_results(name: str) -> list:
+    """Every remaining recorded result for `name` in the turn being replayed (e.g. LLM replies)."""
+    rec = _turn.get()
+    if rec is None or not rec.replaying:
+        return []
+    out = []
+    while rec._queues.get(name):
+        out.append(rec.serve(name))
+    return out
+
+def _done(rec: Turn, label: str, args, kwargs, t0: float, result=None, error: BaseException = None):
+    ms = (time.perf_counter() - t0) * 1000.0
+    rec.tool_ms[_node_name.get() or "-"] += ms
+    if not rec.replaying:
+        rec.add(label, [args, kwargs], result, error, ms)
+
+def recorded(name: str = None, readonly: bool = False):
+    """
+    Record the decorated function's calls (outermost only) in the current turn and stub them
+    during replay. `readonly` calls may run live in replay (replaying(live_reads=True)).
+    """
+    def wrap(func):
+        label = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        def _replay(rec):
+            if readonly and rec.live_reads:
+                rec.take(label)
+                return False, None
+            return True, rec.serve(label)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def ainner(*args, **kwargs):
+                rec = _turn.get()
+                if rec is None or _nested.get():
+                    return await func(*args, **kwargs)
+                if rec.replaying:
+                    served, value = _replay(rec)
+                    if served:
+                        return value
+                token = _nested.set(True)
+                t0 = time.perf_counter()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    _done(rec, label, args, kwargs, t0, error=e)
+                    raise
+                finally:
+                    _nested.reset(token)
+                _done(rec, label, args, kwargs, t0, result)
+                return result
+            return ainner
+
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            rec = _turn.get()
+            if rec is None or _nested.get():
+                return func(*args, **kwargs)
+            if rec.replaying:
+                served, value = _replay(rec)
+                if served:
+                    return value
+            token = _nested.set(True)
+            t0 = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                _done(rec, label, args, kwargs, t0, error=e)
+                raise
+            finally:
+                _nested.reset(token)
+            _done(rec, label, args, kwargs, t0, result)
+            return result
+        return inner
+    return wrap
+
+def iter_traces(paths: list):
+    """Yield recorded turns from .jsonl.gz files (or directories of them), in file order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".jsonl.gz")))
+        else:
+            files.append(path)
+    for path in files:
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
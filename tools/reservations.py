@@ -0,0 +1,101 @@
+# ai-scheduling-agent/tools/reservations.py
+"""
+Group-commit reservation writer.
+
+Every reservation used to take the data lock, re-read the schedule, rewrite doctors.xlsx and
+release the lock, so a burst of confirmations (9 a.m.) was capped at one file rewrite per
+booking. Here each clinic has one writer thread with a queue: callers enqueue a request and
+wait on a Future; the writer takes the first request, collects whatever else arrives within
+RESERVATION_BATCH_MS (or up to RESERVATION_MAX_BATCH requests), applies the whole batch
+against one in-memory schedule snapshot (data_io.reserve_slots) and persists it with one
+write. Each caller then gets its own (ok, reserved row) result, so throughput grows with
+the batch size instead of the number of rewrites.
+
+Worker processes each run their own writer; the data lock still serializes their batches.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from tools import data_io, tenancy
+from tools.recorder import recorded
+from tools.tracing import span
+
+BATCH_WINDOW_MS = float(os.environ.get("RESERVATION_BATCH_MS", "5"))
+MAX_BATCH = int(os.environ.get("RESERVATION_MAX_BATCH", "256"))
+
+class _Writer:
+    """The single writer for one clinic's schedule."""
+
+    def __init__(self, tenant: str):
+        self.tenant = tenant
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name=f"reservations-{tenant}", daemon=True)
+        self.thread.start()
+
+    def submit(self, request: tuple) -> Future:
+        future = Future()
+        self.queue.put((request, future))
+        return future
+
+    def _collect(self) -> list:
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + BATCH_WINDOW_MS / 1000.0
+        while len(batch) < MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            live = [(request, future) for request, future in batch if future.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            try:
+                with tenancy.use_tenant(self.tenant), span("reservations.batch", size=len(live)):
+                    results = data_io.reserve_slots([request for request, _ in live])
+            except Exception as e:
+                for _, future in live:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(live, results):
+                future.set_result(result)
+
+_writers = {}
+_writers_guard = threading.Lock()
+
+def _writer() -> _Writer:
+    tenant = tenancy.current_tenant()
+    writer = _writers.get(tenant)
+    if writer is None:
+        with _writers_guard:
+            writer = _writers.get(tenant)
+            if writer is None:
+                writer = _writers[tenant] = _Writer(tenant)
+    return writer
+
+def submit(doctor_name: str, date_time, patient_id: int, duration_min: int = 30) -> Future:
+    """Queue a reservation for the current clinic; the Future resolves to (ok, reserved row or None)."""
+    return _writer().submit((doctor_name, date_time, patient_id, duration_min))
+
+@recorded("reservations.reserve")
+def reserve(doctor_name: str, date_time, patient_id: int, duration_min: int = 30, timeout: float = None):
+    """Same contract as data_io.reserve_slot, committed together with concurrent reservations."""
+    if data_io._holds_lock():
+        # The writer would wait for the lock this thread holds (e.g. waitlist backfill); apply inline
+        return data_io.reserve_slot(doctor_name, date_time, patient_id, duration_min)
+    return submit(doctor_name, date_time, patient_id, duration_min).result(timeout)
+
+@recorded("reservations.reserve")
+async def areserve(doctor_name: str, date_time, patient_id: int, duration_min: int = 30):
+    return await asyncio.wrap_future(submit(doctor_name, date_time, patient_id, duration_min))
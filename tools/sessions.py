@@ -0,0 +1,212 @@
+# ai-scheduling-agent/tools/sessions.py
+"""
+On-disk conversation state, so any API worker process can serve any session.
+
+Turns of one session are serialized by an in-process lock plus an flock on the session's
+.lock file. In-process locks exist only while a turn holds or waits for them. Sessions idle
+for longer than SESSION_TTL_HOURS are treated as gone and, together with their lock files,
+deleted by cleanup_sessions(), which runs in the background at most every
+SESSION_CLEANUP_INTERVAL_S seconds per worker (or from cron):
+    python -m tools.sessions cleanup
+"""
+
+import argparse
+import asyncio
+import os
+import pickle
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager, asynccontextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+from tools.aio import run_blocking, submit_blocking
+from tools.data_io import DATA_DIR
+
+SESSIONS_DIR = os.path.join(DATA_DIR, "sessions")
+SESSION_TTL_S = float(os.environ.get("SESSION_TTL_HOURS", "72")) * 3600.0
+CLEANUP_INTERVAL_S = float(os.environ.get("SESSION_CLEANUP_INTERVAL_S", "600"))
+# Lock files without a session (e.g. a turn on an unknown id) are left alone this long
+_ORPHAN_GRACE_S = 60.0
+
+# session id -> [lock, number of holders and waiters]; dropped when the count returns to 0
+_local_locks = {}
+_async_locks = {}
+_locks_guard = threading.Lock()
+_last_cleanup = 0.0
+
+def is_valid_session_id(session_id: str) -> bool:
+    # Session ids are generated by new_session_id(); reject anything that could escape the directory
+    return bool(session_id) and all(c.isalnum() for c in session_id)
+
+def _session_path(session_id: str) -> str:
+    if not is_valid_session_id(session_id):
+        raise KeyError(session_id)
+    return os.path.join(SESSIONS_DIR, f"{session_id}.pkl")
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+def _ref(table: dict, session_id: str, factory):
+    with _locks_guard:
+        entry = table.get(session_id)
+        if entry is None:
+            entry = table[session_id] = [factory(), 0]
+        entry[1] += 1
+        return entry[0]
+
+def _unref(table: dict, session_id: str):
+    with _locks_guard:
+        entry = table[session_id]
+        entry[1] -= 1
+        if not entry[1]:
+            del table[session_id]
+
+def _open_locked(path: str):
+    """Open and flock the session's lock file; returns the handle (None without fcntl)."""
+    if fcntl is None:
+        return None
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    while True:
+        fh = open(path + ".lock", "a")
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            # cleanup_sessions may have unlinked the file while we waited; lock the current one
+            if os.fstat(fh.fileno()).st_ino == os.stat(path + ".lock").st_ino:
+                return fh
+        except FileNotFoundError:
+            pass
+        fh.close()
+
+def _close_locked(fh):
+    if fh is not None:
+        fcntl.flock(fh, fcntl.LOCK_UN)
+        fh.close()
+
+@contextmanager
+def session_lock(session_id: str):
+    """Serialize turns of one session across threads and worker processes."""
+    path = _session_path(session_id)
+    lock = _ref(_local_locks, session_id, threading.Lock)
+    try:
+        with lock:
+            fh = _open_locked(path)
+            try:
+                yield
+            finally:
+                _close_locked(fh)
+    finally:
+        _unref(_local_locks, session_id)
+
+def _expired(mtime: float, now: float = None) -> bool:
+    return SESSION_TTL_S > 0 and (now or time.time()) - mtime > SESSION_TTL_S
+
+def load_session(session_id: str):
+    """Return the stored agent state, or None if the session does not exist or has expired."""
+    try:
+        path = _session_path(session_id)
+        if _expired(os.path.getmtime(path)):
+            return None
+        with open(path, "rb") as fh:
+            return pickle.load(fh)
+    except (KeyError, FileNotFoundError):
+        return None
+
+def save_session(session_id: str, state: dict):
+    path = _session_path(session_id)
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    # Write then rename so a concurrent reader never sees a half-written file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        pickle.dump(state, fh)
+    os.replace(tmp, path)
+    _maybe_cleanup()
+
+def _maybe_cleanup():
+    global _last_cleanup
+    now = time.monotonic()
+    with _locks_guard:
+        if now - _last_cleanup < CLEANUP_INTERVAL_S:
+            return
+        _last_cleanup = now
+    submit_blocking(cleanup_sessions)
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def cleanup_sessions(now: float = None) -> int:
+    """Delete sessions idle past SESSION_TTL_HOURS, their lock files and leftovers; returns sessions removed."""
+    if SESSION_TTL_S <= 0 or not os.path.isdir(SESSIONS_DIR):
+        return 0
+    now = now or time.time()
+    removed = 0
+    entries = []
+    with os.scandir(SESSIONS_DIR) as it:
+        for e in it:
+            try:
+                entries.append((e.name, e.path, e.stat().st_mtime))
+            except FileNotFoundError:
+                pass  # removed meanwhile
+    sessions = {name[:-4] for name, _, _ in entries if name.endswith(".pkl")}
+    for name, path, mtime in entries:
+        if name.endswith(".pkl") and _expired(mtime, now):
+            session_id = name[:-4]
+            # Take the session lock so a turn in progress is never cut short
+            with session_lock(session_id):
+                if _expired(os.path.getmtime(path), now):
+                    _remove(path)
+                    _remove(path[:-4] + ".pkl.lock")
+                    removed += 1
+        elif name.endswith(".pkl.lock") and name[:-9] not in sessions and now - mtime > _ORPHAN_GRACE_S:
+            if fcntl is None:
+                _remove(path)
+                continue
+            with open(path, "a") as fh:
+                try:
+                    fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # in use
+                _remove(path)
+        elif name.endswith(".tmp") and _expired(mtime, now):
+            _remove(path)
+    return removed
+
+@asynccontextmanager
+async def asession_lock(session_id: str):
+    """Async session_lock: waits on an asyncio lock in-process, and on the file lock off-loop."""
+    path = _session_path(session_id)
+    lock = _ref(_async_locks, session_id, asyncio.Lock)
+    try:
+        async with lock:
+            fh = await run_blocking(_open_locked, path)
+            try:
+                yield
+            finally:
+                _close_locked(fh)
+    finally:
+        _unref(_async_locks, session_id)
+
+async def aload_session(session_id: str):
+    return await run_blocking(load_session, session_id)
+
+async def asave_session(session_id: str, state: dict):
+    return await run_blocking(save_session, session_id, state)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Session store maintenance")
+    parser.add_argument("command", choices=["cleanup"])
+    args = parser.parse_args(argv)
+    if args.command == "cleanup":
+        print(f"{cleanup_sessions()} expired sessions removed from {SESSIONS_DIR}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# ai-scheduling-agent/tools/synthetic.py
+"""Synthetic clinic data (slot grid or availability rules, patients, appointments) for load tests and benchmarks."""
+
+import json
+import os
+import random
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+FIRST_NAMES = [
+    "Alice", "Brian", "Carla", "David", "Elena", "Farid", "Grace", "Hiro", "Irene", "Jamal",
+    "Kavya", "Liam", "Maya", "Nikhil", "Olivia", "Pablo", "Quinn", "Rhea", "Samir", "Tara",
+]
+LAST_NAMES = [
+    "Wong", "Patel", "Garcia", "Smith", "Khan", "Nguyen", "Brown", "Iyer", "Lopez", "Kim",
+    "Singh", "Martin", "Rossi", "Sato", "Clark", "Mehta", "Silva", "Young", "Das", "Fischer",
+]
+SPECIALTIES = ["Allergy", "Immunology", "Pulmonology", "Dermatology", "ENT"]
+INSURERS = ["United", "Cigna", "BlueCross", "Aetna"]
+
+PATIENT_COLUMNS = [
+    "patient_id", "first_name", "middle_initial", "last_name", "dob", "gender", "cell_phone", "email",
+    "street", "city", "state", "zip_code", "emergency_contact", "emergency_relation", "emergency_phone",
+    "primary_insurance", "primary_member_id", "primary_group", "secondary_insurance",
+    "secondary_member_id", "secondary_group",
+]
+
+def _alpha(i: int) -> str:
+    # 0 -> 'a', 25 -> 'z', 26 -> 'aa' ...; letters only so names still parse
+    out = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        out = chr(97 + r) + out
+    return out
+
+def doctor_names(n: int) -> list:
+    """n distinct names matching the 'Dr. First Last' form the schedule agent parses."""
+    base = [(f, l) for l in LAST_NAMES for f in FIRST_NAMES]
+    names = []
+    for i in range(n):
+        first, last = base[i % len(base)]
+        # Beyond 400 doctors, make last names unique with a letter suffix
+        suffix = _alpha(i // len(base) - 1) if i >= len(base) else ""
+        names.append(f"Dr. {first} {last}{suffix}")
+    return names
+
+def make_schedule(n_doctors: int, n_days: int, start_day: date = None,
+                  day_start: str = "09:00", slots_per_day: int = 16, slot_min: int = 30,
+                  booked_fraction: float = 0.0, seed: int = 0) -> pd.DataFrame:
+    """Doctors grid in the doctors.xlsx layout: one row per doctor per slot."""
+    rng = random.Random(seed)
+    start_day = start_day or (date.today() + timedelta(days=1))
+    h, m = (int(x) for x in day_start.split(":"))
+    offsets = [timedelta(hours=h, minutes=m + i * slot_min) for i in range(slots_per_day)]
+    days = [datetime.combine(start_day + timedelta(days=d), datetime.min.time()) for d in range(n_days)]
+    names = doctor_names(n_doctors)
+    specialty = {name: SPECIALTIES[i % len(SPECIALTIES)] for i, name in enumerate(names)}
+
+    slots = pd.DatetimeIndex([d + off for d in days for off in offsets])
+    df = pd.DataFrame({
+        "doctor_name": pd.Series(names).repeat(len(slots)).values,
+        "date_slot": np.tile(slots.values, n_doctors),
+    })
+    df.insert(1, "specialty", df["doctor_name"].map(specialty))
+    df["is_available"] = True
+    df["patient_id"] = pd.NA
+    if booked_fraction > 0:
+        k = int(len(df) * booked_fraction)
+        booked = rng.sample(range(len(df)), k)
+        df.loc[booked, "is_available"] = False
+        df.loc[booked, "patient_id"] = [rng.randint(1, 1000) for _ in range(k)]
+    return df
+
+def _phones(rng, n: int) -> pd.Series:
+    area, mid, last = rng.integers(200, 1000, n), rng.integers(200, 1000, n), rng.integers(1000, 10000, n)
+    return "(" + pd.Series(area).astype(str) + ") " + pd.Series(mid).astype(str) + "-" + pd.Series(last).astype(str)
+
+def make_patients(n: int, seed: int = 0) -> pd.DataFrame:
+    """Patients in the patients.csv layout with unique (first, last, dob) keys (vectorized, fine for 1M rows)."""
+    rng = np.random.default_rng(seed)
+    i = pd.Series(np.arange(1, n + 1))
+    first = pd.Series(np.array(FIRST_NAMES, dtype=object)[(i % len(FIRST_NAMES)).to_numpy()])
+    base_last = pd.Series(np.array(LAST_NAMES, dtype=object)[((i // len(FIRST_NAMES)) % len(LAST_NAMES)).to_numpy()])
+    dob = pd.Timestamp(1950, 1, 1) + pd.to_timedelta(i % 20000, unit="D")
+    return pd.DataFrame({
+        "patient_id": i,
+        "first_name": first,
+        "middle_initial": np.array([chr(65 + k) for k in range(26)], dtype=object)[(i % 26).to_numpy()],
+        "last_name": base_last + i.astype(str) if n > 400 else base_last,
+        "dob": dob.dt.strftime("%Y-%m-%d"),
+        "gender": np.array(["Male", "Female", "Other"], dtype=object)[rng.integers(0, 3, n)],
+        "cell_phone": _phones(rng, n),
+        "email": first.str.lower() + "." + base_last.str.lower() + i.astype(str) + "@example.com",
+        "street": pd.Series(rng.integers(100, 10000, n)).astype(str) + " Main St",
+        "city": "Springfield",
+        "state": "IL",
+        "zip_code": pd.Series(rng.integers(10000, 100000, n)).astype(str),
+        "emergency_contact": "Jordan Doe",
+        "emergency_relation": "Parent",
+        "emergency_phone": _phones(rng, n),
+        "primary_insurance": np.array(INSURERS, dtype=object)[rng.integers(0, len(INSURERS), n)],
+        "primary_member_id": "M" + pd.Series(rng.integers(1000000, 10000000, n)).astype(str),
+        "primary_group": rng.integers(1000, 10000, n),
+        "secondary_insurance": None,
+        "secondary_member_id": None,
+        "secondary_group": None,
+    }, columns=PATIENT_COLUMNS)
+
+def make_availability(n_doctors: int, start_day: date = None, weekdays=("mon", "tue", "wed", "thu", "fri"),
+                      hours=("09:00-12:00", "13:00-18:00")) -> dict:
+    """availability.json rules giving every doctor the same weekly template (see tools/availability.py)."""
+    start_day = start_day or (date.today() + timedelta(days=1))
+    names = doctor_names(n_doctors)
+    return {
+        "doctors": [{"doctor_name": name, "specialty": SPECIALTIES[i % len(SPECIALTIES)],
+                     "weekly": {day: list(hours) for day in weekdays},
+                     "valid_from": start_day.isoformat(), "valid_until": None}
+                    for i, name in enumerate(names)],
+        "exceptions": [],
+    }
+
+def rule_slots(spec: dict, n_days: int, start_day: date) -> pd.DataFrame:
+    """All slots the rules open in the first n_days, as (doctor_name, specialty, date_slot) rows."""
+    from tools.availability import DoctorRule
+    rows = []
+    end_day = start_day + timedelta(days=n_days - 1)
+    for d in spec["doctors"]:
+        rule = DoctorRule(d)
+        times = list(rule.expand(start_day, end_day))
+        rows.append(pd.DataFrame({"doctor_name": rule.name, "specialty": rule.specialty, "date_slot": times}))
+    return pd.concat(rows, ignore_index=True)
+
+def make_appointments(slots: pd.DataFrame, patients: pd.DataFrame, n: int, seed: int = 0):
+    """
+    Book n random 30-minute slots for random patients.
+    Returns (booked schedule rows, appointments.csv frame); `slots` is left untouched.
+    """
+    rng = np.random.default_rng(seed)
+    n = min(n, len(slots))
+    picked = slots.iloc[np.sort(rng.choice(len(slots), size=n, replace=False))].reset_index(drop=True)
+    who = patients.iloc[rng.integers(0, len(patients), n)].reset_index(drop=True)
+    booked = picked[["doctor_name", "specialty", "date_slot"]].copy()
+    booked["is_available"] = False
+    booked["patient_id"] = who["patient_id"].to_numpy()
+    appts = pd.DataFrame({
+        "patient_id": who["patient_id"].to_numpy(),
+        "first_name": who["first_name"].to_numpy(),
+        "last_name": who["last_name"].to_numpy(),
+        "doctor_name": picked["doctor_name"].to_numpy(),
+        "date_slot": picked["date_slot"].to_numpy(),
+        "duration_min": 30,
+        "status": "confirmed",
+    })
+    return booked, appts
+
+def write_dataset(data_dir: str, doctors: pd.DataFrame, patients: pd.DataFrame,
+                  appointments: pd.DataFrame = None, availability: dict = None):
+    """
+    Write a complete data directory: patients.csv, doctors.xlsx, appointments.csv (empty unless
+    given) and, for rule-based schedules, availability.json.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    patients.to_csv(os.path.join(data_dir, "patients.csv"), index=False)
+    doctors.to_excel(os.path.join(data_dir, "doctors.xlsx"), index=False)
+    if appointments is None:
+        appointments = pd.DataFrame(columns=["patient_id", "first_name", "last_name", "doctor_name",
+                                             "date_slot", "duration_min", "status"])
+    appointments.to_csv(os.path.join(data_dir, "appointments.csv"), index=False)
+    if availability is not None:
+        with open(os.path.join(data_dir, "availability.json"), "w", encoding="utf-8") as fh:
+            json.dump(availability, fh, indent=1)
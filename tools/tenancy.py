@@ -0,0 +1,66 @@
+# ai-scheduling-agent/tools/tenancy.py
+"""
+Clinic tenancy: which clinic's data files the current request or session works on.
+
+The default tenant keeps the original layout (CLINIC_DATA_DIR, or the repository's data/).
+Every other clinic has the same set of files under CLINIC_TENANTS_DIR/<clinic>/ (default
+data/tenants/<clinic>/). The current clinic is a context variable, so it follows a request
+through asyncio tasks and tools.aio's thread pool; data_io derives paths, locks and cache
+keys from it, which lets one process serve many clinics.
+"""
+
+import contextvars
+import os
+import re
+from contextlib import contextmanager
+
+DEFAULT_TENANT = "default"
+# CLINIC_DATA_DIR points the app (or a load test) at another set of data files
+DEFAULT_DATA_DIR = os.environ.get("CLINIC_DATA_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+TENANTS_DIR = os.environ.get("CLINIC_TENANTS_DIR") or os.path.join(DEFAULT_DATA_DIR, "tenants")
+
+_TENANT_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,63}")
+_current = contextvars.ContextVar("clinic_tenant", default=os.environ.get("CLINIC_TENANT") or DEFAULT_TENANT)
+
+def is_valid_tenant(tenant: str) -> bool:
+    # Tenant ids become directory names; reject anything that could escape TENANTS_DIR
+    return bool(tenant) and _TENANT_RE.fullmatch(str(tenant)) is not None
+
+def current_tenant() -> str:
+    return _current.get()
+
+def tenant_dir(tenant: str = None) -> str:
+    tenant = tenant or _current.get()
+    if tenant == DEFAULT_TENANT:
+        return DEFAULT_DATA_DIR
+    if not is_valid_tenant(tenant):
+        raise KeyError(tenant)
+    return os.path.join(TENANTS_DIR, tenant)
+
+def tenant_exists(tenant: str) -> bool:
+    try:
+        return os.path.isdir(tenant_dir(tenant))
+    except KeyError:
+        return False
+
+def list_tenants() -> list:
+    """The default tenant plus every clinic directory under TENANTS_DIR."""
+    found = []
+    if os.path.isdir(TENANTS_DIR):
+        found = sorted(d for d in os.listdir(TENANTS_DIR)
+                       if is_valid_tenant(d) and os.path.isdir(os.path.join(TENANTS_DIR, d)))
+    return [DEFAULT_TENANT] + [t for t in found if t != DEFAULT_TENANT]
+
+def set_tenant(tenant: str):
+    """Switch the current context to `tenant` (e.g. at the top of a Streamlit script run)."""
+    if tenant != DEFAULT_TENANT and not is_valid_tenant(tenant):
+        raise KeyError(tenant)
+    return _current.set(tenant)
+
+@contextmanager
+def use_tenant(tenant: str):
+    token = set_tenant(tenant or DEFAULT_TENANT)
+    try:
+        yield
+    finally:
+        _current.reset(token)
@@ -0,0 +1,153 @@
+# ai-scheduling-agent/tools/tracing.py
+"""
+Lightweight span tracing for graph nodes, data-file I/O, notifications and LLM calls.
+
+Toggled by the TRACE_SPANS environment variable:
+    unset / 0        disabled: span() hands back a shared no-op object
+    1                in-process latency histograms only (metrics_snapshot(), metrics_text())
+    /path/to.jsonl   histograms plus one JSON line per finished span
+"""
+
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+_TRUTHY = ("1", "true", "on", "yes")
+_FALSY = ("", "0", "false", "off", "no")
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf"))
+
+ENABLED = False
+_export_path = None
+_export_fh = None
+_guard = threading.Lock()
+_histograms = {}
+_ids = itertools.count(1)
+_current = contextvars.ContextVar("current_span_id", default=None)
+
+def configure(setting: str = None):
+    """(Re)read the TRACE_SPANS setting; pass a value to override the environment."""
+    global ENABLED, _export_path, _export_fh
+    setting = (os.environ.get("TRACE_SPANS", "") if setting is None else setting).strip()
+    with _guard:
+        if _export_fh is not None:
+            _export_fh.close()
+            _export_fh = None
+        ENABLED = setting.lower() not in _FALSY
+        _export_path = setting if ENABLED and setting.lower() not in _TRUTHY else None
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+_NOOP = _NoopSpan()
+
+class _Span:
+    __slots__ = ("name", "attrs", "span_id", "parent_id", "_start", "_wall", "_token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.span_id = next(_ids)
+        self.parent_id = _current.get()
+        self._token = _current.set(self.span_id)
+        self._wall = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def set(self, **attrs):
+        """Attach attributes (row counts, bytes, ...) known only once the work is done."""
+        self.attrs.update(attrs)
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _record(self.name, duration, self.attrs, self._wall, self.span_id, self.parent_id)
+        return False
+
+def span(name: str, **attrs):
+    """Context manager timing a block: `with span("io.read", file=...) as sp: ...; sp.set(rows=n)`."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(name, attrs)
+
+def record_span(name: str, duration_s: float, **attrs):
+    """Record an already-measured span (e.g. from callbacks that see start and end separately)."""
+    if ENABLED:
+        _record(name, duration_s, attrs, time.time() - duration_s, next(_ids), _current.get())
+
+def traced(name: str):
+    """Decorator form of span() for whole functions."""
+    def wrap(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Span(name, {}):
+                return func(*args, **kwargs)
+        return inner
+    return wrap
+
+def _record(name, duration_s, attrs, wall, span_id, parent_id):
+    global _export_fh
+    ms = duration_s * 1000.0
+    with _guard:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = {"count": 0, "sum_ms": 0.0, "min_ms": ms, "max_ms": ms,
+                                     "buckets": [0] * len(BUCKETS_MS)}
+        h["count"] += 1
+        h["sum_ms"] += ms
+        h["min_ms"] = min(h["min_ms"], ms)
+        h["max_ms"] = max(h["max_ms"], ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                h["buckets"][i] += 1
+                break
+        if _export_path:
+            if _export_fh is None:
+                _export_fh = open(_export_path, "a", buffering=1, encoding="utf-8")
+            line = {"name": name, "ts": wall, "duration_ms": round(ms, 3),
+                    "span_id": span_id, "parent_id": parent_id, "pid": os.getpid(), **attrs}
+            _export_fh.write(json.dumps(line, default=str) + "\n")
+
+def metrics_snapshot() -> dict:
+    """Per-span-name histograms: count, sum/min/max (ms) and per-bucket (non-cumulative) counts."""
+    with _guard:
+        return {name: {**h, "buckets": list(h["buckets"])} for name, h in _histograms.items()}
+
+def metrics_text() -> str:
+    """Histograms in Prometheus text exposition format."""
+    lines = ["# TYPE span_duration_ms histogram"]
+    for name, h in sorted(metrics_snapshot().items()):
+        cumulative = 0
+        for bound, n in zip(BUCKETS_MS, h["buckets"]):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else str(bound)
+            lines.append(f'span_duration_ms_bucket{{span="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'span_duration_ms_sum{{span="{name}"}} {h["sum_ms"]:.3f}')
+        lines.append(f'span_duration_ms_count{{span="{name}"}} {h["count"]}')
+    return "\n".join(lines) + "\n"
+
+def reset_metrics():
+    with _guard:
+        _histograms.clear()
+
+configure()
@@ -1,17 +1,27 @@
 # In ai-scheduling-agent/tools/utils.py
 
+import math
+import os
 import re
 from datetime import datetime
 from typing import Optional
 
-def sanitize_phone_in(phone: object, default_cc: str = "+91") -> Optional[str]:
+_EMAIL_RE = r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}"
+_E164_RE = re.compile(r"\+\d+")
+
+def _default_cc() -> str:
+    return os.getenv("DEFAULT_COUNTRY_CODE", "+91")
+
+def sanitize_phone_in(phone: object, default_cc: str = None) -> Optional[str]:
     """
     Normalize a user-provided Indian phone number to E.164 or return None if invalid.
     Accepts numbers with spaces/dashes/parentheses, 10-digit local, or 0-prefixed 11-digit.
     Returns string like '+9198XXXXXXXX' or None when not possible.
+    The country code defaults to DEFAULT_COUNTRY_CODE from .env (fallback +91).
     """
     if phone is None:
         return None
+    default_cc = default_cc or _default_cc()
     s = str(phone).strip()
     if not s or s.lower() == 'nan':
         return None
@@ -41,9 +51,64 @@ def sanitize_email(email: object) -> Optional[str]:
     s = str(email).strip()
     if not s or s.lower() == 'nan':
         return None
-    m = re.fullmatch(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}", s)
+    m = re.fullmatch(_EMAIL_RE, s)
     return s.lower() if m else None
 
+# --- Whole-column normalization (same rules as above, applied with pandas string ops) ---
+
+def _as_text(values):
+    """Stripped string Series with NA for missing/'nan'; numeric CSV values lose a trailing '.0'."""
+    s = values.astype("string").str.strip()
+    s = s.str.replace(r"^(\d+)\.0+$", r"\1", regex=True)
+    return s.mask(((s == "") | (s.str.lower() == "nan")).fillna(False))
+
+def normalize_phones(values, default_cc: str = None):
+    """Vectorized sanitize_phone_in over a Series: E.164 strings, NA where invalid."""
+    import numpy as np
+    import pandas as pd
+
+    cc = (default_cc or _default_cc()).lstrip('+')
+    s = _as_text(values).str.replace(r"[\s\-()]+", "", regex=True)
+    digits = s.str.replace(r"\D", "", regex=True)
+    n = digits.str.len()
+    choices = [
+        (s.str.fullmatch(r"\+\d{8,15}"), s),
+        (digits.str.startswith(cc) & (n > len(cc)), "+" + digits),
+        (n == 10, f"+{cc}" + digits),
+        ((n == 11) & digits.str.startswith("0"), f"+{cc}" + digits.str[1:]),
+        ((n >= 8) & (n <= 15), "+" + digits),
+    ]
+    conds = [c.fillna(False).to_numpy(dtype=bool) for c, _ in choices]
+    picked = np.select(conds, [pd.Series(v, index=s.index).to_numpy(dtype=object) for _, v in choices], default=None)
+    return pd.Series(picked, index=values.index, dtype="string")
+
+def normalize_emails(values):
+    """Vectorized sanitize_email over a Series: lowercased addresses, NA where invalid."""
+    s = _as_text(values)
+    return s.str.lower().where(s.str.fullmatch(_EMAIL_RE).fillna(False))
+
+def _present(value) -> bool:
+    if value is None:
+        return False
+    try:
+        return not (isinstance(value, float) and math.isnan(value)) and str(value) not in ("", "<NA>")
+    except TypeError:
+        return False
+
+def patient_contacts(patient: dict):
+    """
+    (phone, email) to notify a patient at, either may be None.
+    Records from patients.csv carry phone_e164/email_norm/contact_valid (see data_io), which are
+    used as-is; other dicts (new intake data, old session state) are sanitized here.
+    """
+    if _present(patient.get("contact_valid")):
+        phone, email = patient.get("phone_e164"), patient.get("email_norm")
+        if _present(phone) and not _E164_RE.fullmatch(str(phone)):
+            # Not a stored E.164 string (e.g. read back as a number); derive it again
+            phone = sanitize_phone_in(patient.get("cell_phone"))
+        return (phone if _present(phone) else None), (email if _present(email) else None)
+    return sanitize_phone_in(patient.get("cell_phone")), sanitize_email(patient.get("email"))
+
 def extract_fields_from_text(text: str):
     if not text:
         return {}
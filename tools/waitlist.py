@@ -0,0 +1,354 @@
+# ai-scheduling-agent/tools/waitlist.py
+"""
+Waitlist with event-driven backfill.
+
+Entries (patient, doctor or specialty, date window, duration) live in the clinic's waitlist.json.
+Waiting entries are indexed by doctor and by specialty, so when a slot is freed or added
+(tools.data_io.open_slot) only the entries for that doctor and that doctor's specialty are
+checked, oldest first; the first one whose window and duration fit is booked into the slot
+straight away and the patient is notified in the background.
+
+waitlist.json holds only waiting entries. Joining, booking and cancelling append one line to
+waitlist.journal and update the cached entries and index in place of a rebuild; loading replays
+the journal lines of the file's generation. Every WAITLIST_COMPACT_EVENTS changes the journal is
+folded into waitlist.json under a new generation. Booked and cancelled entries are moved to the
+append-only waitlist_history.jsonl, so the live files grow with the waitlist, not its history.
+
+Usage:
+    python -m tools.waitlist list
+    python -m tools.waitlist backfill     # re-check every waiting entry, e.g. after editing availability
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+from tools import data_io
+from tools.aio import submit_blocking
+from tools.tracing import span
+
+WAITLIST_FILE = "waitlist.json"
+JOURNAL_FILE = "waitlist.journal"
+HISTORY_FILE = "waitlist_history.jsonl"
+COMPACT_EVENTS = int(os.environ.get("WAITLIST_COMPACT_EVENTS", "200"))
+# Window used when a patient joins without a specific date range
+DEFAULT_WINDOW_DAYS = 14
+
+WAITING, BOOKED, CANCELLED = "waiting", "booked", "cancelled"
+
+_PATIENT_FIELDS = ("patient_id", "first_name", "last_name", "cell_phone", "email") + tuple(data_io.CONTACT_COLUMNS)
+
+def _key(text) -> str:
+    return str(text).strip().casefold() if text else ""
+
+def _path() -> str:
+    """The current clinic's waitlist file."""
+    return data_io.paths().file(WAITLIST_FILE)
+
+def _journal() -> str:
+    return data_io.paths().file(JOURNAL_FILE)
+
+def _history_path() -> str:
+    return data_io.paths().file(HISTORY_FILE)
+
+def _sources() -> tuple:
+    return (_path(), _journal())
+
+def _bucket(entry: dict) -> tuple:
+    if entry.get("doctor_name"):
+        return "doctor", _key(entry["doctor_name"])
+    return "specialty", _key(entry.get("specialty"))
+
+def _reindexed(index: dict, entry: dict, keep: bool = True) -> dict:
+    """`index` with `entry` added (or, keep=False, removed). Copy-on-write: readers may hold the old one."""
+    kind, key = _bucket(entry)
+    bucket = [e for e in index[kind].get(key, []) if e["id"] != entry["id"]]
+    if keep:
+        bucket.append(entry)  # ids only grow, so buckets stay oldest first
+    table = dict(index[kind])
+    if bucket:
+        table[key] = bucket
+    else:
+        table.pop(key, None)
+    return {**index, kind: table}
+
+def _load() -> dict:
+    """
+    {"generation", "next_id", "entries": {id: entry}, "index", "pending", "legacy"}: the waiting
+    entries of waitlist.json plus its journal. "index" is {"doctor": {name: [entry, ...]},
+    "specialty": {...}}, oldest first. "legacy" holds finished entries of a file written before
+    they were moved to the history; the next compaction moves them.
+    """
+    state = {"generation": None, "next_id": 1, "entries": {}, "pending": 0, "legacy": []}
+    try:
+        with span("io.read", file=WAITLIST_FILE):
+            with open(_path(), encoding="utf-8") as fh:
+                saved = json.load(fh)
+        state["generation"], state["next_id"] = saved.get("generation"), saved["next_id"]
+        for entry in saved["entries"]:
+            if entry["status"] == WAITING:
+                state["entries"][entry["id"]] = entry
+            else:
+                state["legacy"].append(entry)
+    except FileNotFoundError:
+        pass
+    try:
+        with open(_journal(), encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of a crashed append
+                if change.get("g") != state["generation"]:
+                    continue  # already folded into waitlist.json
+                if "add" in change:
+                    entry = change["add"]
+                    state["entries"][entry["id"]] = entry
+                    state["next_id"] = max(state["next_id"], entry["id"] + 1)
+                else:
+                    state["entries"].pop(change["done"], None)
+                state["pending"] += 1
+    except FileNotFoundError:
+        pass
+    index = {"doctor": {}, "specialty": {}}
+    for entry in state["entries"].values():
+        kind, key = _bucket(entry)
+        index[kind].setdefault(key, []).append(entry)
+    state["index"] = index
+    return state
+
+def _data() -> dict:
+    return data_io._cached(_sources(), "data", _load)
+
+def _index() -> dict:
+    return _data()["index"]
+
+def _archive(finished: list):
+    """Append booked/cancelled entries to the history file."""
+    with span("io.write", file=HISTORY_FILE, rows=len(finished)):
+        with open(_history_path(), "a", encoding="utf-8") as fh:
+            for entry in finished:
+                fh.write(json.dumps(entry, default=str) + "\n")
+
+def _history() -> list:
+    """Finished entries from the history file (the last line of an entry wins)."""
+    def load():
+        finished = {}
+        with span("io.read", file=HISTORY_FILE):
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    finished[entry["id"]] = entry
+        return list(finished.values())
+    path = _history_path()
+    if not os.path.exists(path):
+        return []
+    return data_io._cached(path, "history", load)
+
+def _save(state: dict):
+    """Write the waiting entries under a new generation and drop the journal it absorbs."""
+    if state["legacy"]:
+        _archive(state["legacy"])
+    path = _path()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    state = {**state, "generation": os.urandom(6).hex(), "pending": 0, "legacy": []}
+    saved = {"generation": state["generation"], "next_id": state["next_id"],
+             "entries": list(state["entries"].values())}
+    with span("io.write", file=WAITLIST_FILE, rows=len(saved["entries"])):
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(saved, fh, indent=1, default=str)
+        os.replace(tmp, path)
+    try:
+        os.remove(_journal())
+    except FileNotFoundError:
+        pass
+    data_io._store_cached(_sources(), "data", state)
+
+def _commit(state: dict, added: dict = None, finished: dict = None):
+    """
+    Journal one change to `state` (read under the file lock): `added` joins the waitlist or
+    `finished` (booked or cancelled) leaves it for the history. The cache is seeded with the
+    updated entries and index; compacts once enough changes have piled up.
+    """
+    entries, index = dict(state["entries"]), state["index"]
+    if added is not None:
+        entries[added["id"]] = added
+        index = _reindexed(index, added)
+        change = {"add": added}
+    else:
+        entries.pop(finished["id"], None)
+        index = _reindexed(index, finished, keep=False)
+        change = {"done": finished["id"]}
+        _archive([finished])
+    state = {**state, "entries": entries, "index": index, "pending": state["pending"] + 1,
+             "next_id": max(state["next_id"], added["id"] + 1) if added is not None else state["next_id"]}
+    line = json.dumps({"g": state["generation"], **change}, default=str, separators=(",", ":"))
+    with span("io.write", file=JOURNAL_FILE):
+        with open(_journal(), "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+    if state["pending"] >= COMPACT_EVENTS or state["legacy"]:
+        _save(state)
+    else:
+        data_io._store_cached(_sources(), "data", state)
+
+def specialty_of(doctor_name: str):
+    return data_io._canonical_doctor(doctor_name)[1]
+
+def add(patient: dict, doctor_name: str = None, specialty: str = None, start_day: date = None,
+        end_day: date = None, duration_min: int = 30) -> dict:
+    """Put a patient on the waitlist for a doctor (or any doctor of a specialty) within a date window."""
+    if not doctor_name and not specialty:
+        raise ValueError("A waitlist entry needs a doctor or a specialty")
+    start_day = start_day or date.today()
+    end_day = end_day or start_day + timedelta(days=DEFAULT_WINDOW_DAYS)
+    with data_io._file_lock():
+        data = _data()
+        entry = {
+            "id": data["next_id"],
+            "patient": {k: patient.get(k) for k in _PATIENT_FIELDS},
+            "doctor_name": data_io._canonical_doctor(doctor_name)[0] if doctor_name else None,
+            "specialty": None if doctor_name else specialty,
+            "start_day": start_day.isoformat(),
+            "end_day": end_day.isoformat(),
+            "duration_min": int(duration_min),
+            "status": WAITING,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        _commit(data, added=entry)
+    return entry
+
+def cancel(entry_id: int) -> bool:
+    with data_io._file_lock():
+        data = _data()
+        entry = data["entries"].get(entry_id)
+        if entry is None:
+            return False
+        _commit(data, finished=dict(entry, status=CANCELLED))
+    return True
+
+def entries(status: str = None) -> list:
+    """Entries with `status` (all if None), oldest first; finished ones come from the history file."""
+    data = _data()
+    found = [] if status in (BOOKED, CANCELLED) else list(data["entries"].values())
+    if status != WAITING:
+        finished = {e["id"]: e for e in data["legacy"] + _history()}
+        found += [e for i, e in finished.items() if i not in data["entries"]]
+    return sorted((e for e in found if status is None or e["status"] == status), key=lambda e: e["id"])
+
+def _candidates(doctor_name: str, specialty) -> list:
+    index = _index()
+    found = index["doctor"].get(_key(doctor_name), []) + index["specialty"].get(_key(specialty), [])
+    return sorted(found, key=lambda e: e["id"])
+
+def _fits(entry: dict, doctor_name: str, slot: datetime):
+    """Start time at which `entry` can be booked using the freed `slot`, or None."""
+    day = slot.date()
+    if not entry["start_day"] <= day.isoformat() <= entry["end_day"]:
+        return None
+    starts = {s["date_slot"] for s in data_io.find_available_slots(doctor_name, day, entry["duration_min"])}
+    # A 60-minute visit may start at the freed slot or in the slot just before it
+    for start in (slot, slot - timedelta(minutes=30)):
+        if start in starts and (entry["duration_min"] == 60 or start == slot):
+            return start
+    return None
+
+def _book(data: dict, entry: dict, doctor_name: str, start: datetime) -> bool:
+    patient = entry["patient"]
+    # reserve_slot checks the slot and the patient's visits with every doctor under the data lock;
+    # a patient_conflict (already booked at that time) leaves the entry waiting for another slot
+    ok, _ = data_io.reserve_slot(doctor_name, start, patient["patient_id"], entry["duration_min"])
+    if not ok:
+        return False
+    appt = {"doctor_name": doctor_name, "date_slot": start, "duration_min": entry["duration_min"],
+            "patient": patient, "status": "confirmed", "source": "waitlist"}
+    data_io.append_appointment_export(patient, appt)
+    booked = dict(entry, status=BOOKED, booked_slot=start.isoformat(), booked_doctor=doctor_name)
+    _commit(data, finished=booked)
+    submit_blocking(_notify, appt)
+    return True
+
+def on_slot_freed(doctor_name: str, date_time) -> dict:
+    """
+    A slot became bookable: book the oldest matching waiting entry into it.
+    Returns the booked entry or None. Only this doctor's and specialty's entries are examined.
+    """
+    if hasattr(date_time, "to_pydatetime"):
+        date_time = date_time.to_pydatetime()
+    slot = date_time if isinstance(date_time, datetime) else datetime.fromisoformat(str(date_time))
+    if slot < datetime.now():
+        return None
+    name, specialty = data_io._canonical_doctor(doctor_name)
+    with data_io._file_lock(), span("waitlist.backfill", doctor=name):
+        data = _data()
+        for entry in _candidates(name, specialty):
+            start = _fits(entry, name, slot)
+            if start is not None and _book(data, entry, name, start):
+                return entry
+    return None
+
+def backfill_all() -> int:
+    """Try every waiting entry against current availability (after bulk schedule edits). Returns bookings."""
+    booked = 0
+    for entry in entries(WAITING):
+        names = [entry["doctor_name"]] if entry["doctor_name"] else [
+            d["doctor_name"] for d in data_io.list_doctors() if _key(d["specialty"]) == _key(entry["specialty"])]
+        first, last = date.fromisoformat(entry["start_day"]), date.fromisoformat(entry["end_day"])
+        for name in names:
+            slots = data_io.find_next_available_slots(name, max(first, date.today()), entry["duration_min"], limit=1)
+            if slots and slots[0]["date_slot"].date() <= last:
+                with data_io._file_lock():
+                    data = _data()
+                    current = data["entries"].get(entry["id"])
+                    if current is not None and _book(data, current, name, slots[0]["date_slot"]):
+                        booked += 1
+                        break
+    return booked
+
+def _notify(appt: dict):
+    """SMS/email the patient about a waitlist booking; failures are logged, never raised."""
+    from tools.utils import patient_contacts
+    from tools.messaging import send_sms
+    from tools.email import send_email
+    patient = appt["patient"]
+    when = f"{appt['date_slot']:%Y-%m-%d %H:%M}"
+    text = (f"Good news {patient.get('first_name')}: a slot opened up and you're booked with "
+            f"{appt['doctor_name']} on {when}. Reply or call the clinic if you can no longer make it.")
+    phone, email = patient_contacts(patient)
+    if phone:
+        try:
+            send_sms(phone, text)
+        except Exception as e:
+            print("waitlist SMS failed:", e)
+    if email:
+        try:
+            send_email(email, "Appointment booked from the waitlist", text)
+        except Exception as e:
+            print("waitlist email failed:", e)
+    try:
+        from agents.reminder_agent import schedule_reminder_job
+        schedule_reminder_job(appt)
+    except Exception as e:
+        print("waitlist reminder scheduling failed:", e)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Appointment waitlist")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="show waiting entries")
+    sub.add_parser("backfill", help="book waiting entries into any currently open slots")
+    args = parser.parse_args(argv)
+    if args.command == "list":
+        for e in entries(WAITING):
+            who = f"{e['patient'].get('first_name')} {e['patient'].get('last_name')}"
+            target = e["doctor_name"] or f"any {e['specialty']}"
+            print(f"#{e['id']:<5} {who:30s} {target:30s} {e['start_day']}..{e['end_day']} {e['duration_min']}min")
+    else:
+        print(f"booked {backfill_all()} waitlist entries")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())